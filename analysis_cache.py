@@ -0,0 +1,125 @@
+"""
+解析結果の増分キャッシュ
+
+入力の試行ファイルごとに内容のハッシュを記録し、試行単位の派生結果（パラメータ、
+試行ごとの指標、最終 FunctionRatio など）をハッシュをキーにしてディスクに保存する。
+新しい被験者のCSVが追加されても、既存の試行は再計算せずにキャッシュから読む。
+
+図やレポートなど全試行から作る成果物は、入力ハッシュ全体の指紋で管理し、
+入力も出力ファイルも変わっていなければ作り直さない。
+
+    cache = AnalysisCache()
+    ratio = cache.trial_result(path, 'final_function_ratio', trial_final_function_ratio)
+    if not cache.is_current('experiment2_figures', paths, outputs):
+        ...図を描画...
+        cache.mark_current('experiment2_figures', paths)
+    cache.save()
+"""
+
+import copy
+import hashlib
+import os
+import pickle
+
+from trial_store import load_trial_arrays
+
+DEFAULT_CACHE_DIR = ".analysis_cache"
+CACHE_VERSION = 1
+_HASH_CHUNK = 1 << 20
+
+
+def content_hash(path):
+    """ファイル内容の SHA-1 を返す"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """試行単位の派生結果と集計成果物のキャッシュ"""
+
+    def __init__(self, name="trials", cache_dir=DEFAULT_CACHE_DIR):
+        self.path = os.path.join(cache_dir, f"{name}.pkl")
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._state = {"version": CACHE_VERSION, "hashes": {}, "results": {}, "artifacts": {}}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "rb") as f:
+                    state = pickle.load(f)
+                if state.get("version") == CACHE_VERSION:
+                    self._state = state
+            except Exception as e:
+                print(f"キャッシュを読み込めません（作り直します）: {self.path} - {e}")
+
+    def file_hash(self, path):
+        """内容のハッシュを返す（サイズと更新時刻が同じなら再計算しない）"""
+        key = os.path.abspath(path)
+        st = os.stat(path)
+        signature = (st.st_size, st.st_mtime_ns)
+        entry = self._state["hashes"].get(key)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        digest = content_hash(path)
+        self._state["hashes"][key] = (signature, digest)
+        self._dirty = True
+        return digest
+
+    def trial_result(self, path, kind, compute):
+        """試行ファイルの派生結果を返す（内容が変わっていなければキャッシュから）"""
+        key = (kind, self.file_hash(path))
+        results = self._state["results"]
+        if key in results:
+            self.hits += 1
+        else:
+            self.misses += 1
+            results[key] = compute(path)
+            self._dirty = True
+        return copy.deepcopy(results[key])
+
+    def fingerprint(self, paths):
+        """入力ファイル群全体の指紋を返す"""
+        digest = hashlib.sha1()
+        for path in sorted(os.path.abspath(p) for p in paths):
+            digest.update(path.encode("utf-8"))
+            digest.update(self.file_hash(path).encode("ascii"))
+        return digest.hexdigest()
+
+    def is_current(self, kind, paths, outputs=()):
+        """集計成果物が入力に対して最新か（出力ファイルが消えていれば最新ではない）"""
+        entry = self._state["artifacts"].get(kind)
+        if entry is None or entry["fingerprint"] != self.fingerprint(paths):
+            return False
+        return all(os.path.exists(output) for output in outputs)
+
+    def mark_current(self, kind, paths, value=None):
+        """集計成果物を入力の現在の指紋で作り直したことを記録する"""
+        self._state["artifacts"][kind] = {"fingerprint": self.fingerprint(paths), "value": value}
+        self._dirty = True
+
+    def artifact_value(self, kind):
+        """mark_current で記録した値を返す"""
+        entry = self._state["artifacts"].get(kind)
+        return None if entry is None else copy.deepcopy(entry["value"])
+
+    def save(self):
+        """変更があればキャッシュファイルを書き込む"""
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self._state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def summary(self):
+        return f"キャッシュ: {self.hits} 件再利用, {self.misses} 件再計算"
+
+
+def trial_final_function_ratio(path):
+    """FunctionMix 試行の最終 FunctionRatio（最後の行の値）"""
+    return float(load_trial_arrays(path, ["FunctionRatio"])["FunctionRatio"][-1])
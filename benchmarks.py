@@ -0,0 +1,613 @@
+"""
+解析パイプラインのベンチマーク
+
+experiment2_analysis.main、BrightnessDataAnalyzer.run_complete_analysis、
+frame_spectra（スペクトル）と optical_flow_speed（オプティカルフロー）を、
+決まったデータセットに対して1つずつ別プロセスで実行し、
+
+- 全体の実行時間と最大常駐メモリ（子プロセスの分も別に記録）
+- 段階ごとの時間（取り込み・読み込み・抽出・統計・描画など）
+
+を測って BENCH_DIR/HISTORY_FILENAME に追記する。各段階を過去 HISTORY_WINDOW 回の
+中央値と比べ、threshold（既定 20%）より遅くなったものを回帰として表示する
+（--fail-on-regression なら終了コード 1）。
+
+データセット:
+    real          public の BrightnessFunctionMixAndPhaseData / BrightnessData（リンクを張る）
+    synthetic:N   synthetic_trials で作る N 人分のデータ（同じ N と seed なら作り直さない）
+
+毎回、列指向ストアとカタログを消してから測るので、取り込み（ingest）も含めた
+最初の実行の時間になる。図やレポートはデータセットの work ディレクトリに書かれる。
+
+scripts は負荷試験で、BrightnessData / BrightnessFunctionMixAndPhaseData を読む解析
+スクリプト（ANALYSIS_SCRIPTS）をそのまま1本ずつ実行し、スクリプトごとの時間と、
+失敗したスクリプトとその理由を記録する（既定では実行しない）。合成データの
+ディレクトリ以外（ExperimentData など）は public の実データにリンクする。
+
+Windows でも動く。最大常駐メモリは resource がなければ psutil で測り（子プロセスの分は
+測れない）、どちらもなければ記録しない。シンボリックリンクが作れない（管理者権限も
+開発者モードもない）ときは、ディレクトリはジャンクション、ファイルはハードリンクか
+コピーで代える。
+
+使い方:
+    python benchmarks.py
+    python benchmarks.py --datasets real,synthetic:10,synthetic:40 --benchmarks brightness
+    python benchmarks.py --fail-on-regression --threshold 0.3
+    python benchmarks.py --benchmarks scripts --datasets synthetic:500
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join(REPO_ROOT, ".benchmarks")
+HISTORY_FILENAME = "history.json"
+DATASET_MARKER = "dataset.json"
+RESULT_PREFIX = "BENCHMARK_RESULT "
+
+REAL_DATA_DIRS = ("BrightnessFunctionMixAndPhaseData", "BrightnessData")
+DATA_BENCHMARKS = ("brightness", "experiment2", "scripts")
+FRAME_BENCHMARKS = ("frame_spectra", "optical_flow")
+DEFAULT_BENCHMARKS = ("brightness", "experiment2", "frame_spectra", "optical_flow")
+DEFAULT_DATASETS = ("real", "synthetic:5", "synthetic:20")
+
+# 負荷試験で実行する解析スクリプト（リポジトリからの相対パス）。1人・1ファイルを
+# 決め打ちしているスクリプトは合成データでは動かないので含めない
+ANALYSIS_SCRIPTS = (
+    "brightness_data_analysis.py",
+    "experiment2_analysis.py",
+    "experiment1_analysis.py",
+    "experiment2_phase_analysis.py",
+    "analyze_experiment2_data.py",
+    "phase_data_analysis.py",
+    "simple_analysis.py",
+    "statistical_analysis.py",
+    "dynamic_vs_linearonly_A1_A2_comparison.py",
+    "final_dynamic_vs_linearonly_analysis.py",
+    "velocity_fit.py",
+    "velocity_curve_analysis/function_mix_analysis.py",
+    "velocity_curve_analysis/function_mix_analysis_no_subcurve.py",
+    "velocity_curve_analysis/combined_velocity_curve_analysis.py",
+    "velocity_curve_analysis/velocity_curve_linear_only_analysis.py",
+    "velocity_curve_analysis/velocity_curve_linear_only_analysis_add_linearcurve.py",
+    "velocity_curve_analysis/dynamic_velocity_curve_analysis.py",
+    "public/py/Experiment2-FunctionMix-All-person-3Trails-Mean-value.py",
+    "public/py/Experiment2-FunctionMix-Single-person-6Trails-distributed-value.py",
+    "public/py/Experiment2-Phase-All-person-3Trails-Mean-value.py",
+)
+SCRIPT_TIMEOUT = 1800
+# public/py のスクリプトが読む絶対パス（work ディレクトリの中にリンクを作る）
+WINDOWS_PUBLIC_DIR = os.path.join("D:", "vectionProject", "public")
+
+DEFAULT_THRESHOLD = 0.20
+HISTORY_WINDOW = 5
+# これより小さい差はノイズとみなして回帰と判定しない
+MIN_STAGE_SECONDS = 0.05
+MIN_RSS_MB = 20.0
+
+# frame_spectra / optical_flow で使う合成フレームの大きさ
+SYNTHETIC_FRAMES = 120
+FRAME_SHAPE = (240, 320)
+
+
+# --- 段階ごとの計測 ---
+
+class StageTimer:
+    """段階ごとの経過時間（同じ名前は合計）と呼び出し回数を記録する"""
+
+    def __init__(self):
+        self.stages = {}
+        self.calls = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    @contextmanager
+    def instrument(self, owner, names):
+        """owner（モジュールやインスタンス）の関数を計測付きに置き換え、終われば元に戻す"""
+        originals = {name: getattr(owner, name) for name in names}
+
+        def timed(name, func):
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+
+        for name, func in originals.items():
+            setattr(owner, name, timed(name, func))
+        try:
+            yield
+        finally:
+            for name, func in originals.items():
+                if isinstance(owner, type(sys)):
+                    setattr(owner, name, func)
+                else:
+                    # インスタンスに付けた属性を消して、クラスのメソッドに戻す
+                    delattr(owner, name)
+
+
+def _peak_rss_mb(children=False):
+    """このプロセス（children=True なら終了した子プロセス）の最大常駐メモリ（MB、測れなければ None）"""
+    try:
+        import resource
+    except ImportError:
+        # Windows: resource がないので psutil のピークのワーキングセットを使う
+        if children:
+            return None
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    value = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux の ru_maxrss は KB、macOS はバイト
+    return value / (1024 * 1024) if sys.platform == "darwin" else value / 1024
+
+
+# --- 子プロセスで実行するベンチマーク ---
+
+def _ingest(timer, data_root):
+    from trial_store import ingest_directory
+
+    with timer.stage("ingest"):
+        for name in REAL_DATA_DIRS:
+            path = os.path.join(data_root, name)
+            if os.path.isdir(path):
+                ingest_directory(path)
+
+
+def bench_brightness(timer, data_root, options):
+    from brightness_data_analysis import BrightnessDataAnalyzer
+
+    _ingest(timer, data_root)
+    analyzer = BrightnessDataAnalyzer(
+        data_path=os.path.join(data_root, "BrightnessFunctionMixAndPhaseData"))
+    stages = ["load_data", "compute_knob_metrics", "summarize_convergence",
+              "analyze_function_mix_experiment", "analyze_phase_experiment",
+              "calculate_speed_equivalence", "generate_visualizations", "generate_report"]
+    with timer.instrument(analyzer, stages):
+        analyzer.run_complete_analysis()
+
+
+def bench_experiment2(timer, data_root, options):
+    import experiment2_analysis
+
+    _ingest(timer, data_root)
+    stages = ["load_experiment2_function_mix_data", "load_experiment2_phase_data",
+              "analyze_function_mix_exploration", "analyze_velocity_parameters_phase",
+              "plot_experiment2_results", "render_figures", "compare_experiments",
+              "generate_experiment2_results_text"]
+    with timer.instrument(experiment2_analysis, stages):
+        experiment2_analysis.main(
+            data_dir=os.path.join(data_root, "BrightnessFunctionMixAndPhaseData"))
+
+
+def synthetic_frames(n_frames=SYNTHETIC_FRAMES, shape=FRAME_SHAPE, seed=0):
+    """横に流れるランダムなテクスチャの8ビットグレースケール画像列 (N, H, W)"""
+    rng = np.random.default_rng(seed)
+    height, width = shape
+    texture = rng.integers(0, 256, size=(height, width * 2), dtype=np.uint8)
+    shifts = (np.arange(n_frames) * 3) % width
+    return np.stack([texture[:, s:s + width] for s in shifts])
+
+
+def bench_frame_spectra(timer, data_root, options):
+    from frame_spectra import consecutive_phase_stats, read_gray_frames, spectra
+
+    video = options.get("video")
+    with timer.stage("read_frames"):
+        frames = (read_gray_frames(video, count=SYNTHETIC_FRAMES) if video
+                  else synthetic_frames())
+    with timer.stage("spectra"):
+        spectra(frames)
+    with timer.stage("phase_stats"):
+        consecutive_phase_stats(frames)
+
+
+def bench_optical_flow(timer, data_root, options):
+    import cv2
+
+    from optical_flow_speed import stream_flow_speeds
+
+    video = options.get("video")
+    if not video:
+        video = os.path.abspath("synthetic_flow.avi")
+        with timer.stage("write_video"):
+            height, width = FRAME_SHAPE
+            writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*"MJPG"), 30, (width, height))
+            for frame in synthetic_frames():
+                writer.write(cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR))
+            writer.release()
+    with timer.stage("flow"):
+        stream_flow_speeds(video)
+
+
+def bench_scripts(timer, data_root, options):
+    """解析スクリプトを1本ずつ実行する。失敗したスクリプトは {スクリプト: 理由} で返す"""
+    env = dict(os.environ, MPLBACKEND="Agg")
+    failures = {}
+    for script in options.get("scripts") or ANALYSIS_SCRIPTS:
+        # 成功したスクリプトの時間だけを段階として残す（失敗の時間は基準に混ぜない）
+        start = time.perf_counter()
+        try:
+            proc = subprocess.run([sys.executable, os.path.join(REPO_ROOT, script)],
+                                  env=env, capture_output=True, text=True,
+                                  timeout=options.get("script_timeout", SCRIPT_TIMEOUT))
+        except subprocess.TimeoutExpired as e:
+            failures[script] = f"{e.timeout:.0f} 秒で打ち切り"
+            continue
+        if proc.returncode != 0:
+            lines = (proc.stderr or proc.stdout).strip().splitlines()
+            failures[script] = lines[-1] if lines else f"終了コード {proc.returncode}"
+            continue
+        timer.stages[script] = time.perf_counter() - start
+        timer.calls[script] = 1
+    return {"failures": failures}
+
+
+BENCHMARKS = {
+    "brightness": bench_brightness,
+    "experiment2": bench_experiment2,
+    "scripts": bench_scripts,
+    "frame_spectra": bench_frame_spectra,
+    "optical_flow": bench_optical_flow,
+}
+
+
+def run_child(task):
+    """子プロセス側: 1つのベンチマークを実行して結果を標準出力の最後の行に書く"""
+    import matplotlib
+    matplotlib.use("Agg")
+
+    timer = StageTimer()
+    result = {"benchmark": task["benchmark"], "dataset": task["dataset"]}
+    start = time.perf_counter()
+    try:
+        extra = BENCHMARKS[task["benchmark"]](timer, task.get("data_root"), task.get("options", {}))
+        result.update(extra or {})
+        result["status"] = "ok"
+    except ImportError as e:
+        result["status"] = "skipped"
+        result["reason"] = str(e)
+    except Exception as e:
+        result["status"] = "failed"
+        result["reason"] = f"{type(e).__name__}: {e}"
+    result["wall"] = time.perf_counter() - start
+    result["stages"] = timer.stages
+    result["calls"] = timer.calls
+    result["peak_rss_mb"] = _peak_rss_mb()
+    result["children_peak_rss_mb"] = _peak_rss_mb(children=True)
+    sys.stdout.flush()
+    print(RESULT_PREFIX + json.dumps(result))
+
+
+# --- データセットの準備 ---
+
+def _dataset_dir(spec, seed):
+    if spec == "real":
+        return os.path.join(BENCH_DIR, "data", "real")
+    return os.path.join(BENCH_DIR, "data", f"synthetic-{spec.split(':', 1)[1]}-seed{seed}")
+
+
+def _link(source, link):
+    """source へのシンボリックリンクを作る（作れなければジャンクション・ハードリンク・コピー）"""
+    try:
+        os.symlink(source, link, target_is_directory=os.path.isdir(source))
+        return
+    except OSError:
+        pass
+    if os.path.isdir(source):
+        if os.name == "nt":
+            try:
+                import _winapi
+                _winapi.CreateJunction(os.path.abspath(source), os.path.abspath(link))
+                return
+            except OSError:
+                pass
+        shutil.copytree(source, link)
+    else:
+        try:
+            os.link(source, link)
+        except OSError:
+            shutil.copy2(source, link)
+
+
+def _link_real(public_dir):
+    from trial_catalog import DEFAULT_ROOT
+
+    for name in REAL_DATA_DIRS:
+        source = os.path.join(DEFAULT_ROOT, name)
+        target = os.path.join(public_dir, name)
+        os.makedirs(target, exist_ok=True)
+        for path in glob.glob(os.path.join(source, "*.csv")):
+            link = os.path.join(target, os.path.basename(path))
+            if not os.path.lexists(link):
+                _link(path, link)
+
+
+def _link_other_data(public_dir):
+    """合成しないディレクトリ（ExperimentData など）は実データにリンクする"""
+    from synthetic_trials import DATASET_LAYOUT
+    from trial_catalog import DEFAULT_ROOT
+
+    for name in os.listdir(DEFAULT_ROOT):
+        source = os.path.join(DEFAULT_ROOT, name)
+        link = os.path.join(public_dir, name)
+        if name not in DATASET_LAYOUT and os.path.isdir(source) and not os.path.lexists(link):
+            _link(source, link)
+
+
+def prepare_dataset(spec, seed=0):
+    """データセットを用意し、(public ディレクトリ, 実行するディレクトリ, 概要) を返す"""
+    from synthetic_trials import DATASET_LAYOUT, GENERATOR_VERSION, generate_public_tree
+
+    root = _dataset_dir(spec, seed)
+    public_dir = os.path.join(root, "public")
+    marker_path = os.path.join(root, DATASET_MARKER)
+    marker = {"spec": spec, "seed": seed, "generator": GENERATOR_VERSION}
+
+    current = None
+    if os.path.exists(marker_path):
+        with open(marker_path, "r", encoding="utf-8") as f:
+            current = json.load(f)
+    if spec == "real":
+        _link_real(public_dir)
+        _link_other_data(public_dir)
+    elif current != marker:
+        shutil.rmtree(root, ignore_errors=True)
+        print(f"合成データを作成中: {spec}")
+        generate_public_tree(public_dir, int(spec.split(":", 1)[1]), seed, max_workers=None)
+        _link_other_data(public_dir)
+    os.makedirs(root, exist_ok=True)
+    with open(marker_path, "w", encoding="utf-8") as f:
+        json.dump(marker, f)
+
+    # 前回の実行で作られた列指向ストア・カタログ・キャッシュを消して、初回の実行として測る
+    for name in DATASET_LAYOUT:
+        shutil.rmtree(os.path.join(public_dir, name, ".columnar"), ignore_errors=True)
+    for path in glob.glob(os.path.join(public_dir, ".*.json")):
+        os.remove(path)
+    work_dir = os.path.join(root, "work")
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    # スクリプトは public/... と ../public/... の両方の相対パスで読むので、work/run で実行する
+    run_dir = os.path.join(work_dir, "run")
+    os.makedirs(os.path.join(run_dir, os.path.dirname(WINDOWS_PUBLIC_DIR)))
+    for link in (os.path.join(work_dir, "public"), os.path.join(run_dir, "public"),
+                 os.path.join(run_dir, WINDOWS_PUBLIC_DIR)):
+        _link(public_dir, link)
+
+    files = [path for name in DATASET_LAYOUT
+             for path in glob.glob(os.path.join(public_dir, name, "*.csv"))]
+    summary = {"files": len(files), "bytes": sum(os.path.getsize(p) for p in files)}
+    return public_dir, run_dir, summary
+
+
+def run_benchmark(benchmark, dataset, data_root, work_dir, options=None, timeout=None):
+    """ベンチマークを子プロセスで実行して結果の辞書を返す"""
+    task = {"benchmark": benchmark, "dataset": dataset, "data_root": data_root,
+            "options": options or {}}
+    env = dict(os.environ, MPLBACKEND="Agg",
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])))
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", json.dumps(task)],
+                          cwd=work_dir, env=env, capture_output=True, text=True, timeout=timeout)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    if not lines:
+        tail = "\n".join((proc.stdout + proc.stderr).splitlines()[-10:])
+        return {"benchmark": benchmark, "dataset": dataset, "status": "failed",
+                "reason": f"終了コード {proc.returncode}\n{tail}",
+                "wall": time.perf_counter() - start, "stages": {}}
+    return json.loads(lines[-1][len(RESULT_PREFIX):])
+
+
+# --- 履歴と回帰の判定 ---
+
+def _history_path():
+    return os.path.join(BENCH_DIR, HISTORY_FILENAME)
+
+
+def load_history():
+    path = _history_path()
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_history(history):
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    path = _history_path()
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(history, f, ensure_ascii=False, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _median(values):
+    values = [value for value in values if value is not None]
+    return float(np.median(values)) if values else None
+
+
+def baseline(history, benchmark, dataset, window=HISTORY_WINDOW):
+    """過去の成功した結果の中央値 {'wall', 'peak_rss_mb', 'stages': {...}} を返す（なければ None）"""
+    previous = [result for run in history for result in run["results"]
+                if result["benchmark"] == benchmark and result["dataset"] == dataset
+                and result.get("status") == "ok"][-window:]
+    if not previous:
+        return None
+    stage_names = {name for result in previous for name in result["stages"]}
+    return {
+        "wall": float(np.median([r["wall"] for r in previous])),
+        "peak_rss_mb": _median([r.get("peak_rss_mb") for r in previous]),
+        "stages": {name: float(np.median([r["stages"][name] for r in previous
+                                          if name in r["stages"]]))
+                   for name in stage_names},
+    }
+
+
+def find_regressions(result, reference, threshold=DEFAULT_THRESHOLD):
+    """基準より threshold 以上遅く（大きく）なった項目の (名前, 基準, 今回) のリスト"""
+    if reference is None or result.get("status") != "ok":
+        return []
+    regressions = []
+    timings = [("wall", reference["wall"], result["wall"])]
+    timings += [(f"stage:{name}", reference["stages"][name], seconds)
+                for name, seconds in result["stages"].items() if name in reference["stages"]]
+    for name, before, now in timings:
+        if now > before * (1 + threshold) and now - before > MIN_STAGE_SECONDS:
+            regressions.append((name, before, now))
+    before, now = reference["peak_rss_mb"], result.get("peak_rss_mb")
+    if before is not None and now is not None and now > before * (1 + threshold) and now - before > MIN_RSS_MB:
+        regressions.append(("peak_rss_mb", before, now))
+    return regressions
+
+
+def _change(before, now):
+    return f"{(now / before - 1) * 100:+.0f}%" if before else ""
+
+
+def _format_mb(value):
+    return "不明" if value is None else f"{value:.0f} MB"
+
+
+def print_result(result, reference):
+    label = f"{result['benchmark']} [{result['dataset']}]"
+    if result.get("status") != "ok":
+        print(f"\n{label}: {result.get('status')} - {result.get('reason', '')}")
+        return
+    print(f"\n{label}: {result['wall']:.2f} 秒, 最大メモリ {_format_mb(result.get('peak_rss_mb'))}"
+          f"（子プロセス {_format_mb(result.get('children_peak_rss_mb'))}）"
+          + (f"  基準比 {_change(reference['wall'], result['wall'])}" if reference else ""))
+    for name, seconds in result["stages"].items():
+        before = reference["stages"].get(name) if reference else None
+        change = f"  {_change(before, seconds)}" if before else ""
+        print(f"    {name:<40s} {seconds:8.3f} 秒{change}")
+    for name, reason in result.get("failures", {}).items():
+        print(f"    {name:<40s} 失敗: {reason}")
+
+
+def print_scaling(results):
+    """合成データの人数に対する実行時間の伸び（両対数の傾き）を表示する"""
+    for benchmark in DATA_BENCHMARKS:
+        points = [(int(r["dataset"].split(":")[1]), r["wall"]) for r in results
+                  if r["benchmark"] == benchmark and r["dataset"].startswith("synthetic:")
+                  and r.get("status") == "ok"]
+        if len(points) < 2:
+            continue
+        sizes, walls = np.array(sorted(points)).T
+        slope = np.polyfit(np.log(sizes), np.log(walls), 1)[0]
+        series = ", ".join(f"{int(n)}人 {w:.2f}秒" for n, w in zip(sizes, walls))
+        print(f"{benchmark}: {series}（実行時間 ∝ 人数^{slope:.2f}）")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--benchmarks", default=",".join(DEFAULT_BENCHMARKS),
+                        help=f"カンマ区切り（{', '.join(BENCHMARKS)}）")
+    parser.add_argument("--datasets", default=",".join(DEFAULT_DATASETS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--video", help="frame_spectra / optical_flow に使う動画（省略時は合成フレーム）")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--no-save", action="store_true", help="結果を履歴に保存しない")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--timeout", type=float, default=None)
+    parser.add_argument("--script-timeout", type=float, default=SCRIPT_TIMEOUT)
+    parser.add_argument("--scripts", help="scripts で実行するスクリプト（カンマ区切り、省略時は全部）")
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(json.loads(args.child))
+        return 0
+
+    benchmarks = [b for b in args.benchmarks.split(",") if b]
+    unknown = [b for b in benchmarks if b not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知のベンチマーク: {', '.join(unknown)}")
+    datasets = [d for d in args.datasets.split(",") if d]
+    options = {"script_timeout": args.script_timeout}
+    if args.video:
+        options["video"] = os.path.abspath(args.video)
+    if args.scripts:
+        options["scripts"] = args.scripts.split(",")
+
+    history = load_history()
+    results = []
+    regressions = []
+
+    def record(result):
+        reference = baseline(history, result["benchmark"], result["dataset"])
+        print_result(result, reference)
+        for name, before, now in find_regressions(result, reference, args.threshold):
+            regressions.append((result["benchmark"], result["dataset"], name, before, now))
+        results.append(result)
+
+    for dataset in datasets:
+        selected = [b for b in benchmarks if b in DATA_BENCHMARKS]
+        if not selected:
+            break
+        for benchmark in selected:
+            public_dir, work_dir, summary = prepare_dataset(dataset, args.seed)
+            result = run_benchmark(benchmark, dataset, public_dir, work_dir, options, args.timeout)
+            result["dataset_files"] = summary["files"]
+            result["dataset_bytes"] = summary["bytes"]
+            record(result)
+
+    frame_benchmarks = [b for b in benchmarks if b in FRAME_BENCHMARKS]
+    if frame_benchmarks:
+        work_dir = os.path.join(BENCH_DIR, "frames")
+        os.makedirs(work_dir, exist_ok=True)
+        dataset = "video" if args.video else "synthetic-frames"
+        for benchmark in frame_benchmarks:
+            record(run_benchmark(benchmark, dataset, None, work_dir, options, args.timeout))
+
+    print()
+    print_scaling(results)
+
+    if not args.no_save:
+        history.append({
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "label": args.label,
+            "results": results,
+        })
+        save_history(history)
+        print(f"結果を {_history_path()} に保存しました")
+
+    if regressions:
+        print(f"\n回帰（基準より {args.threshold:.0%} 以上の増加）:")
+        for benchmark, dataset, name, before, now in regressions:
+            print(f"  {benchmark} [{dataset}] {name}: {before:.3f} → {now:.3f}")
+        if args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
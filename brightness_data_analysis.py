@@ -13,12 +13,17 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
 import glob
-import re
 from scipy import stats
 from scipy.signal import find_peaks
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+from analysis_cache import AnalysisCache
+from knob_analytics import load_knob_traces, step_convergence, trial_statistics
+from profiling import enable_from_argv, profiled
+from trial_catalog import find_trials, parse_trial_filename
+
 # Set up plotting style
 try:
     plt.style.use('seaborn-v0_8')
@@ -31,18 +36,25 @@ except:
 sns.set_palette("husl")
 
 class BrightnessDataAnalyzer:
-    def __init__(self, data_path="public/BrightnessFunctionMixAndPhaseData"):
+    OUTPUTS = ('brightness_analysis_results.png', 'brightness_analysis_report.md')
+
+    def __init__(self, data_path="public/BrightnessFunctionMixAndPhaseData", cache=None):
         self.data_path = Path(data_path)
-        self.function_mix_data = {}
-        self.phase_data = {}
+        self.cache = cache
+        self.function_mix_paths = {}
+        self.phase_paths = {}
+        self.knob_metrics = {}
+        self.step_metrics = None
         self.participants = []
         
+    @profiled
     def load_data(self):
         """Load all CSV files and organize by experiment type"""
         print("Loading data files...")
         
-        # Get all CSV files
-        csv_files = list(self.data_path.glob("*.csv"))
+        # Get all FunctionMix / Phase trial files from the catalog (test files excluded)
+        records = find_trials(self.data_path, pattern=['FunctionMix', 'Phase'])
+        csv_files = [Path(record.path) for record in records]
         
         for file in csv_files:
             # Skip test files
@@ -53,15 +65,13 @@ class BrightnessDataAnalyzer:
             metadata = self._parse_filename(file.name)
             if metadata:
                 try:
-                    df = pd.read_csv(file)
-                    
-                    # Store data by experiment type
+                    # Store paths by experiment type (columns are read in compute_knob_metrics)
                     if metadata['experiment_type'] == 'FunctionMix':
                         key = f"{metadata['participant']}_{metadata['trial']}"
-                        self.function_mix_data[key] = df
+                        self.function_mix_paths[key] = file
                     elif metadata['experiment_type'] == 'Phase':
                         key = f"{metadata['participant']}_{metadata['trial']}_{metadata['blend_mode']}"
-                        self.phase_data[key] = df
+                        self.phase_paths[key] = file
                         
                     # Track participants
                     if metadata['participant'] not in self.participants:
@@ -70,45 +80,29 @@ class BrightnessDataAnalyzer:
                 except Exception as e:
                     print(f"Error loading {file.name}: {e}")
                     
-        print(f"Loaded {len(self.function_mix_data)} FunctionMix files")
-        print(f"Loaded {len(self.phase_data)} Phase files")
+        print(f"Loaded {len(self.function_mix_paths)} FunctionMix files")
+        print(f"Loaded {len(self.phase_paths)} Phase files")
         print(f"Participants: {self.participants}")
         
     def _parse_filename(self, filename):
         """Parse filename to extract metadata"""
-        # Pattern for FunctionMix: 20250715_135327_Fps1_CameraSpeed1_ExperimentPattern_FunctionMix_ParticipantName_ONO_TrialNumber_1.csv
-        # Pattern for Phase: 20250715_144516_Fps1_CameraSpeed1_ExperimentPattern_Phase_ParticipantName_ONO_TrialNumber_1_BrightnessBlendMode_LinearOnly.csv
-        
-        pattern_function = r'(\d{8}_\d{6})_Fps(\d+)_CameraSpeed(\d+)_ExperimentPattern_FunctionMix_ParticipantName_(\w+)_TrialNumber_(\d+)\.csv'
-        pattern_phase = r'(\d{8}_\d{6})_Fps(\d+)_CameraSpeed(\d+)_ExperimentPattern_Phase_ParticipantName_(\w+)_TrialNumber_(\d+)_BrightnessBlendMode_(\w+)\.csv'
-        
-        match_function = re.match(pattern_function, filename)
-        match_phase = re.match(pattern_phase, filename)
-        
-        if match_function:
-            return {
-                'timestamp': match_function.group(1),
-                'fps': int(match_function.group(2)),
-                'camera_speed': int(match_function.group(3)),
-                'participant': match_function.group(4),
-                'trial': int(match_function.group(5)),
-                'experiment_type': 'FunctionMix',
-                'blend_mode': None
-            }
-        elif match_phase:
-            return {
-                'timestamp': match_phase.group(1),
-                'fps': int(match_phase.group(2)),
-                'camera_speed': int(match_phase.group(3)),
-                'participant': match_phase.group(4),
-                'trial': int(match_phase.group(5)),
-                'experiment_type': 'Phase',
-                'blend_mode': match_phase.group(6)
-            }
-        else:
+        record = parse_trial_filename(filename)
+        # A filename without Fps or CameraSpeed cannot be analysed either
+        if (record is None or record.pattern not in ('FunctionMix', 'Phase')
+                or record.fps is None or record.camera_speed is None):
             print(f"Could not parse filename: {filename}")
             return None
+        return {
+            'timestamp': record.timestamp,
+            'fps': int(record.fps),
+            'camera_speed': int(record.camera_speed),
+            'participant': record.participant,
+            'trial': record.trial,
+            'experiment_type': record.pattern,
+            'blend_mode': record.blend_mode
+        }
     
+    @profiled
     def analyze_function_mix_experiment(self):
         """Analyze Function Mix experiment data"""
         print("\n=== Function Mix Experiment Analysis ===")
@@ -121,11 +115,9 @@ class BrightnessDataAnalyzer:
             # Collect all trials for this participant
             for trial in range(1, 7):  # 6 trials per participant
                 key = f"{participant}_{trial}"
-                if key in self.function_mix_data:
-                    df = self.function_mix_data[key]
-                    
+                if key in self.function_mix_paths:
                     # Calculate key metrics
-                    metrics = self._calculate_trial_metrics(df, trial)
+                    metrics = self._trial_metrics(key, trial)
                     if metrics is not None:
                         metrics['participant'] = participant
                         participant_data.append(metrics)
@@ -135,6 +127,7 @@ class BrightnessDataAnalyzer:
                 
         return results
     
+    @profiled
     def analyze_phase_experiment(self):
         """Analyze Phase experiment data"""
         print("\n=== Phase Experiment Analysis ===")
@@ -147,9 +140,8 @@ class BrightnessDataAnalyzer:
             # Analyze LinearOnly trials
             for trial in range(1, 4):  # Assuming 3 trials per mode
                 key = f"{participant}_{trial}_LinearOnly"
-                if key in self.phase_data:
-                    df = self.phase_data[key]
-                    metrics = self._calculate_trial_metrics(df, trial)
+                if key in self.phase_paths:
+                    metrics = self._trial_metrics(key, trial)
                     if metrics is not None:
                         metrics['participant'] = participant
                         metrics['blend_mode'] = 'LinearOnly'
@@ -158,9 +150,8 @@ class BrightnessDataAnalyzer:
             # Analyze Dynamic trials
             for trial in range(1, 4):
                 key = f"{participant}_{trial}_Dynamic"
-                if key in self.phase_data:
-                    df = self.phase_data[key]
-                    metrics = self._calculate_trial_metrics(df, trial)
+                if key in self.phase_paths:
+                    metrics = self._trial_metrics(key, trial)
                     if metrics is not None:
                         metrics['participant'] = participant
                         metrics['blend_mode'] = 'Dynamic'
@@ -171,58 +162,58 @@ class BrightnessDataAnalyzer:
                 
         return results
     
-    def _calculate_trial_metrics(self, df, trial):
-        """Calculate key metrics for a single trial"""
-        # Clean the data
-        df_clean = df.dropna()
-        
-        # Check if we have enough data
-        if len(df_clean) < 2:
-            print(f"Warning: Trial {trial} has insufficient data ({len(df_clean)} points)")
+    @profiled
+    def compute_knob_metrics(self):
+        """Compute per-trial knob metrics and per-step convergence for all trials at once
+        
+        Without a cache, every trial is loaded into one concatenated set of column arrays
+        and reduced in a single pass. With an AnalysisCache, only new or changed trials
+        are computed and the rest are reused.
+        """
+        paths = {**self.function_mix_paths, **self.phase_paths}
+        if self.cache is None:
+            traces = load_knob_traces(list(paths.values()), keys=list(paths))
+            table = trial_statistics(traces)
+            steps = step_convergence(traces)
+        else:
+            results = [self.cache.trial_result(path, 'knob_metrics', self._single_trial_metrics)
+                       for path in paths.values()]
+            table = pd.concat([trial for trial, _ in results])
+            table.index = pd.Index(list(paths), name='key')
+            steps = pd.concat([step.assign(key=key) for key, (_, step) in zip(paths, results)],
+                              ignore_index=True)
+        
+        self.knob_metrics = {key: row for key, row in zip(table.index, table.to_dict('records'))}
+        self.step_metrics = steps
+    
+    @staticmethod
+    def _single_trial_metrics(path):
+        traces = load_knob_traces([path])
+        return trial_statistics(traces), step_convergence(traces)
+    
+    def _trial_metrics(self, key, trial):
+        """Key metrics for one trial (None if it has too few data points)"""
+        metrics = self.knob_metrics[key]
+        if np.isnan(metrics['knob_mean']):
+            print(f"Warning: Trial {trial} has insufficient data ({metrics['data_points']} points)")
             return None
-        
-        # Basic statistics
-        knob_mean = df_clean[' Knob'].mean()
-        knob_std = df_clean[' Knob'].std()
-        knob_median = df_clean[' Knob'].median()
-        
-        # Response stability (coefficient of variation)
-        response_stability = knob_std / knob_mean if knob_mean != 0 else np.inf
-        
-        # Velocity analysis
-        velocity_mean = df_clean[' Velocity'].mean()
-        velocity_std = df_clean[' Velocity'].std()
-        
-        # Function ratio analysis
-        function_ratio_mean = df_clean[' FunctionRatio'].mean()
-        function_ratio_std = df_clean[' FunctionRatio'].std()
-        
-        # Response time analysis
-        try:
-            response_time = df_clean[' Time'].iloc[-1] - df_clean[' Time'].iloc[0]
-        except IndexError:
-            response_time = 0
-        
-        # Count number of adjustments (significant changes in knob value)
-        knob_diff = np.abs(df_clean[' Knob'].diff())
-        adjustment_threshold = 0.01  # Threshold for considering a change significant
-        num_adjustments = np.sum(knob_diff > adjustment_threshold)
-        
-        return {
-            'trial': trial,
-            'knob_mean': knob_mean,
-            'knob_std': knob_std,
-            'knob_median': knob_median,
-            'response_stability': response_stability,
-            'velocity_mean': velocity_mean,
-            'velocity_std': velocity_std,
-            'function_ratio_mean': function_ratio_mean,
-            'function_ratio_std': function_ratio_std,
-            'response_time': response_time,
-            'num_adjustments': num_adjustments,
-            'data_points': len(df_clean)
-        }
+        return dict(metrics, trial=trial)
+    
+    @profiled
+    def summarize_convergence(self):
+        """Print mean convergence metrics per experiment type and StepNumber"""
+        if self.step_metrics is None or self.step_metrics.empty:
+            return None
+        experiment = self.step_metrics['key'].map(
+            lambda key: 'FunctionMix' if key in self.function_mix_paths else 'Phase')
+        summary = (self.step_metrics.assign(experiment=experiment)
+                   .groupby(['experiment', 'StepNumber'])
+                   [['time_to_settle', 'reversals', 'plateau_length']].mean())
+        print("\n=== Knob Convergence by Step (Time in ms) ===")
+        print(summary.round(2).to_string())
+        return summary
     
+    @profiled
     def calculate_speed_equivalence(self, function_mix_results, phase_results):
         """Calculate speed equivalence metrics"""
         print("\n=== Speed Equivalence Analysis ===")
@@ -270,6 +261,7 @@ class BrightnessDataAnalyzer:
             
         return equivalence_results
     
+    @profiled
     def generate_visualizations(self, function_mix_results, phase_results, equivalence_results):
         """Generate comprehensive visualizations"""
         print("\n=== Generating Visualizations ===")
@@ -304,6 +296,7 @@ class BrightnessDataAnalyzer:
         plt.savefig('brightness_analysis_results.png', dpi=300, bbox_inches='tight')
         plt.show()
         
+    @profiled
     def _plot_function_mix_consistency(self, results):
         """Plot Function Mix trial consistency"""
         data = []
@@ -321,6 +314,7 @@ class BrightnessDataAnalyzer:
         plt.title('Function Mix: Knob Value Consistency\nAcross Trials')
         plt.ylabel('Mean Knob Value')
         
+    @profiled
     def _plot_phase_comparison(self, results):
         """Plot Phase experiment comparison"""
         data = []
@@ -338,6 +332,7 @@ class BrightnessDataAnalyzer:
         plt.title('Phase Experiment: LinearOnly vs Dynamic\nKnob Value Comparison')
         plt.ylabel('Mean Knob Value')
         
+    @profiled
     def _plot_speed_equivalence(self, results):
         """Plot speed equivalence analysis"""
         participants = list(results.keys())
@@ -357,6 +352,7 @@ class BrightnessDataAnalyzer:
         plt.legend()
         plt.grid(axis='y', alpha=0.3)
         
+    @profiled
     def _plot_response_stability(self, function_mix_results, phase_results):
         """Plot response stability analysis"""
         data = []
@@ -386,6 +382,7 @@ class BrightnessDataAnalyzer:
         plt.ylabel('Response Stability (CV)')
         plt.yscale('log')
         
+    @profiled
     def _plot_individual_performance(self, function_mix_results, phase_results):
         """Plot individual participant performance"""
         # This will show the learning/adaptation curve for each participant
@@ -402,6 +399,7 @@ class BrightnessDataAnalyzer:
         plt.legend()
         plt.grid(True, alpha=0.3)
         
+    @profiled
     def _plot_statistical_summary(self, results):
         """Plot statistical summary"""
         # Create a summary table visualization
@@ -427,6 +425,7 @@ class BrightnessDataAnalyzer:
         plt.axis('off')
         plt.title('Statistical Summary Table\nSpeed Equivalence Results')
         
+    @profiled
     def generate_report(self, function_mix_results, phase_results, equivalence_results):
         """Generate comprehensive analysis report"""
         print("\n=== Generating Analysis Report ===")
@@ -554,12 +553,19 @@ class BrightnessDataAnalyzer:
         
         return '\n'.join(report)
     
+    @profiled
     def run_complete_analysis(self):
-        """Run complete analysis pipeline"""
+        """Run complete analysis pipeline
+        
+        With an AnalysisCache, only new or changed trials are recomputed, and the figure
+        and report are regenerated only when the set of input files has changed.
+        """
         print("Starting comprehensive brightness data analysis...")
         
         # Load data
         self.load_data()
+        self.compute_knob_metrics()
+        self.summarize_convergence()
         
         # Analyze experiments
         function_mix_results = self.analyze_function_mix_experiment()
@@ -568,11 +574,24 @@ class BrightnessDataAnalyzer:
         # Calculate speed equivalence
         equivalence_results = self.calculate_speed_equivalence(function_mix_results, phase_results)
         
-        # Generate visualizations
-        self.generate_visualizations(function_mix_results, phase_results, equivalence_results)
+        input_paths = list(self.function_mix_paths.values()) + list(self.phase_paths.values())
+        if self.cache is not None and self.cache.is_current('brightness_outputs', input_paths, self.OUTPUTS):
+            print("\nInput data unchanged; keeping the existing figure and report")
+            with open('brightness_analysis_report.md', 'r', encoding='utf-8') as f:
+                report = f.read()
+        else:
+            # Generate visualizations
+            self.generate_visualizations(function_mix_results, phase_results, equivalence_results)
+            
+            # Generate report
+            report = self.generate_report(function_mix_results, phase_results, equivalence_results)
+            
+            if self.cache is not None:
+                self.cache.mark_current('brightness_outputs', input_paths)
         
-        # Generate report
-        report = self.generate_report(function_mix_results, phase_results, equivalence_results)
+        if self.cache is not None:
+            print(self.cache.summary())
+            self.cache.save()
         
         print("\n=== Analysis Complete ===")
         print("Files generated:")
@@ -588,5 +607,9 @@ class BrightnessDataAnalyzer:
 
 # Main execution
 if __name__ == "__main__":
-    analyzer = BrightnessDataAnalyzer()
+    # --profile[=path]: record per-stage timings (see profiling.py)
+    enable_from_argv()
+    # --incremental: reuse per-trial results from .analysis_cache for unchanged files
+    cache = AnalysisCache("brightness") if '--incremental' in sys.argv else None
+    analyzer = BrightnessDataAnalyzer(cache=cache)
     results = analyzer.run_complete_analysis()
\ No newline at end of file
@@ -0,0 +1,342 @@
+"""
+条件別の試行マニフェスト
+
+four.py などが読んでいた data/A.json（刺激_方向 → fps → CSVパス）は手で編集していたため、
+データを移動するとパスが古くなり、カテゴリの付け間違いも混ざっていた。ここでは
+ExperimentData / ExperimentData1 / ExperimentData2 / ExperimentDataO を走査し、
+ファイル名（trial_catalog.parse_trial_filename）から刺激・方向・fps・参加者を分類して、
+ファイルサイズ・行数・内容の SHA-1 と一緒に MANIFEST_FILENAME に保存する。
+サイズと更新時刻が前回と同じファイルは、前回の行数とハッシュをそのまま使う。
+
+condition_records() / condition_paths() は A.json と同じ形
+{カテゴリ: {"fps5": [...], ...}} を返す。どの試行を含めるかは CONDITION_SETS の
+ディレクトリごとの選択条件（参加者・実験日）で決め、カテゴリと fps はファイル名から決める。
+同じディレクトリ・カテゴリ・fps・参加者・trialNumber の試行が複数あるときは、
+撮り直しとみなして最も新しい試行だけを使う。並びは ディレクトリ → 参加者 → trialNumber
+→ 時刻 の順。
+
+手で編集した data/A.json・B.json・C.json は、この分類と次の点で違う:
+- Dots_forward の 60fps の欄に Natural_right の試行が、Natural_forward の 60fps の欄に
+  fps20 の試行が入れてある。Natural_forward の 10fps の欄には trialNumber1 が2回入っている
+- 撮り直しではない試行もいくつか外してあり、一部の欄は手で並べ替えてある
+
+これらの古いファイルを再現する必要があるときだけ legacy=True を渡す。例外は
+LEGACY_FILENAME（condition_legacy.json）にセットごとに記録してある（exclude: 外した試行、
+include: 別の欄に入れてあった試行、order: 並べ替えてあった試行の順序）。legacy=True でも
+参加者はファイル名のとおりの大文字・小文字で記録し（A.json は ExperimentData の c の
+ファイルを _C_ のパスで書いている）、パスは絶対パスで返す。
+
+C.json は B.json と同じ試行で、欄の名前が "5 fps" の形になっている（セット C）。
+D.json はパスではなく、セット A の試行から求めた参加者 A〜E ごとのベクション持続時間の
+平均なので、セット D はその元になる試行（セット A と同じ）を返す。
+
+使い方:
+    python condition_manifest.py              # マニフェストを更新する
+    paths = condition_paths(load_manifest(), "A")
+    legacy_paths = condition_paths(load_manifest(), "A", legacy=True)   # data/A.json と同じ
+"""
+
+import hashlib
+import json
+import os
+import sys
+from collections import defaultdict
+
+from trial_catalog import DEFAULT_ROOT, parse_trial_filename
+
+MANIFEST_FILENAME = ".condition_manifest.json"
+MANIFEST_VERSION = 2
+_READ_CHUNK = 1 << 20
+
+MANIFEST_DIRECTORIES = ("ExperimentData", "ExperimentData1", "ExperimentData2", "ExperimentDataO")
+# 刺激・方向がファイル名にない初期の実験は前方向のドット刺激
+DEFAULT_CATEGORY = "Dots_forward"
+CATEGORIES = ("Dots_forward", "Dots_right", "Natural_right", "Natural_forward")
+FPS_BUCKETS = (5, 10, 30, 60)
+CONTINUOUS_FPS = 60
+
+# 手で編集した data/*.json の例外（legacy=True のときだけ使う）
+LEGACY_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "condition_legacy.json")
+
+# directories: ディレクトリごとの選択条件（participants: 参加者、dates: 実験日）
+# bucket_format: 欄の名前（A.json は "fps5"、C.json は "5 fps"）
+# legacy: LEGACY_FILENAME の中の、このセットの例外の名前
+CONDITION_SETS = {
+    # 全参加者（data/A.json）
+    "A": {
+        "directories": {
+            "ExperimentDataO": {},
+            "ExperimentData1": {"participants": ["B"], "dates": ["20241113"]},
+            "ExperimentData": {},
+        },
+        "legacy": "A",
+    },
+    # 最初の2人（data/B.json）
+    "B": {
+        "directories": {
+            "ExperimentDataO": {},
+            "ExperimentData1": {"participants": ["B"], "dates": ["20241113"]},
+        },
+        "legacy": "B",
+    },
+}
+# data/C.json（B と同じ試行、欄の名前が "5 fps"）
+CONDITION_SETS["C"] = dict(CONDITION_SETS["B"], bucket_format="{fps} fps")
+# data/D.json（A の試行から求めた参加者ごとの値）の元になる試行
+CONDITION_SETS["D"] = CONDITION_SETS["A"]
+DEFAULT_BUCKET_FORMAT = "fps{fps}"
+
+def _scan_file(path):
+    """ファイルを一度だけ読み、(データ行数, SHA-1) を返す"""
+    digest = hashlib.sha1()
+    newlines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_READ_CHUNK), b""):
+            digest.update(chunk)
+            newlines += chunk.count(b"\n")
+            last = chunk[-1:]
+    lines = newlines + (last != b"\n")
+    return max(lines - 1, 0), digest.hexdigest()
+
+
+def classify(record):
+    """TrialRecord から (カテゴリ, fps) を返す"""
+    if record.stimulus and record.direction:
+        category = f"{record.stimulus}_{record.direction}"
+    else:
+        category = DEFAULT_CATEGORY
+    return category, record.fps
+
+
+def _manifest_path(root):
+    return os.path.join(root, MANIFEST_FILENAME)
+
+
+def _read_manifest(root):
+    path = _manifest_path(root)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def build_manifest(root=DEFAULT_ROOT, directories=MANIFEST_DIRECTORIES, rebuild=False):
+    """ディレクトリを走査してマニフェストを作り、保存して返す
+
+    前回のマニフェストにあり、サイズと更新時刻が変わっていないファイルは読み直さない。
+    """
+    root = os.path.abspath(root)
+    previous = {} if rebuild else {
+        entry["path"]: entry for entry in (_read_manifest(root) or {}).get("trials", [])
+    }
+
+    trials = []
+    scanned = 0
+    for directory in directories:
+        dir_path = os.path.join(root, directory)
+        if not os.path.isdir(dir_path):
+            print(f"ディレクトリが見つかりません: {dir_path}")
+            continue
+        for filename in sorted(os.listdir(dir_path)):
+            if not filename.endswith(".csv"):
+                continue
+            path = os.path.join(dir_path, filename)
+            record = parse_trial_filename(path)
+            if record is None:
+                print(f"ファイル名を解析できません: {filename}")
+                continue
+
+            relpath = f"{directory}/{filename}"
+            st = os.stat(path)
+            entry = previous.get(relpath)
+            if entry is None or entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+                rows, sha1 = _scan_file(path)
+                scanned += 1
+            else:
+                rows, sha1 = entry["rows"], entry["sha1"]
+
+            category, fps = classify(record)
+            trials.append({
+                "path": relpath,
+                "directory": directory,
+                "category": category,
+                "fps": fps,
+                "method": record.method,
+                "participant": record.participant,
+                "trial": record.trial,
+                "timestamp": record.timestamp,
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "rows": rows,
+                "sha1": sha1,
+            })
+
+    manifest = {"version": MANIFEST_VERSION, "directories": list(directories), "trials": trials}
+    path = _manifest_path(root)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    print(f"{len(trials)} 試行をマニフェストに登録しました（読み直し {scanned} ファイル）")
+    return manifest
+
+
+def _is_current(manifest, root):
+    """マニフェストのファイルがすべて変わっておらず、新しいファイルもなければ True"""
+    listed = {}
+    for entry in manifest["trials"]:
+        listed[entry["path"]] = entry
+    for directory in manifest["directories"]:
+        dir_path = os.path.join(root, directory)
+        if not os.path.isdir(dir_path):
+            continue
+        for filename in os.listdir(dir_path):
+            if not filename.endswith(".csv"):
+                continue
+            entry = listed.pop(f"{directory}/{filename}", None)
+            if entry is None:
+                # 解析できないファイル名はマニフェストに入らないので、ここで確かめる
+                if parse_trial_filename(os.path.join(dir_path, filename)) is not None:
+                    return False
+                continue
+            st = os.stat(os.path.join(dir_path, filename))
+            if entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+                return False
+    return not listed
+
+
+def load_manifest(root=DEFAULT_ROOT):
+    """保存済みのマニフェストを返す（ファイルの追加・削除・変更があれば差分だけ更新する）"""
+    root = os.path.abspath(root)
+    manifest = _read_manifest(root)
+    if manifest is not None and _is_current(manifest, root):
+        return manifest
+    return build_manifest(root)
+
+
+def _selected(entry, rules):
+    if entry["directory"] not in rules:
+        return False
+    rule = rules[entry["directory"]]
+    date = entry["timestamp"][:8]
+    if not entry["participant"]:
+        return False
+    if rule.get("participants") and entry["participant"] not in rule["participants"]:
+        return False
+    if rule.get("dates") and date not in rule["dates"]:
+        return False
+    # 60fps は連続提示、それ未満は輝度混合の試行だけを使う
+    expected = "continuous" if entry["fps"] == CONTINUOUS_FPS else "luminanceMixture"
+    return entry["method"] == expected
+
+
+def load_legacy_exceptions(name, path=LEGACY_FILENAME):
+    """LEGACY_FILENAME のセット name の例外を (exclude, include, order) で返す
+
+    include は (カテゴリ, fps, パス) のリスト、order は {(カテゴリ, fps): [パス, ...]}。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        exceptions = json.load(f)[name]
+    include = [(item["category"], item["fps"], item["path"]) for item in exceptions.get("include", ())]
+    order = {(item["category"], item["fps"]): item["paths"] for item in exceptions.get("order", ())}
+    return list(exceptions.get("exclude", ())), include, order
+
+
+def _latest_takes(entries):
+    """同じディレクトリ・参加者・trialNumber の試行が複数あれば、最も新しいものだけを残す"""
+    latest = {}
+    for entry in entries:
+        key = (entry["directory"], entry["participant"].upper(), entry["trial"])
+        if key not in latest or entry["timestamp"] > latest[key]["timestamp"]:
+            latest[key] = entry
+    return list(latest.values())
+
+
+def _sort_key(entry, directories):
+    # 参加者の大文字・小文字は区別しないで並べる（ExperimentData の C と c）
+    return (directories.index(entry["directory"]), entry["participant"].upper(),
+            entry["trial"] if entry["trial"] is not None else 0, entry["timestamp"])
+
+
+def _ordered(entries, directories, order):
+    """ディレクトリ → 参加者 → trialNumber → 時刻 の順に並べ、order にある試行どうしは
+    それらが占める位置の中で order の順に並べ直す"""
+    entries = sorted(entries, key=lambda entry: _sort_key(entry, directories))
+    slots = [i for i, entry in enumerate(entries) if entry["path"] in order]
+    listed = sorted((entries[i] for i in slots), key=lambda entry: order.index(entry["path"]))
+    for i, entry in zip(slots, listed):
+        entries[i] = entry
+    return entries
+
+
+def condition_records(manifest, condition_set="A", root=DEFAULT_ROOT,
+                      categories=CATEGORIES, fps_buckets=FPS_BUCKETS, legacy=False):
+    """{カテゴリ: {"fps5": [エントリ, ...]}} を返す（エントリの path は絶対パス）
+
+    condition_set は CONDITION_SETS の名前か、同じ形の辞書
+    （"directories" がなければ、辞書全体をディレクトリごとの選択条件とみなす）。
+    legacy=True なら撮り直しを自動では除かず、LEGACY_FILENAME の例外を当てて
+    手で編集した data/*.json と同じ試行を同じ順に返す。
+    """
+    spec = CONDITION_SETS[condition_set] if isinstance(condition_set, str) else condition_set
+    if "directories" not in spec:
+        spec = {"directories": spec}
+    rules = spec["directories"]
+    directories = list(rules)
+    bucket_format = spec.get("bucket_format", DEFAULT_BUCKET_FORMAT)
+    root = os.path.abspath(root)
+    if legacy:
+        if "legacy" not in spec:
+            raise ValueError(f"条件セット {condition_set!r} には legacy の例外がありません")
+        excluded, included, order = load_legacy_exceptions(spec["legacy"])
+        excluded = set(excluded)
+    else:
+        excluded, included, order = set(), [], {}
+
+    selected = {(category, fps): [] for category in categories for fps in fps_buckets}
+    for entry in manifest["trials"]:
+        key = (entry["category"], entry["fps"])
+        if key in selected and entry["path"] not in excluded and _selected(entry, rules):
+            selected[key].append(entry)
+    by_path = {entry["path"]: entry for entry in manifest["trials"]}
+    for category, fps, path in included:
+        if (category, fps) in selected and path in by_path:
+            selected[(category, fps)].append(by_path[path])
+
+    grouped = {category: {} for category in categories}
+    for (category, fps), entries in selected.items():
+        if not legacy:
+            entries = _latest_takes(entries)
+        entries = _ordered(entries, directories, order.get((category, fps), []))
+        grouped[category][bucket_format.format(fps=int(fps))] = [
+            dict(entry, path=os.path.join(root, *entry["path"].split("/"))) for entry in entries]
+    return grouped
+
+
+def condition_paths(manifest, condition_set="A", root=DEFAULT_ROOT, **kwargs):
+    """data/A.json と同じ形の {カテゴリ: {"fps5": [パス, ...]}} を返す"""
+    records = condition_records(manifest, condition_set, root, **kwargs)
+    return {
+        category: {bucket: [entry["path"] for entry in entries] for bucket, entries in buckets.items()}
+        for category, buckets in records.items()
+    }
+
+
+def total_rows(entries):
+    """エントリの行数の合計（複数試行をまとめる配列の事前確保用）"""
+    return sum(entry["rows"] for entry in entries)
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != "--rebuild"]
+    root = args[0] if args else DEFAULT_ROOT
+    manifest = build_manifest(root, rebuild="--rebuild" in sys.argv)
+    counts = defaultdict(int)
+    for entry in manifest["trials"]:
+        counts[entry["directory"]] += 1
+    for directory, count in sorted(counts.items()):
+        print(f"  {directory}: {count}")
@@ -1,4 +1,3 @@
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -6,6 +5,8 @@ from scipy import stats
 import os
 import glob
 
+from trial_store import read_trial
+
 # Font settings for English text
 plt.rcParams['font.family'] = 'Arial'
 plt.rcParams['axes.unicode_minus'] = False
@@ -34,8 +35,7 @@ def load_phase_data():
             dynamic_data[participant] = []
             for file in dynamic_files:
                 try:
-                    df = pd.read_csv(file)
-                    df.columns = df.columns.str.strip()
+                    df = read_trial(file)
                     
                     params = extract_parameters_from_file(df)
                     if params:
@@ -52,8 +52,7 @@ def load_phase_data():
             linear_data[participant] = []
             for file in linear_files:
                 try:
-                    df = pd.read_csv(file)
-                    df.columns = df.columns.str.strip()
+                    df = read_trial(file)
                     
                     params = extract_parameters_from_file(df)
                     if params:
@@ -1,40 +1,36 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import os
-import glob
 from scipy import stats
-from scipy.optimize import curve_fit
 import seaborn as sns
 from matplotlib import rcParams
 
+from trial_catalog import find_trials
+from profiling import enable_from_argv, profiled
+from trial_store import read_trial
+from velocity_curves import velocity_curve
+from velocity_parameters import extract_grouped_parameters
+from velocity_fit import fit_table, fit_trials
+
 # 日本語フォント設定
 plt.rcParams['font.family'] = 'DejaVu Sans'
 plt.rcParams['axes.unicode_minus'] = False
 
+@profiled
 def load_experiment1_data(data_dir):
     """実験1のデータファイル（LinearOnlyで終わるファイル）を読み込む"""
-    pattern = os.path.join(data_dir, "*BrightnessBlendMode_LinearOnly.csv")
-    files = glob.glob(pattern)
+    records = find_trials(data_dir, blend_mode="LinearOnly")
     
     all_data = []
-    for file in files:
-        # ファイル名から被験者情報を抽出
-        filename = os.path.basename(file)
-        parts = filename.split('_')
-        
-        # 被験者名を抽出
-        participant_idx = parts.index('ParticipantName') + 1
-        participant = parts[participant_idx]
-        
-        # 試行回数を抽出
-        trial_idx = parts.index('TrialNumber') + 1
-        trial = int(parts[trial_idx])
+    for record in records:
+        # ファイル名から被験者情報を抽出（カタログで解析済み）
+        file = record.path
+        filename = record.filename
+        participant = record.participant
+        trial = record.trial
         
         try:
-            df = pd.read_csv(file)
-            # 列名の空白を削除
-            df.columns = df.columns.str.strip()
+            df = read_trial(file)
             df['Participant'] = participant
             df['Trial'] = trial
             df['Filename'] = filename
@@ -45,6 +41,7 @@ def load_experiment1_data(data_dir):
     
     return pd.concat(all_data, ignore_index=True) if all_data else None
 
+@profiled
 def analyze_velocity_perception(data):
     """速度知覚の分析"""
     # 基本統計量
@@ -69,6 +66,7 @@ def analyze_velocity_perception(data):
     
     return participant_stats, correlation
 
+@profiled
 def create_velocity_analysis_plots(data):
     """Create velocity perception analysis plots"""
     fig, axes = plt.subplots(2, 2, figsize=(15, 12))
@@ -140,62 +138,48 @@ def create_velocity_analysis_plots(data):
     
     return fig
 
-def extract_velocity_parameters(df):
-    """参考ファイルの方法で5つの速度パラメータを抽出"""
-    # 参考ファイルの方法に基づいてパラメータを抽出
-    v0_series = df[df["StepNumber"] == 0]["Velocity"]
-    V0 = v0_series.iloc[-1] if not v0_series.empty else 0
-    
-    A1 = df[df["StepNumber"] == 1]["Amplitude"].iloc[-1] if not df[df["StepNumber"] == 1].empty else 0
-    φ1 = df[df["StepNumber"] == 2]["Amplitude"].iloc[-1] if not df[df["StepNumber"] == 2].empty else 0
-    A2 = df[df["StepNumber"] == 3]["Amplitude"].iloc[-1] if not df[df["StepNumber"] == 3].empty else 0
-    φ2 = df[df["StepNumber"] == 4]["Amplitude"].iloc[-1] if not df[df["StepNumber"] == 4].empty else 0
-    
-    params = {
-        'V0': V0,
-        'A1': A1,
-        'φ1': φ1,
-        'A2': A2,
-        'φ2': φ2
-    }
-    
-    return params
-
+@profiled
 def analyze_velocity_parameters(data):
     """各被験者の速度パラメータを分析"""
     print("\n=== 速度パラメータ分析 ===")
     
-    # 被験者ごとにデータを分割
-    participants = data['Participant'].unique()
+    # 全被験者・全試行のパラメータを一括で抽出
     all_params = {}
     
-    for participant in participants:
-        participant_data = data[data['Participant'] == participant]
-        trials = participant_data['Trial'].unique()
+    for (participant, trial), params in extract_grouped_parameters(data).items():
+        all_params.setdefault(participant, {})[trial] = params
         
-        participant_params = {}
-        for trial in trials:
-            trial_data = participant_data[participant_data['Trial'] == trial]
-            
-            # パラメータを抽出
-            params = extract_velocity_parameters(trial_data)
-            participant_params[trial] = params
-            
-            print(f"被験者 {participant}, 試行 {trial}: V0={params['V0']:.3f}, A1={params['A1']:.3f}, φ1={params['φ1']:.3f} ({params['φ1']/np.pi:.3f}π), A2={params['A2']:.3f}, φ2={params['φ2']:.3f} ({params['φ2']/np.pi:.3f}π)")
-            print(f"  Note: φ values include π offset from experiment implementation")
-        
-        all_params[participant] = participant_params
+        print(f"被験者 {participant}, 試行 {trial}: V0={params['V0']:.3f}, A1={params['A1']:.3f}, φ1={params['φ1']:.3f} ({params['φ1']/np.pi:.3f}π), A2={params['A2']:.3f}, φ2={params['φ2']:.3f} ({params['φ2']/np.pi:.3f}π)")
+        print(f"  Note: φ values include π offset from experiment implementation")
     
     return all_params
 
+@profiled
+def analyze_fitted_parameters(data_dir):
+    """Velocity 列に各 StepNumber の提示信号を当てはめ、ノブの値が記録を再現するかを確かめる"""
+    print("\n=== v(t) フィットによる速度パラメータ ===")
+    fits = fit_trials(find_trials(data_dir, pattern="Phase", blend_mode="LinearOnly"))
+    table = fit_table(fits)
+    if table.empty:
+        print("フィットできる試行がありません。")
+        return table
+    
+    for _, row in table.iterrows():
+        print(f"{row['filename']}: V0={row['V0']:.3f}±{row['se_V0']:.3f} (ノブ {row['knob_V0']:.3f}), "
+              f"A1={row['A1']:.3f}±{row['se_A1']:.3f} (ノブ {row['knob_A1']:.3f}), "
+              f"A2={row['A2']:.3f}±{row['se_A2']:.3f} (ノブ {row['knob_A2']:.3f}), "
+              f"残差RMS={row['residual_rms']:.4f}, ノブの残差RMS={row['knob_rms']:.4f} ({row['n_samples']}点)")
+    print(f"ノブの値とフィットの両方が記録を再現した試行: {int(table['reproduces'].sum())}/{len(table)}")
+    
+    return table
+
 def create_velocity_curve(par, t):
     """Calculate velocity function v(t) = V₀ + A₁sin(ωt + φ₁) + A₂sin(2ωt + φ₂)
     Note: The actual implementation includes +π offset, but we display the standard formula"""
-    V0, A1, φ1, A2, φ2 = par
-    ω = 2 * np.pi
-    # Apply π offset as used in the actual experiment
-    return V0 + A1 * np.sin(ω * t + φ1 + np.pi) + A2 * np.sin(2 * ω * t + φ2 + np.pi)
+    # π offset as used in the actual experiment is applied by velocity_curves
+    return velocity_curve(par, t)
 
+@profiled
 def plot_velocity_parameters(all_params):
     """Visualize velocity parameters"""
     print("\n=== Velocity Parameters Visualization ===")
@@ -282,6 +266,7 @@ def plot_velocity_parameters(all_params):
     
     return fig
 
+@profiled
 def analyze_nonlinearity(data):
     """速度知覚の非線形性を分析"""
     print("\n=== 速度知覚の非線形性分析 ===")
@@ -311,6 +296,7 @@ def analyze_nonlinearity(data):
     
     return bin_stats, f_stat, p_value, mean_deviation
 
+@profiled
 def create_nonlinearity_plot(data):
     """Create nonlinearity analysis plots"""
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
@@ -396,6 +382,7 @@ Figure X (Relationship between brightness mixing ratio and perceived velocity) p
     
     return text
 
+@profiled
 def main():
     """メイン関数"""
     data_dir = "public/BrightnessFunctionMixAndPhaseData"
@@ -416,6 +403,7 @@ def main():
     # 速度パラメータ分析（参考ファイルの方法）
     print("\n=== 参考ファイルの方法による速度パラメータ分析 ===")
     all_params = analyze_velocity_parameters(data)
+    fitted_params = analyze_fitted_parameters(data_dir)
     
     # 非線形性分析
     bin_stats, f_stat, p_value, mean_deviation = analyze_nonlinearity(data)
@@ -438,4 +426,5 @@ def main():
     print("プロットを 'experiment1_velocity_analysis.png', 'experiment1_nonlinearity_analysis.png', 'experiment1_velocity_parameters.png' に保存しました。")
 
 if __name__ == "__main__":
+    enable_from_argv()
     main()
\ No newline at end of file
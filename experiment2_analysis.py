@@ -1,43 +1,42 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import os
-import glob
+import sys
 from scipy import stats
 from scipy.optimize import curve_fit
 import seaborn as sns
 from matplotlib import rcParams
 
+from analysis_cache import AnalysisCache, trial_final_function_ratio
+from figure_renderer import FigureJob, render_figures
+from profiling import enable_from_argv, profiled
+from trial_catalog import find_trials
+from trial_store import read_trial
+from velocity_curves import velocity_curve
+from velocity_parameters import extract_grouped_parameters, trial_velocity_parameters
+
 # Font settings for English text
 plt.rcParams['font.family'] = 'Arial'
 plt.rcParams['axes.unicode_minus'] = False
 
+# 実験1との比較に使うデータ（LinearOnly の試行）
+EXPERIMENT1_DATA_DIR = "public/BrightnessData"
+
+@profiled
 def load_experiment2_function_mix_data(data_dir):
     """実験2の前半部分：FunctionMixデータ（6回の探索実験）を読み込む"""
-    pattern = os.path.join(data_dir, "*ExperimentPattern_FunctionMix_ParticipantName_*.csv")
-    files = glob.glob(pattern)
+    records = find_trials(data_dir, pattern="FunctionMix")
     
     all_data = {}
-    for file in files:
-        # ファイル名から被験者情報を抽出
-        filename = os.path.basename(file)
-        parts = filename.split('_')
-        
-        # 被験者名を抽出
-        participant_idx = parts.index('ParticipantName') + 1
-        participant = parts[participant_idx]
-        
-        # 試行回数を抽出
-        trial_idx = parts.index('TrialNumber') + 1
-        trial_str = parts[trial_idx]
-        if trial_str.endswith('.csv'):
-            trial_str = trial_str.replace('.csv', '')
-        trial = int(trial_str)
+    for record in records:
+        # ファイル名から被験者情報を抽出（カタログで解析済み）
+        file = record.path
+        filename = record.filename
+        participant = record.participant
+        trial = record.trial
         
         try:
-            df = pd.read_csv(file)
-            # 列名の空白を削除
-            df.columns = df.columns.str.strip()
+            df = read_trial(file)
             df['Participant'] = participant
             df['Trial'] = trial
             df['Filename'] = filename
@@ -52,32 +51,21 @@ def load_experiment2_function_mix_data(data_dir):
     
     return all_data
 
+@profiled
 def load_experiment2_phase_data(data_dir):
     """実験2の後半部分：Phaseデータ（3回のパラメータ調整実験）を読み込む"""
-    pattern = os.path.join(data_dir, "*ExperimentPattern_Phase_ParticipantName_*BrightnessBlendMode_Dynamic.csv")
-    files = glob.glob(pattern)
+    records = find_trials(data_dir, pattern="Phase", blend_mode="Dynamic")
     
     all_data = []
-    for file in files:
-        # ファイル名から被験者情報を抽出
-        filename = os.path.basename(file)
-        parts = filename.split('_')
-        
-        # 被験者名を抽出
-        participant_idx = parts.index('ParticipantName') + 1
-        participant = parts[participant_idx]
-        
-        # 試行回数を抽出
-        trial_idx = parts.index('TrialNumber') + 1
-        trial_str = parts[trial_idx]
-        if trial_str.endswith('.csv'):
-            trial_str = trial_str.replace('.csv', '')
-        trial = int(trial_str)
+    for record in records:
+        # ファイル名から被験者情報を抽出（カタログで解析済み）
+        file = record.path
+        filename = record.filename
+        participant = record.participant
+        trial = record.trial
         
         try:
-            df = pd.read_csv(file)
-            # 列名の空白を削除
-            df.columns = df.columns.str.strip()
+            df = read_trial(file)
             df['Participant'] = participant
             df['Trial'] = trial
             df['Filename'] = filename
@@ -88,34 +76,40 @@ def load_experiment2_phase_data(data_dir):
     
     return pd.concat(all_data, ignore_index=True) if all_data else None
 
+@profiled
 def analyze_function_mix_exploration(function_mix_data):
     """前半部分：6回の探索実験の分析"""
+    # 各試行の最終的なFunctionRatio値（最後の行の値）を取得
+    final_ratios = {
+        participant: {trial_num: df['FunctionRatio'].iloc[-1] for trial_num, df in trials.items()}
+        for participant, trials in function_mix_data.items()
+    }
+    return summarize_exploration(final_ratios)
+
+def summarize_exploration(final_ratios):
+    """被験者ごとの最終FunctionRatio {被験者: {試行: 値}} から統計量をまとめる"""
     print("\n=== 実験2前半：FunctionMix探索実験の分析 ===")
     
     # 各被験者の6回の試行結果を分析
     exploration_results = {}
     
-    for participant, trials in function_mix_data.items():
+    for participant, trials in final_ratios.items():
         print(f"\n被験者 {participant} の探索結果:")
         
-        # 各試行の最終的なFunctionRatio値を取得
-        final_ratios = []
-        for trial_num, df in trials.items():
-            # 最後の20%のデータから最終的なFunctionRatioを取得
-            final_data = df.tail(int(len(df) * 0.2))
-            final_ratio = final_data['FunctionRatio'].iloc[-1]
-            final_ratios.append(final_ratio)
+        ratios = []
+        for trial_num, final_ratio in trials.items():
+            ratios.append(final_ratio)
             print(f"  試行 {trial_num}: FunctionRatio = {final_ratio:.3f}")
         
         # 統計量を計算
-        mean_ratio = np.mean(final_ratios)
-        std_ratio = np.std(final_ratios)
-        median_ratio = np.median(final_ratios)
+        mean_ratio = np.mean(ratios)
+        std_ratio = np.std(ratios)
+        median_ratio = np.median(ratios)
         
         print(f"  平均: {mean_ratio:.3f}, 標準偏差: {std_ratio:.3f}, 中央値: {median_ratio:.3f}")
         
         exploration_results[participant] = {
-            'trials': final_ratios,
+            'trials': ratios,
             'mean': mean_ratio,
             'std': std_ratio,
             'median': median_ratio
@@ -123,67 +117,35 @@ def analyze_function_mix_exploration(function_mix_data):
     
     return exploration_results
 
-def extract_velocity_parameters(df):
-    """参考ファイルの方法で5つの速度パラメータを抽出"""
-    # 参考ファイルの方法に基づいてパラメータを抽出
-    v0_series = df[df["StepNumber"] == 0]["Velocity"]
-    V0 = v0_series.iloc[-1] if not v0_series.empty else 0
-    
-    A1 = df[df["StepNumber"] == 1]["Amplitude"].iloc[-1] if not df[df["StepNumber"] == 1].empty else 0
-    φ1 = df[df["StepNumber"] == 2]["Amplitude"].iloc[-1] if not df[df["StepNumber"] == 2].empty else 0
-    A2 = df[df["StepNumber"] == 3]["Amplitude"].iloc[-1] if not df[df["StepNumber"] == 3].empty else 0
-    φ2 = df[df["StepNumber"] == 4]["Amplitude"].iloc[-1] if not df[df["StepNumber"] == 4].empty else 0
-    
-    params = {
-        'V0': V0,
-        'A1': A1,
-        'φ1': φ1,
-        'A2': A2,
-        'φ2': φ2
-    }
-    
-    return params
-
+@profiled
 def analyze_velocity_parameters_phase(phase_data):
     """後半部分：3回のパラメータ調整実験の分析"""
+    # 全被験者・全試行のパラメータを一括で抽出
+    return summarize_phase_parameters(extract_grouped_parameters(phase_data))
+
+def summarize_phase_parameters(trial_params):
+    """{(被験者, 試行): パラメータ辞書} を被験者ごとにまとめて表示する"""
     print("\n=== 実験2後半：Phaseパラメータ調整実験の分析 ===")
     
-    # 被験者ごとにデータを分割
-    participants = phase_data['Participant'].unique()
     all_params = {}
     
-    for participant in participants:
-        participant_data = phase_data[phase_data['Participant'] == participant]
-        trials = participant_data['Trial'].unique()
-        
-        participant_params = {}
-        for trial in trials:
-            trial_data = participant_data[participant_data['Trial'] == trial]
-            
-            # パラメータを抽出
-            params = extract_velocity_parameters(trial_data)
-            participant_params[trial] = params
-            
-            print(f"被験者 {participant}, 試行 {trial}: V0={params['V0']:.3f}, A1={params['A1']:.3f}, φ1={params['φ1']:.3f} ({params['φ1']/np.pi:.3f}π), A2={params['A2']:.3f}, φ2={params['φ2']:.3f} ({params['φ2']/np.pi:.3f}π)")
-            print(f"  Note: φ values include π offset from experiment implementation")
+    for (participant, trial), params in trial_params.items():
+        all_params.setdefault(participant, {})[trial] = params
         
-        all_params[participant] = participant_params
+        print(f"被験者 {participant}, 試行 {trial}: V0={params['V0']:.3f}, A1={params['A1']:.3f}, φ1={params['φ1']:.3f} ({params['φ1']/np.pi:.3f}π), A2={params['A2']:.3f}, φ2={params['φ2']:.3f} ({params['φ2']/np.pi:.3f}π)")
+        print(f"  Note: φ values include π offset from experiment implementation")
     
     return all_params
 
 def create_velocity_curve(par, t):
     """Calculate velocity function v(t) = V₀ + A₁sin(ωt + φ₁) + A₂sin(2ωt + φ₂)
     Note: The actual implementation includes +π offset, but we display the standard formula"""
-    V0, A1, φ1, A2, φ2 = par
-    ω = 2 * np.pi
-    # Apply π offset as used in the actual experiment
-    return V0 + A1 * np.sin(ω * t + φ1 + np.pi) + A2 * np.sin(2 * ω * t + φ2 + np.pi)
+    # π offset as used in the actual experiment is applied by velocity_curves
+    return velocity_curve(par, t)
 
-def plot_experiment2_results(exploration_results, phase_params):
-    """実験2の結果を可視化"""
-    print("\n=== 実験2結果の可視化 ===")
-    
-    # 図1: 探索実験の結果
+@profiled
+def plot_exploration_figure(exploration_results):
+    """図1: 探索実験の結果"""
     fig1, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
     fig1.suptitle('Experiment 2 (Part 1): FunctionMix Exploration Results', fontsize=16, fontweight='bold')
     
@@ -214,10 +176,13 @@ def plot_experiment2_results(exploration_results, phase_params):
     ax2.grid(True, alpha=0.3)
     
     plt.tight_layout()
-    plt.savefig('experiment2_exploration_results.png', dpi=300, bbox_inches='tight')
-    plt.show()
+    return fig1
+
+@profiled
+def plot_phase_parameter_figure(exploration_results, phase_params):
+    """図2: パラメータ調整実験の結果"""
+    participants = list(exploration_results.keys())
     
-    # 図2: パラメータ調整実験の結果
     fig2, axes = plt.subplots(2, 3, figsize=(18, 12))
     fig2.suptitle('Experiment 2 (Part 2): Phase Parameter Adjustment Results\nv(t) = V0 + A1*sin(ωt + φ1) + A2*sin(2ωt + φ2)', fontsize=16, fontweight='bold')
     
@@ -296,11 +261,35 @@ def plot_experiment2_results(exploration_results, phase_params):
                        verticalalignment='top', bbox=dict(facecolor='white', alpha=0.8, edgecolor='gray'))
     
     plt.tight_layout()
-    plt.savefig('experiment2_phase_parameters.png', dpi=300, bbox_inches='tight')
+    return fig2
+
+@profiled
+def plot_experiment2_results(exploration_results, phase_params, render_jobs=None):
+    """実験2の結果を可視化
+
+    render_jobs にリストを渡すと、その場では描画せずに FigureJob を追加する
+    （main でまとめて figure_renderer.render_figures に渡す）。
+    """
+    print("\n=== 実験2結果の可視化 ===")
+    
+    if render_jobs is not None:
+        render_jobs.append(FigureJob(plot_exploration_figure, (exploration_results,),
+                                     outputs=('experiment2_exploration_results.png',)))
+        render_jobs.append(FigureJob(plot_phase_parameter_figure, (exploration_results, phase_params),
+                                     outputs=('experiment2_phase_parameters.png',)))
+        return render_jobs
+    
+    fig1 = plot_exploration_figure(exploration_results)
+    fig1.savefig('experiment2_exploration_results.png', dpi=300, bbox_inches='tight')
+    plt.show()
+    
+    fig2 = plot_phase_parameter_figure(exploration_results, phase_params)
+    fig2.savefig('experiment2_phase_parameters.png', dpi=300, bbox_inches='tight')
     plt.show()
     
     return fig1, fig2
 
+@profiled
 def compare_experiments(exploration_results, phase_params):
     """実験1と実験2の比較分析"""
     print("\n=== 実験1と実験2の比較分析 ===")
@@ -323,25 +312,19 @@ def compare_experiments(exploration_results, phase_params):
     print("\n実験1のデータを読み込み中...")
     try:
         # 実験1のデータを読み込む（experiment1_analysis.pyから関数をコピー）
-        pattern = os.path.join("public/BrightnessData", "*BrightnessBlendMode_LinearOnly.csv")
-        files = glob.glob(pattern)
+        records = find_trials(EXPERIMENT1_DATA_DIR, blend_mode="LinearOnly")
         
         exp1_data = None
-        if files:
+        if records:
             all_data = []
-            for file in files:
-                filename = os.path.basename(file)
-                parts = filename.split('_')
-                
-                participant_idx = parts.index('ParticipantName') + 1
-                participant = parts[participant_idx]
-                
-                trial_idx = parts.index('TrialNumber') + 1
-                trial = int(parts[trial_idx])
+            for record in records:
+                file = record.path
+                filename = record.filename
+                participant = record.participant
+                trial = record.trial
                 
                 try:
-                    df = pd.read_csv(file)
-                    df.columns = df.columns.str.strip()
+                    df = read_trial(file)
                     df['Participant'] = participant
                     df['Trial'] = trial
                     df['Filename'] = filename
@@ -360,19 +343,11 @@ def compare_experiments(exploration_results, phase_params):
     
     if exp1_data is not None:
         # 実験1の各被験者の平均V0値を計算
-        exp1_v0_values = {}
-        for participant in exp1_data['Participant'].unique():
-            participant_data = exp1_data[exp1_data['Participant'] == participant]
-            trials = participant_data['Trial'].unique()
-            
-            participant_v0_values = []
-            for trial in trials:
-                trial_data = participant_data[participant_data['Trial'] == trial]
-                params = extract_velocity_parameters(trial_data)
-                participant_v0_values.append(params['V0'])
-            
-            if participant_v0_values:
-                exp1_v0_values[participant] = np.mean(participant_v0_values)
+        exp1_v0_lists = {}
+        for (participant, trial), params in extract_grouped_parameters(exp1_data).items():
+            exp1_v0_lists.setdefault(participant, []).append(params['V0'])
+        
+        exp1_v0_values = {p: np.mean(v0s) for p, v0s in exp1_v0_lists.items()}
         
         print("実験1の結果:")
         for participant, v0 in exp1_v0_values.items():
@@ -440,6 +415,7 @@ def compare_experiments(exploration_results, phase_params):
     
     return fig
 
+@profiled
 def generate_experiment2_results_text(exploration_results, phase_params):
     """実験2の結果テキストを生成"""
     
@@ -509,40 +485,82 @@ This improvement demonstrates the effectiveness of the proposed brightness mixin
     
     return text
 
-def main():
-    """メイン関数"""
-    data_dir = "../public/BrightnessFunctionMixAndPhaseData"
+FIGURE_OUTPUTS = ('experiment2_exploration_results.png', 'experiment2_phase_parameters.png',
+                  'experiment1_vs_experiment2_comparison.png')
+
+def analyze_incremental(data_dir, cache):
+    """試行ごとの結果をキャッシュから読み、変更・追加された試行だけ計算する"""
+    function_mix_records = find_trials(data_dir, pattern="FunctionMix")
+    phase_records = find_trials(data_dir, pattern="Phase", blend_mode="Dynamic")
+    
+    final_ratios = {}
+    for record in function_mix_records:
+        ratio = cache.trial_result(record.path, 'final_function_ratio', trial_final_function_ratio)
+        final_ratios.setdefault(record.participant, {})[record.trial] = ratio
+    
+    trial_params = {}
+    for record in phase_records:
+        params = cache.trial_result(record.path, 'velocity_parameters', trial_velocity_parameters)
+        trial_params[(record.participant, record.trial)] = params
+    
+    paths = [r.path for r in function_mix_records] + [r.path for r in phase_records]
+    return final_ratios, trial_params, paths
+
+@profiled
+def main(incremental=False, data_dir="../public/BrightnessFunctionMixAndPhaseData"):
+    """メイン関数（incremental=True では前回から変わった試行だけ再計算する）"""
+    
+    cache = AnalysisCache("experiment2") if incremental else None
+    if cache is not None:
+        print("実験2データをキャッシュと照合中...")
+        final_ratios, trial_params, input_paths = analyze_incremental(data_dir, cache)
+        if not final_ratios or not trial_params:
+            print("実験2データの読み込みに失敗しました。")
+            return
+        exploration_results = summarize_exploration(final_ratios)
+        phase_params = summarize_phase_parameters(trial_params)
+    else:
+        # 実験2前半：FunctionMixデータ読み込み
+        print("実験2前半：FunctionMixデータを読み込み中...")
+        function_mix_data = load_experiment2_function_mix_data(data_dir)
     
-    # 実験2前半：FunctionMixデータ読み込み
-    print("実験2前半：FunctionMixデータを読み込み中...")
-    function_mix_data = load_experiment2_function_mix_data(data_dir)
+        if not function_mix_data:
+            print("FunctionMixデータの読み込みに失敗しました。")
+            return
     
-    if not function_mix_data:
-        print("FunctionMixデータの読み込みに失敗しました。")
-        return
+        # 実験2後半：Phaseデータ読み込み
+        print("\n実験2後半：Phaseデータを読み込み中...")
+        phase_data = load_experiment2_phase_data(data_dir)
     
-    # 実験2後半：Phaseデータ読み込み
-    print("\n実験2後半：Phaseデータを読み込み中...")
-    phase_data = load_experiment2_phase_data(data_dir)
+        if phase_data is None:
+            print("Phaseデータの読み込みに失敗しました。")
+            return
     
-    if phase_data is None:
-        print("Phaseデータの読み込みに失敗しました。")
-        return
+        print(f"Phaseデータ読み込み完了: {len(phase_data)}行のデータ")
     
-    print(f"Phaseデータ読み込み完了: {len(phase_data)}行のデータ")
+        # 前半部分の分析
+        exploration_results = analyze_function_mix_exploration(function_mix_data)
     
-    # 前半部分の分析
-    exploration_results = analyze_function_mix_exploration(function_mix_data)
+        # 後半部分の分析
+        phase_params = analyze_velocity_parameters_phase(phase_data)
     
-    # 後半部分の分析
-    phase_params = analyze_velocity_parameters_phase(phase_data)
+    if cache is not None:
+        # 比較図は実験1のデータからも作るので、その試行も入力に含める
+        figure_inputs = input_paths + [r.path for r in find_trials(EXPERIMENT1_DATA_DIR,
+                                                                   blend_mode="LinearOnly")]
+    if cache is not None and cache.is_current('experiment2_figures', figure_inputs, FIGURE_OUTPUTS):
+        print("\n入力データに変更がないため、図の作成と実験1との比較を省略します。")
+    else:
+        # 結果の可視化（図はプロセスプールでまとめて描画）
+        print("\nプロットを作成中...")
+        render_jobs = plot_experiment2_results(exploration_results, phase_params, render_jobs=[])
+        render_figures(render_jobs)
     
-    # 結果の可視化
-    print("\nプロットを作成中...")
-    plot_experiment2_results(exploration_results, phase_params)
+        # 実験1との比較
+        compare_experiments(exploration_results, phase_params)
     
-    # 実験1との比較
-    compare_experiments(exploration_results, phase_params)
+        if cache is not None:
+            cache.mark_current('experiment2_figures', figure_inputs)
     
     # 結果テキスト生成
     results_text = generate_experiment2_results_text(exploration_results, phase_params)
@@ -551,9 +569,14 @@ def main():
     with open('experiment2_results.txt', 'w', encoding='utf-8') as f:
         f.write(results_text)
     
+    if cache is not None:
+        print(cache.summary())
+        cache.save()
+    
     print("\n=== 実験2分析完了 ===")
     print("結果テキストを 'experiment2_results.txt' に保存しました。")
     print("プロットを 'experiment2_exploration_results.png', 'experiment2_phase_parameters.png', 'experiment1_vs_experiment2_comparison.png' に保存しました。")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    enable_from_argv()
+    main(incremental="--incremental" in sys.argv)
@@ -0,0 +1,210 @@
+"""
+刺激提示ループの記録用バイナリログ
+
+実験スクリプトはフレームごとの時刻・速度・合成比率とキー操作を Python のリストにため、
+試行が終わってから csv.writer で1行ずつ書いていた。途中で落ちると試行の記録がすべて失われ、
+最後の書き出しの間は画面も止まる。
+
+RecordLog は固定長のレコード（numpy の構造化 dtype）をメモリマップしたファイルに追記する。
+追記はメモリへの代入だけで、ディスクへの書き出しはバックグラウンドのスレッドが
+flush_interval 秒ごとに行う（os.fsync は GIL を離すので win.flip() を待たせない）。
+
+- ファイルは HEADER_SIZE バイトのヘッダ（MAGIC、確定済みのレコード数、dtype の JSON）と
+  レコードの領域。確定済みのレコード数は書き出しが終わってから更新するので、
+  プロセスが落ちても最後の書き出しまでのレコードは read_log() で読める
+- 容量は試行の前に capacity_for(duration) で、想定する最大のリフレッシュレート
+  （MAX_REFRESH_RATE）から見積もって確保する。追記の途中でファイルを広げたりマップし直したり
+  はしない（Windows ではマップ中のファイルの大きさを変えられず、フレームも止まる）。
+  それでも足りなかった分はメモリのリストにため、close() でマップを閉じてから書き足す
+- 試行の後で read_log() で構造化配列にし、write_csv() / convert_log() で CSV・Parquet にする
+
+    log = RecordLog(path, FRAME_DTYPE, capacity=capacity_for(20))
+    while ...:
+        log.append(t, tri_speed, blend_ratio)
+    log.close()
+    frames = read_log(path)
+
+使い方（落ちた試行のログを変換する）:
+    python experiment_log.py experiment_data_frames_20241025-120000.vlog out.csv
+"""
+
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b"VECTLOG1"
+HEADER_SIZE = 4096
+_COUNT_OFFSET = len(MAGIC)
+_DESCR_OFFSET = _COUNT_OFFSET + 8
+DEFAULT_CAPACITY = 4096
+FLUSH_INTERVAL = 0.5
+# 容量の見積もりに使うリフレッシュレートの上限（Hz）と、予定より長く続いたときの余裕（秒）
+MAX_REFRESH_RATE = 240.0
+CAPACITY_MARGIN = 5.0
+
+# フレームごとの記録
+FRAME_DTYPE = np.dtype([("time", "<f8"), ("tri_speed", "<f8"), ("blend_ratio", "<f8")])
+# キー操作（key は +1 が合成比率の振幅を上げる 'w'、-1 が下げる 's'）
+KEY_DTYPE = np.dtype([("time", "<f8"), ("key", "<i1")])
+
+
+def capacity_for(duration, refresh_rate=MAX_REFRESH_RATE, margin=CAPACITY_MARGIN):
+    """duration 秒の試行で1フレーム1レコード追記するときに足りる容量
+
+    実測のリフレッシュレートは取れなかったり低く出たりするので、既定では MAX_REFRESH_RATE で
+    見積もる（20 秒の試行のフレームの記録で 1.3 MB 程度）。
+    """
+    return int(np.ceil((duration + margin) * refresh_rate)) + 1
+
+
+def _descr_json(dtype):
+    return json.dumps(np.lib.format.dtype_to_descr(dtype)).encode("utf-8")
+
+
+def _write_header(f, dtype):
+    descr = _descr_json(dtype)
+    if _DESCR_OFFSET + 4 + len(descr) > HEADER_SIZE:
+        raise ValueError(f"dtype が長すぎてヘッダに入りません: {dtype}")
+    header = bytearray(HEADER_SIZE)
+    header[:_COUNT_OFFSET] = MAGIC
+    header[_DESCR_OFFSET:_DESCR_OFFSET + 4] = len(descr).to_bytes(4, "little")
+    header[_DESCR_OFFSET + 4:_DESCR_OFFSET + 4 + len(descr)] = descr
+    f.write(header)
+
+
+def _read_header(f):
+    header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or header[:_COUNT_OFFSET] != MAGIC:
+        raise ValueError("実験ログの形式ではありません")
+    count = int.from_bytes(header[_COUNT_OFFSET:_DESCR_OFFSET], "little")
+    length = int.from_bytes(header[_DESCR_OFFSET:_DESCR_OFFSET + 4], "little")
+    descr = json.loads(header[_DESCR_OFFSET + 4:_DESCR_OFFSET + 4 + length].decode("utf-8"))
+    descr = [tuple(field) for field in descr] if isinstance(descr, list) else descr
+    return count, np.lib.format.descr_to_dtype(descr)
+
+
+class RecordLog:
+    """固定長レコードをメモリマップしたファイルに追記し、定期的にディスクへ書き出す"""
+
+    def __init__(self, path, dtype, capacity=DEFAULT_CAPACITY, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self.committed = 0
+        # 容量を超えた分（close() で書き足す）
+        self._overflow = []
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            _write_header(f, self.dtype)
+        self._fd = os.open(path, os.O_RDWR | getattr(os, "O_BINARY", 0))
+        self.capacity = max(int(capacity), 1)
+        os.ftruncate(self._fd, HEADER_SIZE + self.capacity * self.dtype.itemsize)
+        self._header = np.memmap(path, dtype="<u8", mode="r+", offset=_COUNT_OFFSET, shape=(1,))
+        self._data = np.memmap(path, dtype=self.dtype, mode="r+", offset=HEADER_SIZE,
+                               shape=(self.capacity,))
+
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, args=(flush_interval,),
+                                        name="RecordLog-flush", daemon=True)
+        self._thread.start()
+
+    def append(self, *values):
+        """1レコードを追記する（メモリへの代入だけで、ディスクへは書かない）"""
+        if self.count < self.capacity:
+            self._data[self.count] = values
+        else:
+            self._overflow.append(values)
+        self.count += 1
+
+    def flush(self):
+        """追記済みのレコードを書き出し、確定済みのレコード数を更新する"""
+        with self._flush_lock:
+            # 容量を超えた分はマップの外なので、close() まで確定しない
+            count = min(self.count, self.capacity)
+            if count == self.committed:
+                return count
+            os.fsync(self._fd)
+            self._header[0] = count
+            self.committed = count
+            return count
+
+    def _flush_loop(self, interval):
+        while not self._stop.wait(interval):
+            self.flush()
+
+    def close(self):
+        """書き出しのスレッドを止め、最後まで書き出してファイルを記録の長さに切り詰める
+
+        マップを閉じてからファイルの大きさを変える（Windows ではマップ中は変えられない）。
+        容量を超えた分はここで書き足す。
+        """
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        self._header.flush()
+        for name in ("_data", "_header"):
+            mapped = getattr(self, name)._mmap
+            delattr(self, name)
+            mapped.close()
+
+        os.ftruncate(self._fd, HEADER_SIZE + self.committed * self.dtype.itemsize)
+        if self._overflow:
+            os.lseek(self._fd, 0, os.SEEK_END)
+            os.write(self._fd, np.array(self._overflow, dtype=self.dtype).tobytes())
+            os.fsync(self._fd)
+            self.committed += len(self._overflow)
+            self._overflow = []
+            os.lseek(self._fd, _COUNT_OFFSET, os.SEEK_SET)
+            os.write(self._fd, self.committed.to_bytes(8, "little"))
+        os.fsync(self._fd)
+        os.close(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def read_log(path):
+    """ログの確定済みのレコードを構造化配列で返す"""
+    with open(path, "rb") as f:
+        count, dtype = _read_header(f)
+        f.seek(HEADER_SIZE)
+        data = np.fromfile(f, dtype=dtype, count=count)
+    return data
+
+
+def write_csv(path, columns):
+    """{列名: 配列} を CSV に書く"""
+    pd.DataFrame(columns).to_csv(path, index=False)
+    return path
+
+
+def convert_log(path, output):
+    """ログを CSV（.csv）または Parquet（.parquet）に変換する"""
+    df = pd.DataFrame(read_log(path))
+    if output.endswith(".parquet"):
+        df.to_parquet(output, index=False)
+    else:
+        df.to_csv(output, index=False)
+    return output
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("使い方: python experiment_log.py <ログ> [出力 .csv / .parquet]")
+        sys.exit(1)
+    log_path = sys.argv[1]
+    output = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(log_path)[0] + ".csv"
+    convert_log(log_path, output)
+    print(f"{len(read_log(log_path))} レコードを {output} に書きました")
@@ -0,0 +1,98 @@
+"""
+図の並列描画
+
+解析スクリプトは図を1枚ずつ解析と同じプロセスで描いて保存している。ここでは
+「描画関数 + 引数 + 出力先」を FigureJob としてまとめ、プロセスプールで描画する。
+ワーカーは Agg バックエンドを使い、出力は一時ファイルに書いてから置き換えるので、
+途中で失敗しても中途半端な PNG/SVG が残らない。
+
+描画関数はモジュールのトップレベルで定義し、matplotlib の Figure を返すこと
+（プロセス間で渡すため、引数も pickle できる値にする）。
+
+    jobs = [FigureJob(plot_exploration_figure, (results,), outputs=("exploration.png",))]
+    render_figures(jobs)
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, NamedTuple, Tuple
+
+from profiling import profiled
+
+DEFAULT_DPI = 300
+
+
+class FigureJob(NamedTuple):
+    """1枚の図の描画ジョブ"""
+    plot_func: Callable[..., Any]
+    args: Tuple = ()
+    kwargs: dict = {}
+    outputs: Tuple[str, ...] = ()
+    dpi: int = DEFAULT_DPI
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+    import matplotlib.pyplot as plt
+    plt.switch_backend('Agg')
+
+
+def save_figure_atomic(fig, path, dpi=DEFAULT_DPI):
+    """一時ファイルに保存してから置き換える（拡張子で形式を決める）"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fmt = os.path.splitext(path)[1].lstrip('.').lower() or 'png'
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        fig.savefig(tmp_path, format=fmt, dpi=dpi, bbox_inches='tight')
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+@profiled
+def render_job(job):
+    """ジョブを1つ描画して保存し、出力パスのリストを返す"""
+    import matplotlib.pyplot as plt
+
+    fig = job.plot_func(*job.args, **job.kwargs)
+    try:
+        for path in job.outputs:
+            save_figure_atomic(fig, path, job.dpi)
+    finally:
+        plt.close(fig)
+    return list(job.outputs)
+
+
+@profiled
+def render_figures(jobs, max_workers=None):
+    """ジョブをプロセスプールで描画し、保存したファイルのリストを返す
+
+    max_workers=1 またはジョブが1つだけの場合は現在のプロセスで描画する。
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return []
+
+    if max_workers is None:
+        max_workers = min(len(jobs), os.cpu_count() or 1)
+
+    written = []
+    if max_workers <= 1 or len(jobs) == 1:
+        for job in jobs:
+            written.extend(render_job(job))
+        return written
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as pool:
+        futures = {pool.submit(render_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                paths = future.result()
+                written.extend(paths)
+                print(f"描画完了: {', '.join(paths)}")
+            except Exception as e:
+                print(f"描画エラー: {getattr(job.plot_func, '__name__', job.plot_func)} - {e}")
+    return written
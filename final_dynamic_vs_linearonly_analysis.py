@@ -1,4 +1,3 @@
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -6,6 +5,10 @@ from scipy import stats
 import os
 import glob
 
+from figure_renderer import FigureJob, render_figures
+from resampling import bootstrap_difference, permutation_test
+from trial_store import read_trial
+
 # Font settings for English text
 plt.rcParams['font.family'] = 'Arial'
 plt.rcParams['axes.unicode_minus'] = False
@@ -44,8 +47,7 @@ def load_and_analyze_phase_data():
             dynamic_data[participant] = []
             for file in dynamic_files:
                 try:
-                    df = pd.read_csv(file)
-                    df.columns = df.columns.str.strip()
+                    df = read_trial(file)
                     
                     params = extract_parameters_from_file(df)
                     if params:
@@ -62,8 +64,7 @@ def load_and_analyze_phase_data():
             linear_data[participant] = []
             for file in linear_files:
                 try:
-                    df = pd.read_csv(file)
-                    df.columns = df.columns.str.strip()
+                    df = read_trial(file)
                     
                     params = extract_parameters_from_file(df)
                     if params:
@@ -109,6 +110,29 @@ def extract_parameters_from_file(df):
         print(f"提取参数时出错: {e}")
         return None
 
+def _condition_values(data, key, participants):
+    """按被试者收集某参数的所有试行值，返回 (值, 对应的被试者)"""
+    values = []
+    strata = []
+    for participant in participants:
+        for trial in data.get(participant, []):
+            values.append(trial[key])
+            strata.append(participant)
+    return np.array(values, dtype=float), strata
+
+def print_resampling_comparison(dynamic_data, linear_data, key, participants):
+    """按被试者分层的自助法置信区间与置换检验（均值差与标准差差）"""
+    dyn_values, dyn_strata = _condition_values(dynamic_data, key, participants)
+    lin_values, lin_strata = _condition_values(linear_data, key, participants)
+    
+    for name, statistic in (('均值差', np.mean), ('标准差差', np.std)):
+        diff, low, high = bootstrap_difference(dyn_values, lin_values, dyn_strata, lin_strata,
+                                               statistic=statistic, seed=0)
+        _, p_value = permutation_test(dyn_values, lin_values, dyn_strata, lin_strata,
+                                      statistic=statistic, seed=0)
+        print(f"  {name} (Dynamic - LinearOnly): {diff[0]:.3f}, 95% CI [{low[0]:.3f}, {high[0]:.3f}], "
+              f"分层置换检验 p={p_value[0]:.4f}")
+
 def analyze_stability_comparison(dynamic_data, linear_data, function_ratios):
     """分析Dynamic vs LinearOnly的稳定性对比"""
     
@@ -226,6 +250,7 @@ def analyze_stability_comparison(dynamic_data, linear_data, function_ratios):
         print(f"  t检验: t={t_stat:.3f}, p={p_value:.3f}")
         print(f"  效应量: {effect_size:.3f}")
         print(f"  结果: {'显著差异' if p_value < 0.05 else '无显著差异'}")
+        print_resampling_comparison(dynamic_data, linear_data, 'a1', participants)
         print()
     
     if all_dyn_a2 and all_lin_a2:
@@ -240,6 +265,7 @@ def analyze_stability_comparison(dynamic_data, linear_data, function_ratios):
         print(f"  t检验: t={t_stat:.3f}, p={p_value:.3f}")
         print(f"  效应量: {effect_size:.3f}")
         print(f"  结果: {'显著差异' if p_value < 0.05 else '无显著差异'}")
+        print_resampling_comparison(dynamic_data, linear_data, 'a2', participants)
         print()
     
     print("="*80 + "\n")
@@ -269,13 +295,14 @@ def analyze_stability_comparison(dynamic_data, linear_data, function_ratios):
     
     print("\n" + "="*80 + "\n")
     
-    # 4. 创建可视化
-    create_final_visualizations(dynamic_data, linear_data, comparison_results)
+    # 4. 创建可视化（通过 figure_renderer 绘制）
+    render_figures(create_final_visualizations(dynamic_data, linear_data, comparison_results,
+                                               render_jobs=[]))
     
     return dynamic_data, linear_data, comparison_results
 
-def create_final_visualizations(dynamic_data, linear_data, comparison_results):
-    """创建最终的可视化图表"""
+def plot_final_figure(dynamic_data, linear_data, comparison_results):
+    """绘制最终的稳定性对比图并返回 Figure"""
     
     fig, axes = plt.subplots(2, 3, figsize=(18, 12))
     fig.suptitle('Dynamic vs LinearOnly: A1 and A2 Stability Comparison\n(基于实验2个性化比率 vs 线性混合)', fontsize=16, fontweight='bold')
@@ -428,7 +455,20 @@ def create_final_visualizations(dynamic_data, linear_data, comparison_results):
         ax6.grid(True, alpha=0.3)
     
     plt.tight_layout()
-    plt.savefig('final_dynamic_vs_linearonly_stability_comparison.png', dpi=300, bbox_inches='tight')
+    return fig
+
+def create_final_visualizations(dynamic_data, linear_data, comparison_results, render_jobs=None):
+    """创建最终的可视化图表
+    
+    render_jobs 传入列表时不在这里绘制，而是追加 FigureJob（由调用方交给 render_figures）。
+    """
+    if render_jobs is not None:
+        render_jobs.append(FigureJob(plot_final_figure, (dynamic_data, linear_data, comparison_results),
+                                     outputs=('final_dynamic_vs_linearonly_stability_comparison.png',)))
+        return render_jobs
+    
+    fig = plot_final_figure(dynamic_data, linear_data, comparison_results)
+    fig.savefig('final_dynamic_vs_linearonly_stability_comparison.png', dpi=300, bbox_inches='tight')
     plt.show()
     
     return fig
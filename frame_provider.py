@@ -0,0 +1,204 @@
+"""
+動画フレームの LRU キャッシュ付き読み出し
+
+スライダーでフレームを選ぶたびに VideoCapture を開き直してシークし、1枚デコードして
+スペクトルを計算し直すと、操作のたびに待たされる。FrameProvider は
+
+- VideoCapture を開いたまま現在位置を覚えておき、少し先のフレームは grab() で
+  前に進めるだけにする（開き直し・シークをしない）
+- 後ろや遠くへ移動するときは、キーフレームの位置の索引（最初に一度だけ作る）から
+  目的のフレーム以前で最も近いキーフレームへシークし、そこから grab() で進める
+- デコードしたグレースケール画像とスペクトルを上限付きの LRU キャッシュに保存する
+- 要求されたフレームの前後をバックグラウンドのスレッドで先読みする
+
+キーフレーム索引は PyAV (av) があればパケットの分離だけ（デコードなし）で作る。
+ない場合は keyframe_interval ごとにキーフレームがあるとみなし、それも指定がなければ
+OpenCV のシークに任せる。
+
+    provider = FrameProvider("LR_LuminanceMixing - Trim.mp4")
+    frame = provider.get(120)   # FrameData(gray, power, phase)
+"""
+
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+
+from frame_spectra import spectra
+
+DEFAULT_CACHE_SIZE = 64
+DEFAULT_PREFETCH = 8
+# これより先のフレームはシークせずに grab() で進める
+DEFAULT_MAX_FORWARD = 32
+
+
+class FrameData(NamedTuple):
+    """1フレーム分のグレースケール画像とスペクトル"""
+    gray: np.ndarray
+    power: np.ndarray
+    phase: np.ndarray
+
+
+def build_keyframe_index(video_path):
+    """キーフレームのフレーム番号の昇順配列を返す（PyAV がなければ None）"""
+    try:
+        import av
+    except ImportError:
+        return None
+
+    keyframes = []
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        rate = stream.average_rate or stream.guessed_rate
+        start = stream.start_time or 0
+        for packet in container.demux(stream):
+            if packet.pts is None or not packet.is_keyframe:
+                continue
+            seconds = float((packet.pts - start) * stream.time_base)
+            keyframes.append(int(round(seconds * float(rate))))
+    return np.unique(keyframes) if keyframes else None
+
+
+class FrameProvider:
+    """フレーム番号からグレースケール画像とスペクトルを返す（LRU キャッシュ + 先読み）"""
+
+    def __init__(self, video_path, resize_scale=1.0, cache_size=DEFAULT_CACHE_SIZE,
+                 prefetch=DEFAULT_PREFETCH, max_forward=DEFAULT_MAX_FORWARD,
+                 keyframe_interval=None):
+        import cv2
+
+        self.video_path = video_path
+        self.resize_scale = resize_scale
+        self.cache_size = cache_size
+        self.prefetch = prefetch
+        self.max_forward = max_forward
+
+        self._cap = cv2.VideoCapture(video_path)
+        if not self._cap.isOpened():
+            raise RuntimeError(f"動画が読み込めません: {video_path}")
+        self.total_frames = int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self._position = 0  # 次に grab() したときに得られるフレーム番号
+
+        self._keyframes = build_keyframe_index(video_path)
+        if self._keyframes is None and keyframe_interval:
+            self._keyframes = np.arange(0, max(self.total_frames, 1), keyframe_interval)
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._capture_lock = threading.Lock()
+        self._request = None
+        self._request_event = threading.Event()
+        self._closed = False
+        self._worker = threading.Thread(target=self._prefetch_loop, daemon=True)
+        self._worker.start()
+
+    # --- キャッシュ ---
+
+    def _cached(self, n):
+        with self._cache_lock:
+            data = self._cache.get(n)
+            if data is not None:
+                self._cache.move_to_end(n)
+            return data
+
+    def _store(self, n, data):
+        with self._cache_lock:
+            self._cache[n] = data
+            self._cache.move_to_end(n)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # --- デコード ---
+
+    def _seek_target(self, n):
+        """n を読むためにシークすべきフレーム番号（grab() で進めればよいなら None）"""
+        ahead = self._position <= n
+        if ahead and n - self._position <= self.max_forward:
+            return None
+        if self._keyframes is None:
+            return n
+        i = np.searchsorted(self._keyframes, n, side='right') - 1
+        keyframe = int(self._keyframes[i]) if i >= 0 else 0
+        # 現在位置が n 以前で最も近いキーフレームより後なら、シークしても得をしない
+        if ahead and keyframe <= self._position:
+            return None
+        return keyframe
+
+    def _decode(self, n):
+        """フレーム n のグレースケール画像を返す（_capture_lock を持って呼ぶ）"""
+        import cv2
+
+        target = self._seek_target(n)
+        if target is not None:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            self._position = target
+        while self._position < n:
+            if not self._cap.grab():
+                return None
+            self._position += 1
+        ret, frame = self._cap.read()
+        if not ret:
+            return None
+        self._position = n + 1
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.resize_scale != 1.0:
+            gray = cv2.resize(gray, (0, 0), fx=self.resize_scale, fy=self.resize_scale)
+        return gray
+
+    def _load(self, frame_numbers):
+        """キャッシュにないフレームをまとめてデコードし、スペクトルを一括で求める"""
+        missing = [n for n in frame_numbers
+                   if 0 <= n < self.total_frames and self._cached(n) is None]
+        if not missing:
+            return
+        decoded = []
+        with self._capture_lock:
+            for n in sorted(missing):
+                gray = self._decode(n)
+                if gray is not None:
+                    decoded.append((n, gray))
+        if not decoded:
+            return
+        power, phase = spectra(np.stack([gray for _, gray in decoded]))
+        for (n, gray), p, ph in zip(decoded, power, phase):
+            self._store(n, FrameData(gray, p, ph))
+
+    def get(self, n):
+        """フレーム n の FrameData を返す（取得できなければ None）"""
+        n = int(n)
+        data = self._cached(n)
+        if data is None:
+            self._load([n])
+            data = self._cached(n)
+        self._request = n
+        self._request_event.set()
+        return data
+
+    # --- 先読み ---
+
+    def _prefetch_loop(self):
+        while not self._closed:
+            self._request_event.wait()
+            self._request_event.clear()
+            if self._closed:
+                break
+            center = self._request
+            # 前方を優先し、後方は半分だけ先読みする
+            ahead = range(center + 1, center + 1 + self.prefetch)
+            behind = range(center - 1, center - 1 - self.prefetch // 2, -1)
+            for block in (ahead, behind):
+                if self._request_event.is_set() or self._closed:
+                    break  # 新しい要求が来たらそちらを優先する
+                try:
+                    self._load(block)
+                except Exception as e:
+                    print(f"先読みエラー: {e}")
+
+    def close(self):
+        self._closed = True
+        self._request_event.set()
+        self._worker.join(timeout=1.0)
+        with self._capture_lock:
+            self._cap.release()
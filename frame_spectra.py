@@ -0,0 +1,184 @@
+"""
+画像・フレーム列の2次元スペクトルを一括で求める
+
+receivePy20250117 のスクリプトや FourierTransforms.py では、画像1枚ずつ
+fft2 → fftshift → 対数パワー・位相 を float64 で計算していた。ここではフレームの
+スタック (N, H, W) を float32 のまま実数入力用の rfft2 でまとめて変換し、
+エルミート対称性から全周波数のスペクトルを復元する（fftshift 済みの配置は
+従来の calculate_spectra と同じ）。
+
+FFT は pyfftw があればその scipy.fft 互換インターフェース（プランをキャッシュ）を、
+なければ scipy.fft を workers 付きで使う。
+
+    frames = read_gray_frames("LR_Continuous - Trim.mp4", count=30)
+    power, phase = spectra(frames)                    # (N, H, W)
+    diff, wrapped, mask = phase_differences(phase)    # 連続するフレームの組ごと
+
+    # 長い動画は全フレームを読み込まず、batch_size 枚ずつ読みながら評価する
+    fractions = consecutive_phase_stats(iter_gray_frames("LR_Continuous - Trim.mp4"))
+"""
+
+import numpy as np
+
+try:
+    import pyfftw
+    import pyfftw.interfaces.scipy_fft as _fft
+    pyfftw.interfaces.cache.enable()
+    FFT_BACKEND = 'pyfftw'
+except ImportError:
+    import scipy.fft as _fft
+    FFT_BACKEND = 'scipy'
+
+POWER_SCALE = 20.0
+DEFAULT_BATCH_SIZE = 32
+
+# (H, W) -> (鏡像側の行インデックス, 鏡像側の列インデックス)
+_mirror_cache = {}
+
+
+def _as_stack(frames):
+    frames = np.asarray(frames, dtype=np.float32)
+    if frames.ndim == 2:
+        frames = frames[np.newaxis]
+    if frames.ndim != 3:
+        raise ValueError(f"フレームは (H, W) か (N, H, W) で渡してください: {frames.shape}")
+    return frames
+
+
+def _mirror_indices(shape):
+    """rfft2 の半分のスペクトルから残りの列を復元するためのインデックス"""
+    indices = _mirror_cache.get(shape)
+    if indices is None:
+        rows, cols = shape
+        mirrored_cols = cols - np.arange(cols // 2 + 1, cols)
+        mirrored_rows = (-np.arange(rows)) % rows
+        indices = (mirrored_rows[:, np.newaxis], mirrored_cols[np.newaxis, :])
+        _mirror_cache[shape] = indices
+    return indices
+
+
+def _expand(half, shape, odd):
+    """半分のスペクトル (N, H, W//2+1) を全周波数 (N, H, W) に広げる
+
+    実数入力では F[-k] = conj(F[k]) なので、振幅は対称（odd=False）、
+    位相は反対称（odd=True）になる。
+    """
+    rows, cols = _mirror_indices(shape)
+    mirrored = half[:, rows, cols]
+    if odd:
+        mirrored = -mirrored
+    return np.concatenate((half, mirrored), axis=2)
+
+
+def half_spectra(frames, workers=-1):
+    """フレームのスタックの rfft2（complex64, (N, H, W//2+1)）を返す"""
+    frames = _as_stack(frames)
+    return _fft.rfft2(frames, axes=(-2, -1), workers=workers)
+
+
+def spectra(frames, scale=POWER_SCALE, workers=-1):
+    """対数パワースペクトル scale·log(|F|+1) と位相スペクトルを (N, H, W) で返す
+
+    どちらも fftshift 済みで、1枚ずつの fft2 による従来の結果と同じ配置になる。
+    """
+    frames = _as_stack(frames)
+    shape = frames.shape[1:]
+    half = half_spectra(frames, workers)
+
+    power = np.log1p(np.abs(half))
+    power *= np.float32(scale)
+    phase = np.angle(half).astype(np.float32)
+
+    power = np.fft.fftshift(_expand(power, shape, odd=False), axes=(-2, -1))
+    phase = np.fft.fftshift(_expand(phase, shape, odd=True), axes=(-2, -1))
+    return power, phase
+
+
+def normalized_log_magnitude(frames, workers=-1):
+    """フレームごとに最大値で正規化した log(|F|+1)（表示用）を返す"""
+    power, _ = spectra(frames, scale=1.0, workers=workers)
+    power /= power.max(axis=(1, 2), keepdims=True)
+    return power
+
+
+def wrap_phase(phase_diff):
+    """位相差を -π ～ π に折り返す"""
+    return (phase_diff + np.pi) % (2 * np.pi) - np.pi
+
+
+def phase_differences(phase, lag=1, threshold=np.pi / 2):
+    """フレーム i と i+lag の位相差、折り返した位相差、|Δφ| > threshold のマスクを返す
+
+    差は従来のスクリプトと同じく phase[i] - phase[i+lag]。戻り値はいずれも
+    (N - lag, H, W)。
+    """
+    diff = phase[:-lag] - phase[lag:]
+    wrapped = wrap_phase(diff)
+    mask = (wrapped < -threshold) | (wrapped > threshold)
+    return diff, wrapped, mask
+
+
+def consecutive_phase_stats(frames, batch_size=DEFAULT_BATCH_SIZE, threshold=np.pi / 2,
+                            workers=-1):
+    """連続するフレームの全組について、マスクされる周波数成分の割合を返す
+
+    frames は (N, H, W) のスタックか、iter_gray_frames のような (n, H, W) のバッチを
+    順に返すイテラブル。バッチごとに変換し、直前のバッチの最後のフレームの位相だけを
+    持ち越すので、イテラブルを渡せば動画全体をメモリに置かずに済む。
+    戻り値は長さ N-1 の配列。
+    """
+    if isinstance(frames, (np.ndarray, list, tuple)):
+        frames = _as_stack(frames)
+        batches = (frames[i:i + batch_size] for i in range(0, len(frames), batch_size))
+    else:
+        batches = frames
+    fractions = []
+    previous = None
+    for batch in batches:
+        _, phase = spectra(batch, workers=workers)
+        if previous is not None:
+            phase = np.concatenate((previous, phase))
+        if len(phase) > 1:
+            _, _, mask = phase_differences(phase, threshold=threshold)
+            fractions.append(mask.mean(axis=(1, 2)))
+        previous = phase[-1:]
+    return np.concatenate(fractions) if fractions else np.zeros(0)
+
+
+def iter_gray_frames(video_path, start=0, count=None, step=1, batch_size=DEFAULT_BATCH_SIZE):
+    """動画のグレースケールフレームを (n, H, W) の float32 のバッチ（n ≤ batch_size）で順に返す"""
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"動画が読み込めません: {video_path}")
+    try:
+        if start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        batch = []
+        read = 0
+        index = 0
+        while count is None or read < count:
+            if not cap.grab():
+                break
+            if index % step == 0:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                batch.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+                read += 1
+                if len(batch) == batch_size:
+                    yield np.asarray(batch, dtype=np.float32)
+                    batch = []
+            index += 1
+        if batch:
+            yield np.asarray(batch, dtype=np.float32)
+        elif not read:
+            raise RuntimeError(f"フレームが取得できません: {video_path}")
+    finally:
+        cap.release()
+
+
+def read_gray_frames(video_path, start=0, count=None, step=1):
+    """動画から (N, H, W) のグレースケールフレーム列（float32）を読み込む"""
+    return np.concatenate(list(iter_gray_frames(video_path, start, count, step)))
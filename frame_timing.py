@@ -0,0 +1,130 @@
+"""
+刺激提示ループのフレームタイミング計測
+
+PsychoPy の実験ループは1回の win.flip() を 1/60 秒とみなして位相を speed / 60.0 ずつ
+進めていた。負荷でフレームが落ちると、その分だけ刺激の速度が遅くなったことに誰も気づかない。
+
+FrameTimer は flip の時刻を事前に確保した配列に記録し、直前の flip からの実際の経過時間を
+返す。位相はこの経過時間で進めるので、フレームが落ちても刺激の位置は時刻どおりになる。
+
+- 間隔が frame_period·(1 + late_tolerance) を超えた flip を遅延として印を付け、
+  何フレーム分落ちたか（missed）を記録する。ループ中は print しない（終了後に report()）
+- 配列は duration から見積もった長さで確保し、足りなければ倍に広げる（記録は捨てない）
+- save() は TIMING_DTYPE の構造化配列を .npy で書く（1フレーム 14 バイト）。
+  読むときは np.load(path) か load_timing(path)
+
+    timer = FrameTimer(refresh_rate=60.0, duration=20)
+    while ...:
+        dt = timer.last_interval
+        image.phase += speed * dt
+        ...
+        timer.record(win.flip())
+    timer.save(timing_filename)
+    print(timer.report())
+"""
+
+import math
+
+import numpy as np
+
+TIMING_DTYPE = np.dtype([
+    ("flip", "<f8"),         # flip の時刻（秒）
+    ("interval", "<f4"),     # 直前の flip からの経過時間（秒、最初の flip は NaN）
+    ("missed", "<u2"),       # 落ちたフレームの数（0 なら時間どおり）
+])
+DEFAULT_REFRESH_RATE = 60.0
+LATE_TOLERANCE = 0.5
+
+
+class FrameTimer:
+    """flip の時刻を記録し、実際のフレーム間隔と落ちたフレームを数える"""
+
+    def __init__(self, refresh_rate=DEFAULT_REFRESH_RATE, duration=None, capacity=None,
+                 late_tolerance=LATE_TOLERANCE):
+        if not refresh_rate or refresh_rate <= 0:
+            refresh_rate = DEFAULT_REFRESH_RATE
+        self.refresh_rate = float(refresh_rate)
+        self.frame_period = 1.0 / self.refresh_rate
+        self.late_limit = self.frame_period * (1.0 + late_tolerance)
+        if capacity is None:
+            capacity = math.ceil((duration or 60.0) * self.refresh_rate * 1.25) + 1
+        self._records = np.zeros(max(int(capacity), 1), dtype=TIMING_DTYPE)
+        self.count = 0
+        self.late_count = 0
+        self.missed_total = 0
+        self._last_flip = None
+        # 最初のフレームは1フレーム分進める
+        self.last_interval = self.frame_period
+
+    def record(self, flip_time):
+        """flip の時刻を記録し、直前の flip からの経過時間（秒）を返す"""
+        if self.count == len(self._records):
+            grown = np.zeros(len(self._records) * 2, dtype=TIMING_DTYPE)
+            grown[:self.count] = self._records
+            self._records = grown
+        row = self._records[self.count]
+        row["flip"] = flip_time
+        if self._last_flip is None:
+            row["interval"] = np.nan
+            interval = self.frame_period
+        else:
+            interval = flip_time - self._last_flip
+            row["interval"] = interval
+            if interval > self.late_limit:
+                missed = max(int(round(interval / self.frame_period)) - 1, 1)
+                row["missed"] = missed
+                self.late_count += 1
+                self.missed_total += missed
+        self._last_flip = flip_time
+        self.count += 1
+        self.last_interval = interval
+        return interval
+
+    @property
+    def records(self):
+        """記録した flip の構造化配列（コピーではなくビュー）"""
+        return self._records[:self.count]
+
+    def late_frames(self):
+        """遅延した flip の記録"""
+        records = self.records
+        return records[records["missed"] > 0]
+
+    def summary(self):
+        intervals = self.records["interval"][1:].astype(float)
+        return {
+            "frames": self.count,
+            "late": self.late_count,
+            "missed": self.missed_total,
+            "refresh_rate": self.refresh_rate,
+            "mean_interval_ms": float(intervals.mean() * 1000) if len(intervals) else math.nan,
+            "max_interval_ms": float(intervals.max() * 1000) if len(intervals) else math.nan,
+        }
+
+    def report(self, limit=20):
+        """集計と、遅延した flip の一覧（最大 limit 件）の文字列"""
+        s = self.summary()
+        lines = [f"フレーム: {s['frames']}, 遅延: {s['late']} 回（落ちたフレーム {s['missed']}）, "
+                 f"間隔 平均 {s['mean_interval_ms']:.2f} ms / 最大 {s['max_interval_ms']:.2f} ms "
+                 f"（{s['refresh_rate']:.1f} Hz）"]
+        start = self.records["flip"][0] if self.count else 0.0
+        late = self.late_frames()
+        for row in late[:limit]:
+            lines.append(f"  t={row['flip'] - start:8.3f} s  間隔 {row['interval'] * 1000:6.1f} ms"
+                         f"  ({row['missed']} フレーム落ち)")
+        if len(late) > limit:
+            lines.append(f"  ...ほか {len(late) - limit} 回")
+        return "\n".join(lines)
+
+    def save(self, path):
+        """記録を TIMING_DTYPE の .npy として書く"""
+        np.save(path, self.records)
+        return path
+
+
+def load_timing(path):
+    """save() で書いたタイミングログを読む"""
+    records = np.load(path)
+    if records.dtype != TIMING_DTYPE:
+        raise ValueError(f"タイミングログの形式が違います: {path} ({records.dtype})")
+    return records
@@ -0,0 +1,220 @@
+"""
+ノブ操作の解析エンジン
+
+BrightnessData などの試行について、Knob / Velocity / FunctionRatio の列を全試行ぶん
+連結した配列として読み込み（KnobTraces）、試行の境界（offsets）ごとに
+np.add.reduceat などの区間 reduction で統計量を一度に求める。
+
+- trial_statistics: 試行ごとの平均・標準偏差・中央値、調整回数、応答時間
+  （BrightnessDataAnalyzer の試行指標と同じ定義。欠損を含む行は dropna() と同様に除く）
+- step_convergence: 試行内の StepNumber の区間ごとに、最終値に落ち着くまでの時間、
+  調整方向の反転回数、最終値付近にとどまった区間（プラトー）の長さ
+
+時間はCSVの Time 列の単位（ミリ秒）のまま返す。
+
+    traces = load_knob_traces(paths, keys)
+    metrics = trial_statistics(traces)       # 1行 = 1試行
+    steps = step_convergence(traces)         # 1行 = 1試行の1ステップ
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from profiling import profiled
+from trial_store import load_trial_arrays
+
+KNOB_COLUMNS = ('Time', 'Knob', 'Velocity', 'FunctionRatio', 'StepNumber')
+# これより大きい Knob の変化を1回の調整とみなす
+ADJUSTMENT_THRESHOLD = 0.01
+# 最終値からこの範囲に入ったら落ち着いたとみなす
+SETTLE_TOLERANCE = 0.01
+MIN_DATA_POINTS = 2
+
+
+class KnobTraces(NamedTuple):
+    """全試行を連結した列。試行 i は行 [offsets[i], offsets[i+1])"""
+    keys: list
+    offsets: np.ndarray
+    columns: dict
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def segment_ids(self):
+        return np.repeat(np.arange(len(self.keys)), self.lengths)
+
+
+def _valid_rows(arrays):
+    """数値列のどれかが NaN の行を False にしたマスク（DataFrame.dropna() に相当）"""
+    n_rows = len(next(iter(arrays.values())))
+    valid = np.ones(n_rows, dtype=bool)
+    for values in arrays.values():
+        if values.dtype.kind == 'f':
+            valid &= ~np.isnan(values)
+    return valid
+
+
+@profiled
+def load_knob_traces(paths, keys=None, columns=KNOB_COLUMNS):
+    """試行ファイルの列を読み込み、欠損行を除いて連結した KnobTraces を返す"""
+    keys = list(paths) if keys is None else list(keys)
+    parts = {column: [] for column in columns}
+    lengths = []
+    for path in paths:
+        arrays = load_trial_arrays(path)
+        valid = _valid_rows(arrays)
+        for column in columns:
+            parts[column].append(np.asarray(arrays[column][valid], dtype=float))
+        lengths.append(int(valid.sum()))
+
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    concatenated = {
+        column: np.concatenate(values) if values else np.zeros(0)
+        for column, values in parts.items()
+    }
+    return KnobTraces(keys, offsets, concatenated)
+
+
+def _segment_reduce(ufunc, values, starts, lengths, empty=0.0):
+    """区間 [starts[i], starts[i] + lengths[i]) ごとの ufunc.reduce（空の区間は empty）"""
+    result = np.full(len(starts), empty, dtype=float)
+    nonempty = lengths > 0
+    if nonempty.any():
+        # 空でない区間の開始位置は狭義単調増加なので、reduceat の区間がそのまま試行に対応する
+        result[nonempty] = ufunc.reduceat(values, starts[nonempty])
+    return result
+
+
+def _segment_median(values, segment_ids, starts, lengths):
+    """区間ごとの中央値（区間番号と値で並べ替え、中央の要素を取る）"""
+    result = np.full(len(starts), np.nan)
+    nonempty = lengths > 0
+    if not nonempty.any():
+        return result
+    order = np.lexsort((values, segment_ids))
+    ordered = values[order]
+    s, n = starts[nonempty], lengths[nonempty]
+    result[nonempty] = (ordered[s + (n - 1) // 2] + ordered[s + n // 2]) / 2
+    return result
+
+
+def _mean_std(values, starts, lengths):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = _segment_reduce(np.add, values, starts, lengths) / lengths
+        deviation = values - np.repeat(mean, lengths)
+        var = _segment_reduce(np.add, deviation * deviation, starts, lengths) / (lengths - 1)
+    return mean, np.sqrt(var)
+
+
+def _within_segment_moves(knob, segment_ids, threshold):
+    """行 j と j+1 の間の Knob の変化（同じ区間内で |Δ| > threshold のもの）の符号
+
+    長さ N の配列で、行 j+1 の位置に符号（-1/+1）、調整でなければ 0 を入れる。
+    """
+    moves = np.zeros(len(knob), dtype=np.int8)
+    if len(knob) > 1:
+        delta = np.diff(knob)
+        significant = (np.abs(delta) > threshold) & (segment_ids[1:] == segment_ids[:-1])
+        moves[1:] = np.where(significant, np.sign(delta), 0)
+    return moves
+
+
+@profiled
+def trial_statistics(traces, threshold=ADJUSTMENT_THRESHOLD):
+    """試行ごとの Knob / Velocity / FunctionRatio の統計量を DataFrame（index = keys）で返す
+
+    データ点が MIN_DATA_POINTS 未満の試行は data_points 以外が NaN になる。
+    """
+    starts = traces.offsets[:-1]
+    lengths = traces.lengths
+    segment_ids = traces.segment_ids()
+    time = traces.columns['Time']
+    knob = traces.columns['Knob']
+
+    knob_mean, knob_std = _mean_std(knob, starts, lengths)
+    velocity_mean, velocity_std = _mean_std(traces.columns['Velocity'], starts, lengths)
+    ratio_mean, ratio_std = _mean_std(traces.columns['FunctionRatio'], starts, lengths)
+    knob_median = _segment_median(knob, segment_ids, starts, lengths)
+
+    moves = _within_segment_moves(knob, segment_ids, threshold)
+    num_adjustments = _segment_reduce(np.add, (moves != 0).astype(np.int64), starts, lengths)
+
+    response_time = np.full(len(starts), np.nan)
+    nonempty = lengths > 0
+    response_time[nonempty] = time[starts[nonempty] + lengths[nonempty] - 1] - time[starts[nonempty]]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stability = np.where(knob_mean != 0, knob_std / knob_mean, np.inf)
+
+    table = pd.DataFrame({
+        'knob_mean': knob_mean,
+        'knob_std': knob_std,
+        'knob_median': knob_median,
+        'response_stability': stability,
+        'velocity_mean': velocity_mean,
+        'velocity_std': velocity_std,
+        'function_ratio_mean': ratio_mean,
+        'function_ratio_std': ratio_std,
+        'response_time': response_time,
+        'num_adjustments': num_adjustments.astype(np.int64),
+        'data_points': lengths,
+    }, index=pd.Index(traces.keys, name='key'))
+    table.loc[lengths < MIN_DATA_POINTS, table.columns[:-1]] = np.nan
+    return table
+
+
+@profiled
+def step_convergence(traces, tolerance=SETTLE_TOLERANCE, threshold=ADJUSTMENT_THRESHOLD):
+    """試行内で StepNumber が連続する区間ごとの収束指標を DataFrame で返す
+
+    - time_to_settle: 区間の開始から、Knob が最終値 ± tolerance に入ってそのまま
+      区間の終わりまで出なくなるまでの時間
+    - reversals: threshold を超える調整の向きが逆になった回数
+    - plateau_length / plateau_samples: 最終値 ± tolerance にとどまっていた時間と行数
+    """
+    time = traces.columns['Time']
+    knob = traces.columns['Knob']
+    step = traces.columns['StepNumber']
+    segment_ids = traces.segment_ids()
+    n_rows = len(knob)
+    if n_rows == 0:
+        return pd.DataFrame(columns=['key', 'StepNumber', 'samples', 'duration', 'final_knob',
+                                     'time_to_settle', 'reversals', 'plateau_length',
+                                     'plateau_samples'])
+
+    boundary = np.ones(n_rows, dtype=bool)
+    boundary[1:] = (segment_ids[1:] != segment_ids[:-1]) | (step[1:] != step[:-1])
+    run_starts = np.flatnonzero(boundary)
+    run_ends = np.append(run_starts[1:], n_rows)
+    run_lengths = run_ends - run_starts
+    run_ids = np.cumsum(boundary) - 1
+
+    # 最終値から外れていた最後の行の次が、落ち着いた位置
+    final_knob = knob[run_ends - 1]
+    outside = np.abs(knob - np.repeat(final_knob, run_lengths)) > tolerance
+    last_outside = np.maximum.reduceat(np.where(outside, np.arange(n_rows), -1), run_starts)
+    settle = np.maximum(last_outside + 1, run_starts)
+
+    # 同じ区間内で連続する調整の符号が逆なら反転
+    moves = _within_segment_moves(knob, run_ids, threshold)
+    move_rows = np.flatnonzero(moves)
+    move_runs = run_ids[move_rows]
+    move_signs = moves[move_rows]
+    reversed_ = (move_runs[1:] == move_runs[:-1]) & (move_signs[1:] != move_signs[:-1])
+    reversals = np.bincount(move_runs[1:][reversed_], minlength=len(run_starts))
+
+    return pd.DataFrame({
+        'key': np.asarray(traces.keys, dtype=object)[segment_ids[run_starts]],
+        'StepNumber': step[run_starts].astype(np.int64),
+        'samples': run_lengths,
+        'duration': time[run_ends - 1] - time[run_starts],
+        'final_knob': final_knob,
+        'time_to_settle': time[settle] - time[run_starts],
+        'reversals': reversals,
+        'plateau_length': time[run_ends - 1] - time[settle],
+        'plateau_samples': run_ends - settle,
+    })
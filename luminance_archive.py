@@ -0,0 +1,267 @@
+"""
+フレームごとの輝度のメモリマップアーカイブ
+
+プロット用のスクリプトは 0〜3 秒や 0〜10 秒しか描かないのに（set_xlim(0, 3) など）、
+試行の全行を DataFrame に読み込んでいる。ここではデータディレクトリごとに
+ARCHIVE_COLUMNS の列を float32 で1つのファイルに並べ（試行ごと・列ごとに連続した領域）、
+np.memmap で開いて、時間窓に入る行の範囲だけをスライスで返す。
+
+- 列の位置と行数、時間の索引は ARCHIVE_INDEX に保存する
+- 時間の索引は「試行の最初の時刻から k 秒目に入る最初の行」の配列で、窓の端を探すときは
+  その1秒分の Time だけを二分探索する（Time が単調でない試行は Time 列全体で判定する）
+- Frond/Back の輝度は、取り込み時に入れ替えた列（trial_store の正規化済みの列）も保存する
+- CSV（列指向ストア）のどれかが変わったら、そのディレクトリのアーカイブを作り直す
+
+窓の端は秒、返す Time 列は CSV と同じミリ秒。
+
+    windows = load_windows(find_trials(data_dir, blend_mode="LinearOnly"), 0, 10, normalized=True)
+    df = read_window(path, 0, 3, normalized=True)
+
+使い方:
+    python luminance_archive.py public/BrightnessData public/Experiment2Data
+"""
+
+import glob
+import json
+import math
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from profiling import profiled
+from trial_store import FRAME_COLUMN_PAIRS, NORMALIZED_SUFFIX, load_trial_arrays, store_dir
+
+ARCHIVE_FILENAME = "luminance.f32"
+ARCHIVE_INDEX = "luminance.json"
+ARCHIVE_VERSION = 1
+ARCHIVE_DTYPE = np.dtype("<f4")
+
+TIME_COLUMN = "Time"
+LUMINANCE_COLUMNS = ("FrondFrameLuminance", "BackFrameLuminance")
+ARCHIVE_COLUMNS = (TIME_COLUMN, *LUMINANCE_COLUMNS, "Knob", "Velocity", "FunctionRatio")
+# 時間の索引の刻み（Time の単位 = ミリ秒）
+INDEX_STEP = 1000.0
+
+# データディレクトリ -> LuminanceArchive
+_archive_cache = {}
+
+
+def _archive_path(data_dir, name):
+    return os.path.join(store_dir(data_dir), name)
+
+
+def _signature(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _time_index(time):
+    """最初の時刻から k 秒目の区間に入る最初の行番号の配列（単調でなければ None）"""
+    if len(time) == 0 or np.isnan(time).any() or np.any(np.diff(time) < 0):
+        return None
+    steps = int(math.ceil((time[-1] - time[0]) / INDEX_STEP)) + 1
+    edges = time[0] + INDEX_STEP * np.arange(steps + 1)
+    return np.searchsorted(time, edges, side="left").tolist()
+
+
+def _archive_columns(path):
+    """アーカイブに入れる列（ない列・数値でない列は飛ばす）と正規化済みの輝度列を返す"""
+    arrays = load_trial_arrays(path)
+    columns = {name: arrays[name] for name in ARCHIVE_COLUMNS
+               if name in arrays and arrays[name].dtype.kind in "biuf"}
+    frame_names = [name for pair in FRAME_COLUMN_PAIRS for name in pair
+                   if name in LUMINANCE_COLUMNS and name in columns]
+    if frame_names:
+        normalized = load_trial_arrays(path, [name + NORMALIZED_SUFFIX for name in frame_names])
+        columns.update(normalized)
+    return columns
+
+
+@profiled
+def build_archive(data_dir):
+    """ディレクトリ内の全試行をアーカイブに書き出し、索引を返す"""
+    data_dir = os.path.abspath(data_dir)
+    filenames = sorted(f for f in os.listdir(data_dir) if f.endswith(".csv"))
+    os.makedirs(store_dir(data_dir), exist_ok=True)
+
+    archive_path = _archive_path(data_dir, ARCHIVE_FILENAME)
+    tmp_path = archive_path + ".tmp"
+    trials = {}
+    offset = 0
+    with open(tmp_path, "wb") as f:
+        for filename in filenames:
+            path = os.path.join(data_dir, filename)
+            try:
+                columns = _archive_columns(path)
+            except Exception as e:
+                print(f"アーカイブに追加できません: {filename} - {e}")
+                continue
+            if TIME_COLUMN not in columns:
+                continue
+
+            entry = _signature(path)
+            entry["rows"] = rows = len(columns[TIME_COLUMN])
+            entry["columns"] = {}
+            for name, values in columns.items():
+                f.write(np.asarray(values, dtype=ARCHIVE_DTYPE).tobytes())
+                entry["columns"][name] = offset
+                offset += rows
+            # 索引はアーカイブに書いた float32 の値で作る（窓の判定と一致させるため）
+            time = np.asarray(columns[TIME_COLUMN], dtype=ARCHIVE_DTYPE)
+            entry["time_index"] = _time_index(time)
+            trials[filename] = entry
+    os.replace(tmp_path, archive_path)
+
+    index = {"version": ARCHIVE_VERSION, "size": offset, "trials": trials}
+    index_path = _archive_path(data_dir, ARCHIVE_INDEX)
+    with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(index_path + ".tmp", index_path)
+    print(f"{data_dir}: {len(trials)} 試行をアーカイブしました"
+          f"（{offset * ARCHIVE_DTYPE.itemsize / 1e6:.1f} MB）")
+    return index
+
+
+def _read_index(data_dir):
+    path = _archive_path(data_dir, ARCHIVE_INDEX)
+    if not os.path.exists(path) or not os.path.exists(_archive_path(data_dir, ARCHIVE_FILENAME)):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        index = json.load(f)
+    return index if index.get("version") == ARCHIVE_VERSION else None
+
+
+def _is_current(index, data_dir):
+    """索引のCSVがすべて変わっておらず、追加も削除もなければ True"""
+    filenames = [f for f in os.listdir(data_dir) if f.endswith(".csv")]
+    listed = index["trials"]
+    for filename in filenames:
+        entry = listed.get(filename)
+        signature = _signature(os.path.join(data_dir, filename))
+        # 取り込めなかったファイル（空のCSVなど）は索引にないので、中身があるときだけ作り直す
+        if entry is None:
+            if signature["size"] > 0:
+                return False
+            continue
+        if entry["size"] != signature["size"] or entry["mtime_ns"] != signature["mtime_ns"]:
+            return False
+    return all(filename in filenames for filename in listed)
+
+
+class LuminanceArchive:
+    """1つのデータディレクトリのアーカイブ（ファイルは最初に窓を読むときに開く）"""
+
+    def __init__(self, data_dir, index):
+        self.data_dir = os.path.abspath(data_dir)
+        self.index = index
+        self._data = None
+
+    @property
+    def filenames(self):
+        return list(self.index["trials"])
+
+    def _values(self):
+        if self._data is None:
+            self._data = np.memmap(_archive_path(self.data_dir, ARCHIVE_FILENAME),
+                                   dtype=ARCHIVE_DTYPE, mode="r", shape=(self.index["size"],))
+        return self._data
+
+    def _column(self, entry, name):
+        offset = entry["columns"][name]
+        return self._values()[offset:offset + entry["rows"]]
+
+    def _bound(self, time, time_index, limit, side):
+        """Time が limit（ミリ秒）の位置を、その時刻の前後の区間だけの二分探索で求める"""
+        k = int(math.floor((limit - time[0]) / INDEX_STEP)) if len(time) else 0
+        if k < 0:
+            return 0
+        if k >= len(time_index) - 1:
+            return len(time)
+        # 丸め誤差で隣の区間に入る場合に備えて、前後1秒も含めて探す
+        lo, hi = time_index[max(k - 1, 0)], time_index[min(k + 2, len(time_index) - 1)]
+        return lo + int(np.searchsorted(time[lo:hi], limit, side=side))
+
+    def window_rows(self, filename, start=None, end=None):
+        """start ≤ Time/1000 ≤ end の行を slice（Time が単調でなければ行番号の配列）で返す"""
+        entry = self.index["trials"][filename]
+        if start is None and end is None:
+            return slice(0, entry["rows"])
+        time = self._column(entry, TIME_COLUMN)
+        time_index = entry["time_index"]
+        if time_index is None:
+            inside = np.ones(entry["rows"], dtype=bool)
+            if start is not None:
+                inside &= time >= start * 1000
+            if end is not None:
+                inside &= time <= end * 1000
+            return np.flatnonzero(inside)
+        lo = 0 if start is None else self._bound(time, time_index, start * 1000, "left")
+        hi = entry["rows"] if end is None else self._bound(time, time_index, end * 1000, "right")
+        return slice(lo, max(lo, hi))
+
+    def window(self, filename, start=None, end=None, columns=None, normalized=False):
+        """時間窓の列を {列名: float32 配列} で返す（単調な試行ではメモリマップのビュー）
+
+        normalized=True なら Frond/Back の輝度は入れ替え済みの値を元の列名で返す。
+        """
+        entry = self.index["trials"][filename]
+        if columns is None:
+            columns = [name for name in ARCHIVE_COLUMNS if name in entry["columns"]]
+        rows = self.window_rows(filename, start, end)
+
+        data = {}
+        for name in columns:
+            stored = name
+            if normalized and name in LUMINANCE_COLUMNS:
+                stored = name + NORMALIZED_SUFFIX
+            if stored not in entry["columns"]:
+                raise KeyError(f"{filename} のアーカイブに列 '{name}' がありません")
+            data[name] = self._column(entry, stored)[rows]
+        return data
+
+
+def load_archive(data_dir):
+    """データディレクトリのアーカイブを返す（古い・存在しなければ作り直す）"""
+    data_dir = os.path.abspath(data_dir)
+    cached = _archive_cache.get(data_dir)
+    if cached is not None and _is_current(cached.index, data_dir):
+        return cached
+    index = _read_index(data_dir)
+    if index is None or not _is_current(index, data_dir):
+        index = build_archive(data_dir)
+    archive = LuminanceArchive(data_dir, index)
+    _archive_cache[data_dir] = archive
+    return archive
+
+
+def window_arrays(path, start=None, end=None, columns=None, normalized=False):
+    """試行ファイルの時間窓の列を {列名: float32 配列} で返す"""
+    data_dir, filename = os.path.split(os.path.abspath(path))
+    return load_archive(data_dir).window(filename, start, end, columns, normalized)
+
+
+def read_window(path, start=None, end=None, columns=None, normalized=False):
+    """試行ファイルの時間窓を DataFrame で返す（read_normalized_trial の窓付き版）"""
+    return pd.DataFrame(window_arrays(path, start, end, columns, normalized))
+
+
+@profiled
+def load_windows(trials, start=None, end=None, columns=None, normalized=False):
+    """試行（パスまたは TrialRecord）ごとの時間窓を {パス: {列名: 配列}} で返す"""
+    windows = {}
+    for trial in trials:
+        path = getattr(trial, "path", trial)
+        windows[path] = window_arrays(path, start, end, columns, normalized)
+    return windows
+
+
+if __name__ == "__main__":
+    data_dirs = sys.argv[1:] or sorted(d for d in glob.glob(os.path.join("public", "*Data*"))
+                                       if os.path.isdir(d))
+    for data_dir in data_dirs:
+        if os.path.isdir(data_dir):
+            build_archive(data_dir)
+        else:
+            print(f"ディレクトリが見つかりません: {data_dir}")
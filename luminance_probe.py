@@ -0,0 +1,154 @@
+"""
+ROI 輝度プローブ
+
+ディスプレイを撮影した動画（またはカメラ入力）から、ROI の B/G/R 平均値を毎フレーム
+求めて、FrondFrameLuminance / BackFrameLuminance が実際に表示されているかを確認する。
+
+- ROI の3チャンネルの平均は1回の reduction で求める
+- 波形表示用の履歴は事前確保したリングバッファに持つ（pop(0) をしない）
+- フレームごとの系列はチャンク単位でまとめて CSV / .npy に書き出す
+- 波形オーバーレイは必要なときだけ描画し、グリッドは背景として一度だけ作る
+
+    probe = LuminanceProbe((420, 346, 40, 40), history=width)
+    bgr = probe.update(frame, frame_idx, time_sec)
+    probe.close()
+"""
+
+import os
+
+import numpy as np
+
+SERIES_COLUMNS = ['Frame', 'Time', 'R', 'G', 'B']
+DEFAULT_CHUNK_SIZE = 4096
+GRID_VALUES = (0, 64, 128, 192, 255)
+CHANNEL_COLORS = ((255, 0, 0), (0, 255, 0), (0, 0, 255))  # B, G, R（BGR 色）
+
+
+def roi_means(frame, roi):
+    """ROI (x, y, w, h) の B, G, R 平均を長さ3の配列で返す"""
+    x, y, w, h = roi
+    patch = frame[y:y + h, x:x + w]
+    return patch.reshape(-1, patch.shape[-1]).mean(axis=0)
+
+
+class RingBuffer:
+    """固定長 (capacity, channels) の履歴。古い値から順に上書きする"""
+
+    def __init__(self, capacity, channels=3, dtype=np.float32):
+        self._data = np.zeros((capacity, channels), dtype=dtype)
+        self._capacity = capacity
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, row):
+        self._data[self._next] = row
+        self._next = (self._next + 1) % self._capacity
+        self._size = min(self._size + 1, self._capacity)
+
+    def values(self):
+        """古い順に並べた (len, channels) の配列を返す"""
+        if self._size < self._capacity:
+            return self._data[:self._size]
+        return np.concatenate((self._data[self._next:], self._data[:self._next]))
+
+
+class SeriesWriter:
+    """フレームごとの (Frame, Time, R, G, B) をチャンク単位でまとめて書き出す
+
+    拡張子が .csv ならチャンクごとに追記し、.npy なら close() 時に一括で保存する。
+    """
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.path = path
+        self._chunk = np.empty((chunk_size, len(SERIES_COLUMNS)), dtype=np.float64)
+        self._n = 0
+        self._chunks = []
+        self._csv = path.lower().endswith('.csv')
+        if self._csv:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(','.join(SERIES_COLUMNS) + '\n')
+
+    def write(self, frame_idx, time_sec, bgr):
+        row = self._chunk[self._n]
+        row[0] = frame_idx
+        row[1] = time_sec
+        row[2:] = bgr[::-1]
+        self._n += 1
+        if self._n == len(self._chunk):
+            self.flush()
+
+    def flush(self):
+        if self._n == 0:
+            return
+        rows = self._chunk[:self._n]
+        if self._csv:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                np.savetxt(f, rows, fmt=['%d', '%.6f', '%.3f', '%.3f', '%.3f'], delimiter=',')
+        else:
+            self._chunks.append(rows.copy())
+        self._n = 0
+
+    def close(self):
+        self.flush()
+        if not self._csv:
+            data = (np.concatenate(self._chunks) if self._chunks
+                    else np.empty((0, len(SERIES_COLUMNS))))
+            np.save(self.path, data)
+
+
+class LuminanceProbe:
+    """ROI の平均色を記録し、必要に応じて波形画像を描画する"""
+
+    def __init__(self, roi, history, plot_height=150, writer=None):
+        self.roi = roi
+        self.plot_height = plot_height
+        self.width = history
+        self.history = RingBuffer(history)
+        self.writer = writer
+        self._background = None
+
+    def update(self, frame, frame_idx, time_sec):
+        """1フレーム分の ROI 平均 (B, G, R) を求めて記録する"""
+        bgr = roi_means(frame, self.roi)
+        self.history.append(bgr)
+        if self.writer is not None:
+            self.writer.write(frame_idx, time_sec, bgr)
+        return bgr
+
+    def _grid(self):
+        import cv2
+
+        if self._background is None:
+            plot = np.full((self.plot_height, self.width, 3), 255, dtype=np.uint8)
+            for val in GRID_VALUES:
+                y_val = self.plot_height - int(val / 255 * self.plot_height)
+                cv2.line(plot, (0, y_val), (self.width, y_val), (220, 220, 220), 1)
+                cv2.putText(plot, str(val), (5, y_val - 5), cv2.FONT_HERSHEY_PLAIN, 1, (100, 100, 100), 1)
+            cv2.putText(plot, 'R', (10, 15), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+            cv2.putText(plot, 'G', (40, 15), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+            cv2.putText(plot, 'B', (70, 15), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
+            self._background = plot
+        return self._background.copy()
+
+    def render_waveform(self):
+        """履歴の RGB 波形画像 (plot_height, width, 3) を返す（チャンネルごとに折れ線1本）"""
+        import cv2
+
+        plot = self._grid()
+        values = self.history.values()
+        if len(values) < 2:
+            return plot
+        ys = self.plot_height - (values / 255 * self.plot_height).astype(np.int32)
+        xs = np.arange(len(values), dtype=np.int32)
+        for channel, color in enumerate(CHANNEL_COLORS):
+            points = np.column_stack((xs, ys[:, channel])).reshape(-1, 1, 2)
+            cv2.polylines(plot, [points], False, color, 1)
+        return plot
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
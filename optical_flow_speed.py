@@ -0,0 +1,130 @@
+"""
+オプティカルフローによる速度波形のストリーミング推定
+
+刺激の録画から、表示された速度の時系列を Farneback 法のフロー量で推定する。
+従来は1本のループで全フレームをデコードし、step で間引くフレームも含めて
+cap.read() していた。ここでは次の3段に分ける。
+
+    デコーダスレッド: grab() で全フレームを進め、必要なフレームだけ retrieve() して
+                      グレースケール化・縮小し、上限付きキューに入れる
+    フローワーカー:   連続する2フレームの組ごとに calcOpticalFlowFarneback を並列に実行
+                      （OpenCV の処理は GIL を解放するのでスレッドで並列化できる）
+    再構成:           投入順に結果を受け取り、時刻順の速度系列にする
+
+    times, speeds = stream_flow_speeds('D:/video/7月12日.mp4', step=2)
+"""
+
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+FARNEBACK_PARAMS = dict(pyr_scale=0.5, levels=3, winsize=15,
+                        iterations=3, poly_n=5, poly_sigma=1.2, flags=0)
+DEFAULT_STEP = 2
+DEFAULT_SCALE = 0.25
+DEFAULT_QUEUE_SIZE = 32
+
+_END = object()
+
+
+def _decode_frames(cap, step, scale, out_queue, stop_event):
+    """デコーダスレッド: 間引くフレームは grab() だけで読み飛ばす"""
+    import cv2
+
+    try:
+        frame_idx = 0
+        size = None
+        while not stop_event.is_set():
+            if not cap.grab():
+                break
+            if frame_idx % step == 0:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                if size is None:
+                    h, w = gray.shape
+                    size = (int(w * scale), int(h * scale))
+                out_queue.put((frame_idx, cv2.resize(gray, size)))
+            frame_idx += 1
+        out_queue.put(_END)
+    except Exception as e:
+        out_queue.put(e)
+
+
+def flow_speed(prev_gray, gray, flow_params=FARNEBACK_PARAMS):
+    """2フレーム間のフローの大きさの平均（ピクセル/フレーム間隔）"""
+    import cv2
+
+    flow = cv2.calcOpticalFlowFarneback(prev_gray, gray, None, **flow_params)
+    mag, _ = cv2.cartToPolar(flow[..., 0], flow[..., 1])
+    return float(np.mean(mag))
+
+
+def stream_flow_speeds(video_path, step=DEFAULT_STEP, scale=DEFAULT_SCALE, workers=None,
+                       queue_size=DEFAULT_QUEUE_SIZE, flow_params=FARNEBACK_PARAMS):
+    """動画の速度波形を (times, speeds) の配列で返す
+
+    speeds は step フレームごとのフロー量の平均に fps / step を掛けたもの、
+    times はそのフレームの時刻（秒）。
+    """
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) - 1)
+    max_in_flight = 2 * workers
+
+    frames = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+    decoder = threading.Thread(target=_decode_frames,
+                               args=(cap, step, scale, frames, stop_event), daemon=True)
+    decoder.start()
+
+    times = []
+    speeds = []
+    pending = deque()
+    prev = None
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                item = frames.get()
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                frame_idx, gray = item
+                if prev is not None:
+                    pending.append((frame_idx, pool.submit(flow_speed, prev, gray, flow_params)))
+                    # 投入順に受け取ることで時刻順を保ち、同時に未処理の組の数を抑える
+                    while len(pending) > max_in_flight:
+                        idx, future = pending.popleft()
+                        times.append(idx / fps)
+                        speeds.append(future.result() * (fps / step))
+                prev = gray
+
+            while pending:
+                idx, future = pending.popleft()
+                times.append(idx / fps)
+                speeds.append(future.result() * (fps / step))
+    finally:
+        stop_event.set()
+        # キューが満杯でデコーダが止まっている場合に備えて空にする
+        while decoder.is_alive():
+            try:
+                frames.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        cap.release()
+
+    if prev is None:
+        raise RuntimeError("Failed to read first frame")
+    return np.array(times), np.array(speeds)
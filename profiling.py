@@ -0,0 +1,216 @@
+"""
+解析の段階ごとの計測
+
+読み込み・パラメータ抽出・描画などの関数に @profiled を付けておき、計測を有効にして
+実行すると、段階ごとの実行時間・呼び出し回数・処理した行数・読んだバイト数を集計する。
+無効のとき（既定）は、@profiled の関数はフラグを1つ見てそのまま元の関数を呼ぶだけになる。
+
+- 有効にする: 環境変数 PROFILE_ENV（"1" なら出力先は DEFAULT_OUTPUT、それ以外の値は
+  出力先のパス）、またはスクリプトの引数 --profile / --profile=<出力先>
+- 段階は入れ子にできる。行数・バイト数は add() で、実行中のすべての段階に足される
+  （trial_store が CSV と列ファイルの読み込みで呼ぶので、読み込み関数の段階に集まる）
+- 終了時に次の2つを書き、集計表を標準エラーに出す
+    <出力先>.folded       段階の入れ子ごとの自己時間（マイクロ秒）。flamegraph.pl や
+                          speedscope で読める collapsed stack 形式
+    <出力先>.summary.txt  段階ごとの集計表
+
+    @profiled
+    def load_phase_data(data_dir): ...
+
+    with profile_stage("plot"):
+        ...
+
+使い方:
+    VECTION_PROFILE=1 python experiment2_analysis.py
+    python brightness_data_analysis.py --profile=profile/brightness
+"""
+
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+
+PROFILE_ENV = "VECTION_PROFILE"
+PROFILE_FLAG = "--profile"
+DEFAULT_OUTPUT = "profile"
+
+_enabled = False
+_output = None
+_registered = False
+# 段階の入れ子（名前のタプル）-> [呼び出し回数, 合計ns, 自己ns, 行数, バイト数]
+_stats = {}
+_local = threading.local()
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(output=DEFAULT_OUTPUT):
+    """計測を有効にし、終了時に output.folded / output.summary.txt を書くようにする"""
+    global _enabled, _output, _registered
+    _enabled = True
+    _output = output
+    if not _registered:
+        atexit.register(dump)
+        _registered = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    _stats.clear()
+
+
+def enable_from_argv(argv=None):
+    """引数の --profile / --profile=<出力先> を取り除き、あれば計測を有効にする"""
+    argv = sys.argv if argv is None else argv
+    for arg in list(argv[1:]):
+        if arg == PROFILE_FLAG or arg.startswith(PROFILE_FLAG + "="):
+            argv.remove(arg)
+            enable(arg.partition("=")[2] or DEFAULT_OUTPUT)
+    return _enabled
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+class _Stage:
+    __slots__ = ("name", "start", "children", "rows", "nbytes")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.children = 0
+        self.rows = 0
+        self.nbytes = 0
+        _stack().append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter_ns() - self.start
+        stack = _stack()
+        stack.pop()
+        if stack:
+            stack[-1].children += elapsed
+        key = tuple(frame.name for frame in stack) + (self.name,)
+        entry = _stats.get(key)
+        if entry is None:
+            entry = _stats[key] = [0, 0, 0, 0, 0]
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] += elapsed - self.children
+        entry[3] += self.rows
+        entry[4] += self.nbytes
+        return False
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def profile_stage(name):
+    """段階を計測するコンテキストマネージャ（無効なら何もしない）"""
+    return _Stage(name) if _enabled else _NULL_STAGE
+
+
+def add(rows=0, nbytes=0):
+    """実行中のすべての段階に、処理した行数と読んだバイト数を足す"""
+    if not _enabled:
+        return
+    for frame in _stack():
+        frame.rows += rows
+        frame.nbytes += nbytes
+
+
+def profiled(func=None, *, name=None):
+    """関数を段階として計測するデコレータ（name を省略すると関数の __qualname__）"""
+    if func is None:
+        return functools.partial(profiled, name=name)
+    label = name or func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        with _Stage(label):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def summary():
+    """段階の名前ごとの集計を、合計時間の長い順に辞書のリストで返す
+
+    再帰などで同じ名前が入れ子になっている場合、合計時間・行数・バイト数は
+    いちばん外側の呼び出しだけを数える。
+    """
+    by_name = {}
+    for key, (calls, total, self_ns, rows, nbytes) in _stats.items():
+        name = key[-1]
+        row = by_name.setdefault(name, {"stage": name, "calls": 0, "total_s": 0.0,
+                                        "self_s": 0.0, "rows": 0, "bytes": 0})
+        row["calls"] += calls
+        row["self_s"] += self_ns / 1e9
+        if name not in key[:-1]:
+            row["total_s"] += total / 1e9
+            row["rows"] += rows
+            row["bytes"] += nbytes
+    return sorted(by_name.values(), key=lambda row: row["total_s"], reverse=True)
+
+
+def format_summary(rows=None):
+    rows = summary() if rows is None else rows
+    width = max([len("stage")] + [len(row["stage"]) for row in rows])
+    header = (f"{'stage':<{width}s} {'calls':>7s} {'total [s]':>10s} {'self [s]':>10s} "
+              f"{'rows':>12s} {'MB':>10s}")
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(f"{row['stage']:<{width}s} {row['calls']:>7d} {row['total_s']:>10.3f} "
+                     f"{row['self_s']:>10.3f} {row['rows']:>12d} {row['bytes'] / 1e6:>10.1f}")
+    return "\n".join(lines)
+
+
+def folded_stacks():
+    """collapsed stack 形式の行（"a;b;c 自己時間[µs]"）のリスト"""
+    return [f"{';'.join(key)} {self_ns // 1000}"
+            for key, (_, _, self_ns, _, _) in sorted(_stats.items()) if self_ns >= 1000]
+
+
+def dump(output=None):
+    """集計を output.folded / output.summary.txt に書き、集計表を標準エラーに出す"""
+    output = output or _output or DEFAULT_OUTPUT
+    if not _stats:
+        return None
+    directory = os.path.dirname(os.path.abspath(output))
+    os.makedirs(directory, exist_ok=True)
+    with open(output + ".folded", "w", encoding="utf-8") as f:
+        f.write("\n".join(folded_stacks()) + "\n")
+    table = format_summary()
+    with open(output + ".summary.txt", "w", encoding="utf-8") as f:
+        f.write(table + "\n")
+    print(f"\n{table}\nプロファイルを {output}.folded / {output}.summary.txt に保存しました",
+          file=sys.stderr)
+    return output
+
+
+_env_value = os.environ.get(PROFILE_ENV, "")
+if _env_value not in ("", "0"):
+    enable(DEFAULT_OUTPUT if _env_value.lower() in ("1", "true", "yes") else _env_value)
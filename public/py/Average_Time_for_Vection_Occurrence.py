@@ -1,7 +1,12 @@
-import pandas as pd
+import os
+import sys
+
 import matplotlib.pyplot as plt
 import numpy as np
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from vection_events import load_events
+
 # File paths for different experimental conditions
 file_paths = [
     '/Users/jasmine/Documents/GitHub/vectionProject/ExperimentData/20241105_180723_continuous_cameraSpeed4_fps60_I_trialNumber1.csv',
@@ -84,6 +89,9 @@ luminance_mixture_paths = {
     ]
 }
 
+# Run-length encode the Vection Response of every trial once (cached by file content)
+events = load_events(file_paths + [path for paths in luminance_mixture_paths.values() for path in paths])
+
 # Initialize dictionaries for storing latent and duration times
 participant_latent_times = {}
 participant_duration_times = {}
@@ -95,21 +103,14 @@ for file_path in file_paths:
         participant_latent_times[participant_name] = []
         participant_duration_times[participant_name] = []
 
-    # Load the data
-    df = pd.read_csv(file_path)
-    time = df['Time'] / 1000  # Convert time to seconds
-    vection_response = df['Vection Response']
+    # Vection on/off intervals of this trial
+    trial_events = events[file_path]
 
-    # Calculate latent time
-    if (vection_response == 1).any():
-        first_occurrence_index = vection_response[vection_response == 1].index[0]
-        latent_time = time[first_occurrence_index]
-    else:
-        latent_time = np.nan  # Mark as NaN if no vection occurs
+    # Calculate latent time (NaN if no vection occurs)
+    latent_time = trial_events.latency()
 
     # Calculate duration time
-    time_diff = time.diff().fillna(0)
-    duration_time = time_diff[vection_response == 1].sum() if latent_time is not np.nan else 0
+    duration_time = trial_events.total_duration()
 
     # Store the data
     participant_latent_times[participant_name].append(latent_time)
@@ -135,21 +136,12 @@ for condition, paths in luminance_mixture_paths.items():
             participant_latent_times[participant_name] = []
             participant_duration_times[participant_name] = []
 
-        # Load the data
-        df = pd.read_csv(file_path)
-        time = df['Time'] / 1000
-        vection_response = df['Vection Response']
-
-        # Calculate latent time
-        if (vection_response == 1).any():
-            first_occurrence_index = vection_response[vection_response == 1].index[0]
-            latent_time = time[first_occurrence_index]
-        else:
-            latent_time = np.nan
-
-        # Calculate duration time
-        time_diff = time.diff().fillna(0)
-        duration_time = time_diff[vection_response == 1].sum() if latent_time is not np.nan else 0
+        # Vection on/off intervals of this trial
+        trial_events = events[file_path]
+
+        # Calculate latent time and duration time
+        latent_time = trial_events.latency()
+        duration_time = trial_events.total_duration()
 
         participant_latent_times[participant_name].append(latent_time)
         participant_duration_times[participant_name].append(duration_time)
@@ -1,7 +1,13 @@
+import os
+import sys
+
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from vection_events import load_events
+
 # File paths for different experimental conditions
 file_paths = [
     '/Users/jasmine/Documents/GitHub/vectionProject/ExperimentData/20241105_180723_continuous_cameraSpeed4_fps60_I_trialNumber1.csv',
@@ -87,27 +93,15 @@ luminance_mixture_paths = {
 # Function to calculate reoccurrence times for each participant
 def calculate_reoccurrence_times(file_paths):
     participant_reoccurrence_times = {}
+    events = load_events(file_paths)
 
     for file_path in file_paths:
         # Extract participant identifier from file name (e.g., "_G_")
         participant_name = file_path.split('_')[5]
 
-        # Load the data
-        df = pd.read_csv(file_path)
-        time = df['Time'] / 1000  # Convert time to seconds
-        vection_response = df['Vection Response']
-
-        # Identify where Vection stops (1 → 0) and reoccurs (0 → 1)
-        stop_indexes = vection_response[(vection_response.shift(1) == 1) & (vection_response == 0)].index
-        reoccur_indexes = vection_response[(vection_response.shift(1) == 0) & (vection_response == 1)].index
-
-        # Calculate the time it takes for Vection to stop and reoccur
-        reoccurrence_times = []
-        for stop_index in stop_indexes:
-            reoccur_index = reoccur_indexes[reoccur_indexes > stop_index].min()  # Find the next occurrence after stop
-            if not np.isnan(reoccur_index):
-                reoccurrence_time = time[reoccur_index] - time[stop_index]
-                reoccurrence_times.append(reoccurrence_time)
+        # Time from each Vection stop (1 → 0) to the next reoccurrence (0 → 1),
+        # matched with searchsorted over the trial's on/off intervals
+        reoccurrence_times = list(events[file_path].reoccurrence_times())
 
         # Store reoccurrence times by participant
         if participant_name not in participant_reoccurrence_times:
@@ -1,7 +1,13 @@
+import os
+import sys
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from luminance_archive import read_window
+
 # === 1. 文件列表：H 与 K 各 3 个试验 ===
 files = {
     "H": [
@@ -55,17 +61,9 @@ v_lo = (V0-V0s) + (A1-A1s)*np.sin(omega*t) + (A2-A2s)*np.cos(omega*t) + \
        (A3-A3s)*np.sin(2*omega*t) + (A4-A4s)*np.cos(2*omega*t)
 
 # === 4. 读取亮度（随便选 H 的第 1 个试验做示例） ===
-df_lum = pd.read_csv(files["H"][0])
-df_lum.columns = df_lum.columns.str.strip()
+# 只读取前 10 秒（内存映射归档的时间窗），奇数 BackFrame 的前后数据已在导入时交换
+df_lum = read_window(files["H"][0], 0, 10, normalized=True)
 time = df_lum["Time"] / 1000
-# 交换奇数 BackFrame 的前后数据（保持你之前的逻辑）
-mask = (time <= 10) & (df_lum["BackFrameNum"] % 2 != 0)
-tmp_num = df_lum.loc[mask, "BackFrameNum"].copy()
-tmp_lum = df_lum.loc[mask, "BackFrameLuminance"].copy()
-df_lum.loc[mask, "BackFrameNum"]       = df_lum.loc[mask, "FrondFrameNum"]
-df_lum.loc[mask, "BackFrameLuminance"] = df_lum.loc[mask, "FrondFrameLuminance"]
-df_lum.loc[mask, "FrondFrameNum"]      = tmp_num
-df_lum.loc[mask, "FrondFrameLuminance"]= tmp_lum
 
 # === 5. 组合子图 ===
 fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(9, 6), sharex=True, gridspec_kw={'hspace': 0.3})
@@ -1,11 +1,16 @@
-import pandas as pd
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from trial_store import read_normalized_trial
+
 # ========== 1. 读取单个 CSV 文件 ==========
 file_path = "D:/vectionProject/public/BrightnessLinearData/20250701_175243_Fps1_CameraSpeed1_ExperimentPattern_Fourier_ParticipantName_KK_TrialNumber_1.csv"
-df = pd.read_csv(file_path)
-df.columns = df.columns.str.strip()
+# 前 2 秒内 BackFrameNum 为奇数的行已交换 Frond/Back（导入时统一修正）
+df = read_normalized_trial(file_path, until=2)
 
 # ========== 2. 提取参数 V0, A1, A2, A3, A4 ==========
 param_names = ["V0", "A1", "A2", "A3", "A4"]
@@ -35,9 +40,6 @@ t = np.linspace(0, 10, 2000)
 
 # ========== 4. 读取亮度数据并修正 ==========
 time = df["Time"] / 1000
-mask = (time <= 2) & (df["BackFrameNum"] % 2 != 0)
-df.loc[mask, ["BackFrameNum", "FrondFrameNum"]] = df.loc[mask, ["FrondFrameNum", "BackFrameNum"]].to_numpy()
-df.loc[mask, ["BackFrameLuminance", "FrondFrameLuminance"]] = df.loc[mask, ["FrondFrameLuminance", "BackFrameLuminance"]].to_numpy()
 
 # ========== 5. 作图 ==========
 fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(9, 6), sharex=True, gridspec_kw={'hspace': 0.3})
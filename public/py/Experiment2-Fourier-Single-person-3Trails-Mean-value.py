@@ -1,4 +1,9 @@
 import pandas as pd, numpy as np, matplotlib.pyplot as plt
+import os, sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from luminance_archive import read_window
+from velocity_curves import FOURIER_FORM, evaluate_curves, velocity_curve
 
 # ========== 1. 把你想分析的 CSV 路径放进来 ==========
 # 示例：仅 1 位参与者 H（3 次试验）
@@ -45,21 +50,14 @@ for idx, (person, paths) in enumerate(files.items()):
 
 # ========== 3. 曲线生成函数 ==========
 def v_curve(par, t):
-    V0, A1, A2, A3, A4 = par
-    ω = 2*np.pi
-    return V0 + A1*np.sin(ω*t) + A2*np.cos(ω*t) + \
-           A3*np.sin(2*ω*t) + A4*np.cos(2*ω*t)
+    return velocity_curve(par, t, form=FOURIER_FORM)
 
 t = np.linspace(0, 10, 2000)
 
 # ========== 4. 亮度（用第一条文件） ==========
 first_file = next(iter(files.values()))[0]          # 取字典第一人第一试
-df_lum = pd.read_csv(first_file); df_lum.columns = df_lum.columns.str.strip()
+df_lum = read_window(first_file, 0, 10, normalized=True)   # 只读前 10 秒，Frond/Back 已交换
 time = df_lum["Time"] / 1000
-mask = (time<=10) & (df_lum["BackFrameNum"]%2!=0)
-df_lum.loc[mask, ["BackFrameNum","FrondFrameNum"]] = df_lum.loc[mask, ["FrondFrameNum","BackFrameNum"]].to_numpy()
-df_lum.loc[mask, ["BackFrameLuminance","FrondFrameLuminance"]] = \
-    df_lum.loc[mask, ["FrondFrameLuminance","BackFrameLuminance"]].to_numpy()
 
 # ========== 5. 画图 ==========
 fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(9,6), sharex=True, gridspec_kw={'hspace':0.3})
@@ -75,9 +73,8 @@ ax1.grid(True); ax1.legend()
 for idx, (person, mean_par) in enumerate(person_mean.items()):
     sd_par   = person_sd[person]
     col      = colors[idx % len(colors)]
-    v_mean   = v_curve(mean_par, t)
-    v_upper  = v_curve(mean_par + sd_par, t)
-    v_lower  = v_curve(mean_par - sd_par, t)
+    v_mean, v_lower, v_upper = evaluate_curves(
+        np.vstack([mean_par, mean_par - sd_par, mean_par + sd_par]), t, form=FOURIER_FORM)
 
     ax2.plot(t, v_mean, color=col, label=f"")
     # 参数文本框
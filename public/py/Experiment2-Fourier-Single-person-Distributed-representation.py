@@ -1,7 +1,13 @@
+import os
+import sys
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from trial_store import read_normalized_trial
+
 # 1. 读取 CSV 文件（修改为你的文件路径）
 file_paths = [
     "D:/vectionProject/public/Experiment2Data/20250529_143935_fps1_ParticipantName_N_TrialNumber_1.csv",
@@ -13,22 +19,10 @@ file_paths = [
              "D:/vectionProject/public/Experiment2Data/20250518_102850_fps1_ParticipantName_K_TrialNumber_2.csv",
              "D:/vectionProject/public/Experiment2Data/20250518_104013_fps1_ParticipantName_K_TrialNumber_3.csv"] """
 
-df = pd.read_csv(file_paths[0])
-
-# 2. 去除列名空格
-df.columns = df.columns.str.strip()
+# 2. 读取（列名空格已去除，前 10 秒 BackFrameNum 为奇数的行已交换 Frond/Back）
+df = read_normalized_trial(file_paths[0], until=10)
 time = df['Time'] / 1000
 
-mask = (time <= 10) & (df['BackFrameNum'] % 2 != 0)
-# 先拷贝原值
-orig_num = df.loc[mask, 'BackFrameNum'].copy()
-orig_lum = df.loc[mask, 'BackFrameLuminance'].copy()
-
-df.loc[mask, 'BackFrameNum']       = df.loc[mask, 'FrondFrameNum']
-df.loc[mask, 'BackFrameLuminance'] = df.loc[mask, 'FrondFrameLuminance']
-df.loc[mask, 'FrondFrameNum']      = orig_num
-df.loc[mask, 'FrondFrameLuminance']= orig_lum
-
 frond_frame_num = df['FrondFrameNum']
 back_frame_num = df['BackFrameNum']
 frond_frame_luminance = df['FrondFrameLuminance']
@@ -1,11 +1,16 @@
-import pandas as pd
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from trial_store import read_normalized_trial
+
 # 加载新的文件
 file_path = "D:/vectionProject/public/BrightnessLinearData/20250709_145729_Fps1_CameraSpeed1_ExperimentPattern_Phase_ParticipantName_KK_TrialNumber_1_BrightnessBlendMode_CosineOnly.csv"
-df = pd.read_csv(file_path)
-df.columns = df.columns.str.strip()
+# 前 10 秒内 BackFrameNum 为奇数的行已交换 Frond/Back（导入时统一修正）
+df = read_normalized_trial(file_path, until=10)
 
 # 参数提取
 v0_series = df[df["StepNumber"] == 0]["Velocity"]
@@ -28,9 +33,6 @@ t = np.linspace(0, 10, 2000)
 
 # 亮度数据修正
 time = df["Time"] / 1000
-mask = (time <= 10) & (df["BackFrameNum"] % 2 != 0)
-df.loc[mask, ["BackFrameNum", "FrondFrameNum"]] = df.loc[mask, ["FrondFrameNum", "BackFrameNum"]].to_numpy()
-df.loc[mask, ["BackFrameLuminance", "FrondFrameLuminance"]] = df.loc[mask, ["FrondFrameLuminance", "BackFrameLuminance"]].to_numpy()
 
 # 绘图
 fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(9, 6), sharex=True, gridspec_kw={'hspace': 0.3})
@@ -1,4 +1,8 @@
 import pandas as pd, numpy as np, matplotlib.pyplot as plt
+import os, sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from luminance_archive import read_window
 
 # ========== 1. 把你想分析的 CSV 路径放进来 ==========
 # 示例：仅 1 位参与者 H（3 次试验）
@@ -54,12 +58,8 @@ t = np.linspace(0, 10, 2000)
 
 # ========== 4. 亮度（用第一条文件） ==========
 first_file = next(iter(files.values()))[0]          # 取字典第一人第一试
-df_lum = pd.read_csv(first_file); df_lum.columns = df_lum.columns.str.strip()
+df_lum = read_window(first_file, 0, 10, normalized=True)   # 只读前 10 秒，Frond/Back 已交换
 time = df_lum["Time"] / 1000
-mask = (time<=10) & (df_lum["BackFrameNum"]%2!=0)
-df_lum.loc[mask, ["BackFrameNum","FrondFrameNum"]] = df_lum.loc[mask, ["FrondFrameNum","BackFrameNum"]].to_numpy()
-df_lum.loc[mask, ["BackFrameLuminance","FrondFrameLuminance"]] = \
-    df_lum.loc[mask, ["FrondFrameLuminance","BackFrameLuminance"]].to_numpy()
 
 # ========== 5. 画图 ==========
 fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(9,6), sharex=True, gridspec_kw={'hspace':0.3})
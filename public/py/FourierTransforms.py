@@ -1,30 +1,28 @@
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.fft import fft2, fftshift
 from skimage import color
 import matplotlib.image as mpimg
 
-# Function to load an image, convert to grayscale, and compute its Fourier Transform
-def process_image(image_path):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from frame_spectra import normalized_log_magnitude
+
+# Function to load an image and convert to grayscale
+def load_gray_image(image_path):
     try:
         img = mpimg.imread(image_path)
     except FileNotFoundError:
         print(f"Image file '{image_path}' not found. Please check the path.")
-        return None, None
+        return None
 
     # Handle RGBA images by discarding the alpha channel
     if img.shape[-1] == 4:
         img = img[..., :3]  # Discard the alpha channel
 
     # Convert to grayscale
-    gray_img = color.rgb2gray(img)
-
-    # Compute the Fourier Transform
-    fft_result = fft2(gray_img)
-    fft_magnitude = np.log(np.abs(fftshift(fft_result)) + 1)  # Enhance visualization
-    fft_normalized = fft_magnitude / np.max(fft_magnitude)  # Normalize for display
-
-    return gray_img, fft_normalized
+    return color.rgb2gray(img)
 
 # Paths to the three images
 image_paths = [
@@ -33,11 +31,19 @@ image_paths = [
     'image3.png',
 ]
 
-# Process all images
-processed_images = [process_image(path) for path in image_paths]
+# Load all images
+gray_images = [load_gray_image(path) for path in image_paths]
+
+# Check if all images were successfully loaded
+if all(img is not None for img in gray_images):
+    # Compute the Fourier Transforms: log(|F|+1) normalized for display
+    # (same-sized images are transformed together in one batch)
+    if len({img.shape for img in gray_images}) == 1:
+        fft_images = list(normalized_log_magnitude(np.stack(gray_images)))
+    else:
+        fft_images = [normalized_log_magnitude(img)[0] for img in gray_images]
+    processed_images = list(zip(gray_images, fft_images))
 
-# Check if all images were successfully processed
-if all(img[0] is not None for img in processed_images):
     fig, axs = plt.subplots(3, 3, figsize=(15, 10))
 
     # Plot each image and its Fourier Transform
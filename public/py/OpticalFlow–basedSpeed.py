@@ -1,55 +1,20 @@
-import cv2
-import numpy as np
+import os
+import sys
+
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from optical_flow_speed import stream_flow_speeds
+
 # Video path
 video_path = 'D:/video/7月12日.mp4'
 
-# Open video
-cap = cv2.VideoCapture(video_path)
-if not cap.isOpened():
-    raise RuntimeError(f"Cannot open video {video_path}")
-
-fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
-
-# Read first frame, convert to grayscale, downsample
-ret, prev_frame = cap.read()
-if not ret:
-    raise RuntimeError("Failed to read first frame")
-prev_gray = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
-h, w = prev_gray.shape
-scale = 0.25
-prev_gray = cv2.resize(prev_gray, (int(w*scale), int(h*scale)))
-
-speeds = []
-times = []
-
 step = 2  # sample every 2 frames
-frame_idx = 0
-
-# Process frames
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
-    frame_idx += 1
-    if frame_idx % step != 0:
-        continue
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    gray_small = cv2.resize(gray, (int(w*scale), int(h*scale)))
-    
-    # Optical flow
-    flow = cv2.calcOpticalFlowFarneback(prev_gray, gray_small, None,
-                                        pyr_scale=0.5, levels=3, winsize=15,
-                                        iterations=3, poly_n=5, poly_sigma=1.2, flags=0)
-    mag, _ = cv2.cartToPolar(flow[...,0], flow[...,1])
-    speed = np.mean(mag) * (fps / step)
-    speeds.append(speed)
-    times.append(frame_idx / fps)
-    
-    prev_gray = gray_small
+scale = 0.25  # downsample before optical flow
 
-cap.release()
+# Decode in a background thread (skipped frames are only grabbed, not decoded)
+# and compute optical flow for consecutive frame pairs in parallel workers
+times, speeds = stream_flow_speeds(video_path, step=step, scale=scale)
 
 # Plot
 plt.figure(figsize=(10, 4))
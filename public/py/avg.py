@@ -1,6 +1,11 @@
-import pandas as pd
+import os
+import sys
+
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from vection_events import load_events
+
 # Load data from three CSV files (replace 'file_path_X.csv' with your actual file paths)
 file_paths = [
     'D:/unity/Vection/Assets/ExperimentData/20241030_134518_continuous_cameraSpeed4_fps60_G_trialNumber0.csv',
@@ -11,46 +16,21 @@ first_occurrence_times = []
 total_durations_1 = []
 average_durations_1 = []
 
-# Loop through each file and calculate first occurrence time, total duration, and average duration when Vection Response is 1
-for file_path in file_paths:
-    df = pd.read_csv(file_path)
+# Run-length encode the Vection Response of each file once (cached by file content)
+events = load_events(file_paths)
 
-    # Extract 'Time' and 'Vection Response' columns
-    time = df.iloc[:, 1]/1000  # Second column as Time
-    vection_response = df.iloc[:, 2]  # Third column as Vection Response
+# Calculate first occurrence time, total duration, and average duration when Vection Response is 1
+for file_path in file_paths:
+    trial_events = events[file_path]
 
     # Calculate the first occurrence of Vection Response equal to 1
-    first_occurrence_index = vection_response[vection_response == 1].index[0]
-    first_occurrence_time = time[first_occurrence_index]
-    first_occurrence_times.append(first_occurrence_time)
+    first_occurrence_times.append(trial_events.latency())
 
     # Calculate the total duration when Vection Response is 1
-    time_diff = time.diff().fillna(0)
-    total_duration_1 = time_diff[vection_response == 1].sum()
-    total_durations_1.append(total_duration_1)
+    total_durations_1.append(trial_events.total_duration())
 
     # Calculate the average duration of consecutive blocks of Vection Response equal to 1
-    continuous_blocks = []
-    current_block_duration = 0
-
-    # Loop through vection_response and corresponding time_diff
-    for i in range(len(vection_response)):
-        if vection_response.iloc[i] == 1:
-            current_block_duration += time_diff.iloc[i]
-        elif current_block_duration > 0:
-            continuous_blocks.append(current_block_duration)
-            current_block_duration = 0
-
-    # Append the last block if still ongoing
-    if current_block_duration > 0:
-        continuous_blocks.append(current_block_duration)
-
-    if continuous_blocks:
-        average_duration_1 = sum(continuous_blocks) / len(continuous_blocks)
-    else:
-        average_duration_1 = 0
-
-    average_durations_1.append(average_duration_1)
+    average_durations_1.append(trial_events.mean_block_duration())
 
 # Plotting the bar chart for first occurrence times, total durations, and average durations
 x_labels = ['Experiment 1', 'Experiment 2', 'Experiment 3']
@@ -1,49 +1,25 @@
-import pandas as pd
+import os
+import sys
+
 import matplotlib.pyplot as plt
-from collections import Counter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from transition_histograms import transition_histograms
 
 # File paths for the three CSV files
 file_paths = [
     '../ExperimentDataO/20250115_111649_Dots_right_luminanceMixture_cameraSpeed4_fps10_B_trialNumber2.csv',
      
 ]
-# Initialize a dictionary to store the total counts for each FrondFrameLuminance value
-total_counts = {}
-total_occurrences = {}
-
-# Loop through each file path to process and calculate average occurrences
-for file_path in file_paths:
-    # Load the CSV file into a DataFrame
-    df = pd.read_csv(file_path)
-    
-    # Extract data from the DataFrame
-    vection_response = df['Vection Response']
-    frond_frame_luminance = df['BackFrameLuminance']
-    
-    # Identify the points where Vection Response changes from 1 to 0
-    changes_1_to_0 = (vection_response.diff() == -1)  # Find where the value goes from 1 to 0
-    
-    # Extract the corresponding FrondFrameLuminance values
-    frond_luminance_changes = frond_frame_luminance[changes_1_to_0]
-    
-    # Count occurrences of each FrondFrameLuminance value
-    frond_luminance_counts = Counter(frond_luminance_changes)
-    print(frond_luminance_counts);
-    # Update the total counts and occurrences for each FrondFrameLuminance value
-    for frond, count in frond_luminance_counts.items():
-        if frond in total_counts:
-            total_counts[frond] += count
-            total_occurrences[frond] += 1
-        else:
-            total_counts[frond] = count
-            total_occurrences[frond] = 1
-
-# Calculate the average occurrences for each FrondFrameLuminance value
-average_counts = {frond: total_counts[frond] / total_occurrences[frond] for frond in total_counts}
-
-# Prepare the data for plotting
-frond_frame_values = list(average_counts.keys())
-average_count_values = list(average_counts.values())
+# Histogram of the BackFrameLuminance values (rounded to 0.01) at the rows where
+# Vection Response changes from 1 to 0, counted per file in one pass and cached
+histogram = transition_histograms({'all': file_paths}, column='BackFrameLuminance')['all']['loss']
+for file_path, counts in zip(histogram.paths, histogram.counts):
+    seen = counts > 0
+    print(f"{os.path.basename(file_path)}: {dict(zip(histogram.levels[seen].round(2).tolist(), counts[seen].tolist()))}")
+
+# Calculate the average occurrences for each BackFrameLuminance value
+frond_frame_values, average_count_values = histogram.average_occurrences()
 
 # Create the figure for plotting
 fig, ax1 = plt.subplots(figsize=(8, 6))
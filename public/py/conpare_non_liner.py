@@ -5,18 +5,27 @@
 # Concepted by Taro Maeda, Aug 18, 2024
 
 
+import os
+import sys
+
 from psychopy import visual, core, event, clock
 import numpy as np
-import csv
 import matplotlib.pyplot as plt
 from datetime import datetime
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from experiment_log import FRAME_DTYPE, KEY_DTYPE, RecordLog, capacity_for, read_log, write_csv
+from stimulus_schedule import compile_pulsation_schedule, grating_texture
+
 # 実行時刻を取得し、ファイル名用にフォーマット
 current_time = datetime.now().strftime("%Y%m%d-%H%M%S")
 data_filename = f"../experimental_results/experiment_data_{current_time}.csv"
 key_pos_filename = f"../experimental_results/experiment_data_key_pos_{current_time}.csv"
 key_neg_filename = f"../experimental_results/experiment_data_key_neg_{current_time}.csv"
 result_image_filename = f"../experimental_results/experiment_results_{current_time}.png"
+# 試行中に追記するバイナリログ（落ちても最後の書き出しまでは読める）
+frame_log_filename = f"../experimental_results/experiment_data_frames_{current_time}.vlog"
+key_log_filename = f"../experimental_results/experiment_data_keys_{current_time}.vlog"
 
 # ウィンドウの設定（全画面表示に変更）
 win = visual.Window(color=[0.5, 0.5, 0.5], units='pix', fullscr=True)
@@ -26,11 +35,9 @@ win_width, win_height = win.size
 
 # 画像のロード（仮のパターン画像としてsin波を生成）
 spatial_freq = 3  # 空間周波数の変更
-x = np.linspace(-np.pi, np.pi, 256)
-grating_texture = np.sin(x * spatial_freq)
-texture_top     = np.tile(grating_texture, (256, 1))
-texture_bottom1 = np.tile(np.sin((x - np.pi/4) * spatial_freq), (256, 1))
-texture_bottom2 = np.tile(np.sin((x + np.pi/4) * spatial_freq), (256, 1))
+texture_top     = grating_texture(spatial_freq)  # ディスクにキャッシュ
+texture_bottom1 = grating_texture(spatial_freq, -np.pi/4)
+texture_bottom2 = grating_texture(spatial_freq, np.pi/4)
 
 # A light green text
 focus_point_image = visual.Circle(win,radius=10, edges=5, pos=(0, 0), fillColor=(1, 0, 0), colorSpace='rgb', opacity=1.0, autoDraw=True)
@@ -45,49 +52,48 @@ speed_top = 0.2  # 上の画像の一定速度の変更
 speed_amp = 0.2  # 下の画像の三角波の速度振幅の変更
 triangle_freq = 0.2  # 三角波の周波数（Hz）の変更
 mix_amp = 0.25  # 三角波の振幅の変更
-key_store = {}
-key_store['neg'] = []
-key_store['pos'] = []
-
-# 記録用のリスト
-time_points = []
-tri_speed_values = []
-blend_ratio_values = []
 
 # キー操作の定義
 def update_mix_amplitude(keys, t):
     global mix_amp
-    global key_store
     if 'w' in keys:
         mix_amp = min(1, mix_amp + 0.05)
-        key_store['pos'].append(t)
+        key_log.append(t, 1)
     if 's' in keys:
         mix_amp = max(0, mix_amp - 0.05)
-        key_store['neg'].append(t)
+        key_log.append(t, -1)
 
 # 実験用の時間管理
+trial_duration = 20  # 20秒間の試行
+# 全フレーム分の速度・合成比率・位相を試行の前に計算しておく（リフレッシュレートは実測）
+schedule = compile_pulsation_schedule(trial_duration, win.getActualFrameRate() or 60.0,
+                                      speed_top, speed_amp, triangle_freq)
+# 記録用のログ（キー操作は 'w' が +1、's' が -1）。実測のリフレッシュレートは当てにならないので、
+# 容量は 240 Hz で見積もる（ループ中にファイルを広げない）
+frame_log = RecordLog(frame_log_filename, FRAME_DTYPE, capacity=capacity_for(trial_duration))
+key_log = RecordLog(key_log_filename, KEY_DTYPE, capacity=capacity_for(trial_duration))
 global_clock = core.Clock()
-trial_clock = clock.CountdownTimer(20)  # 20秒間の試行
+trial_clock = clock.CountdownTimer(trial_duration)
 
 # 実験ループ
 while trial_clock.getTime() > 0:
     t = global_clock.getTime()
+    # 経過時間に対応するフレーム（フレームが落ちてもその時刻の位相になる）
+    frame = schedule.frame_index(t)
 
     # 上の画像（甲）の移動設定
-    top_image.phase += speed_top / 60.0
+    top_image.phase = schedule.top_phase[frame]
 
     # 下の画像（乙）の速度を三角波に基づいて設定
-    tri_speed = speed_amp * (np.sin(2 * np.pi * triangle_freq * t)) + 0.5
-    blend_ratio = mix_amp * (np.cos(2 * np.pi * triangle_freq * t) + 1) * 0.5
+    tri_speed = schedule.tri_speed[frame]
+    blend_ratio = mix_amp * schedule.blend_shape[frame]
 
-    # データの記録
-    time_points.append(t)
-    tri_speed_values.append(tri_speed)
-    blend_ratio_values.append(blend_ratio)
+    # データの記録（書き出しはバックグラウンド）
+    frame_log.append(t, tri_speed, blend_ratio)
 
     # 乙の合成と移動
-    bottom_image1.phase += tri_speed / 60.0
-    bottom_image2.phase += tri_speed / 60.0
+    bottom_image1.phase = schedule.bottom_phase[frame]
+    bottom_image2.phase = schedule.bottom_phase[frame]
     bottom_image1.opacity = 1 - blend_ratio
     bottom_image2.opacity = blend_ratio
 
@@ -104,29 +110,27 @@ while trial_clock.getTime() > 0:
         break
     update_mix_amplitude(keys, t)
 
+frame_log.close()
+key_log.close()
+frames = read_log(frame_log_filename)
+keys = read_log(key_log_filename)
+time_points = frames['time']
+tri_speed_values = frames['tri_speed']
+blend_ratio_values = frames['blend_ratio']
+key_store = {'pos': keys['time'][keys['key'] > 0], 'neg': keys['time'][keys['key'] < 0]}
+
 ddt_blend_ratio_values = np.gradient(blend_ratio_values) * 20.0
-sum_speed_ddt = [speed + ddt for speed, ddt in zip(tri_speed_values, ddt_blend_ratio_values)]
-
-# CSVファイルにデータを保存
-with open(data_filename, 'w', newline='') as file:
-    writer = csv.writer(file)
-    writer.writerow(['Time (s)', 'Triangular Speed', 'Blending Ratio', 'd/dt Blending Ratio'])
-    for t, speed, ratio, ddt in zip(time_points, tri_speed_values, blend_ratio_values, ddt_blend_ratio_values):
-        writer.writerow([t, speed, ratio, ddt])
+sum_speed_ddt = tri_speed_values + ddt_blend_ratio_values
+
+# CSVファイルにデータを保存（試行後にログから変換）
+write_csv(data_filename, {'Time (s)': time_points, 'Triangular Speed': tri_speed_values,
+                          'Blending Ratio': blend_ratio_values, 'd/dt Blending Ratio': ddt_blend_ratio_values})
 print(f"データが '{data_filename}' に保存されました。")
 
-with open(key_pos_filename, 'w', newline='') as file:
-    writer = csv.writer(file)
-    writer.writerow(['Time (s)'])
-    for t in key_store['pos']:
-        writer.writerow([t])
+write_csv(key_pos_filename, {'Time (s)': key_store['pos']})
 print(f"データが '{key_pos_filename}' に保存されました。")
 
-with open(key_neg_filename, 'w', newline='') as file:
-    writer = csv.writer(file)
-    writer.writerow(['Time (s)'])
-    for t in key_store['neg']:
-        writer.writerow([t])
+write_csv(key_neg_filename, {'Time (s)': key_store['neg']})
 print(f"データが '{key_neg_filename}' に保存されました。")
 
 # 終了処理
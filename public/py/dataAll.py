@@ -1,6 +1,11 @@
-import pandas as pd
+import os
+import sys
+
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from vection_events import load_events
+
 # Load data from three CSV files (replace 'file_path_X.csv' with your actual file paths)
 file_paths = ['D:/vectionProject/public/ExperimentData/20241113_154414_luminanceMixture_cameraSpeed4_fps5_G_trialNumber1.csv',
               'D:/vectionProject/public/ExperimentData/20241113_155123_luminanceMixture_cameraSpeed4_fps5_G_trialNumber2.csv',
@@ -8,23 +13,18 @@ file_paths = ['D:/vectionProject/public/ExperimentData/20241113_154414_luminance
 first_occurrence_times = []
 total_durations_1 = []
 
-# Loop through each file and calculate first occurrence time and total duration when Vection Response is 1
-for file_path in file_paths:
-    df = pd.read_csv(file_path)
+# Run-length encode the Vection Response of each file once (cached by file content)
+events = load_events(file_paths)
 
-    # Extract 'Time' and 'Vection Response' columns
-    time = df['Time']/1000  # Second column as Time
-    vection_response = df['Vection Response']  # Third column as Vection Response
+# Calculate first occurrence time and total duration when Vection Response is 1
+for file_path in file_paths:
+    trial_events = events[file_path]
 
     # Calculate the first occurrence of Vection Response equal to 1
-    first_occurrence_index = vection_response[vection_response == 1].index[0]
-    first_occurrence_time = time[first_occurrence_index]
-    first_occurrence_times.append(first_occurrence_time)
+    first_occurrence_times.append(trial_events.latency())
 
     # Calculate the total duration when Vection Response is 1
-    time_diff = time.diff().fillna(0)
-    total_duration_1 = time_diff[vection_response == 1].sum()
-    total_durations_1.append(total_duration_1)
+    total_durations_1.append(trial_events.total_duration())
 
 # Plotting the bar chart for first occurrence times and total durations
 x_labels = ['Experiment 1', 'Experiment 2', 'Experiment 3']
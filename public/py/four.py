@@ -2,40 +2,14 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import os
-import json
-
-
-# 定义分类结构
-# categories = {
-#     "Dots_forward": {"fps5": [], "fps10": [], "fps20": [], "fps30": [], "fps60": []},
-#     "Dots_right": {"fps5": [], "fps10": [], "fps20": [], "fps30": [], "fps60": []},
-#     "Natural_right": {"fps5": [], "fps10": [], "fps20": [], "fps30": [], "fps60": []},
-#     "Natural_forward": {"fps5": [], "fps10": [], "fps20": [], "fps30": [], "fps60": []},
-# }
-
-# 读取现有的A.json文件内容
-with open('../data/A.json', 'r', encoding='utf-8') as file:
-    simulated_data = json.load(file)
-
-# 定义文件夹路径
-folder_path = "../ExperimentData/"  # 替换为你的文件夹路径
-
-# # 遍历文件夹中的文件
-# for file_name in os.listdir(folder_path):
-#     if file_name.endswith(".csv"):
-#         # 根据文件名提取分类信息
-#         parts = file_name.split("_")
-#         if len(parts) >= 7:
-#             category = parts[2] + "_" + parts[3]  # 提取 "Dots_forward", "Dots_right", 等类别
-#             fps = parts[6]  # 提取 "30 fps", "60 fps", 等
-            
-#             # 将文件路径添加到对应类别中
-#             if category in simulated_data and fps in simulated_data[category]:
-#                 simulated_data[category][fps].append(folder_path+file_name)
-            
-# # 将分类结果保存到A.json文件中
-# with open('../data/A.json', 'w', encoding='utf-8') as file:
-#     json.dump(simulated_data, file, indent=4)
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from condition_manifest import condition_records, load_manifest
+
+
+# 按条件分类的试行（由 condition_manifest 扫描 ExperimentData* 生成，取代手工维护的 ../data/A.json）
+simulated_data = condition_records(load_manifest(), "A")
 
 
 latent_times = {}
@@ -43,11 +17,12 @@ duration_times = {}
 for condition, data in simulated_data.items():
     luminance_latent_times = {}
     luminance_duration_times = {}
-    for xcondition, paths in data.items():
+    for xcondition, entries in data.items():
         participant_latent_times = {}
         participant_duration_times = {}
-        for file_path in paths:
-            participant_name = file_path.split('_')[-2]  # Extract participant identifier
+        for entry in entries:
+            file_path = entry["path"]
+            participant_name = entry["participant"].upper()  # Participant identifier（c 和 C 是同一参与者，A.json 里都写成 C）
             if participant_name not in participant_latent_times:
                 participant_latent_times[participant_name] = []
                 participant_duration_times[participant_name] = []
@@ -1,6 +1,10 @@
-import pandas as pd
+import os
+import sys
+
 import matplotlib.pyplot as plt
-from collections import Counter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from transition_histograms import transition_histograms
 
 # 新的数据结构：luminance_mixture_paths 按帧率分组
 luminance_mixture_paths = {
@@ -56,9 +60,8 @@ luminance_mixture_paths = {
     ]
 }
 
-# 初始化字典来存储每个 FrondFrameLuminance 值的总计数
-total_counts = {}
-total_occurrences = {}
+# 所有试验的 0→1 变化处的 FrondFrameLuminance 直方图（按帧率分组，结果缓存）
+histograms = transition_histograms(luminance_mixture_paths)
 
 # 创建子图
 fig, axs = plt.subplots(3, 1, figsize=(8, 6))  # 创建3行1列的子图
@@ -69,38 +72,9 @@ colors = ['g', 'b', 'r']
 
 # 对于每个帧率组（'5 fps', '10 fps', '30 fps'）
 for i, (fps_group, file_paths) in enumerate(luminance_mixture_paths.items()):
-    # 初始化每个子图的总计数和发生次数
-    total_counts = {}
-    total_occurrences = {}
-
-    # 遍历每个文件路径以处理和计算每个 FrondFrameLuminance 的平均出现次数
-    for file_path in file_paths:
-        df = pd.read_csv(file_path)
-        vection_response = df['Vection Response']
-        frond_frame_luminance = df['FrondFrameLuminance']
-
-            # Round FrondFrameLuminance to 2 decimal places for comparison
-        frond_frame_luminance_rounded = frond_frame_luminance.round(2)
-        #changes_1_to_0 = (vection_response.diff() == -1)  # 找到从1变为0的地方
-        changes_1_to_0 = (vection_response.diff() == 1)  # 找到从0变为1的地方
-        frond_luminance_changes = frond_frame_luminance_rounded[changes_1_to_0]
-        
-        frond_luminance_counts = Counter(frond_luminance_changes)
-        
-        for frond, count in frond_luminance_counts.items():
-            if frond in total_counts:
-                total_counts[frond] += count
-                total_occurrences[frond] += 1
-            else:
-                total_counts[frond] = count
-                total_occurrences[frond] = 1
+    # 每个 FrondFrameLuminance 值（0.01 刻度）的平均出现次数
+    frond_frame_values, average_count_values = histograms[fps_group]['onset'].average_occurrences()
 
-    average_counts = {frond: total_counts[frond] / total_occurrences[frond] for frond in total_counts}
-    
-    # 准备绘图数据
-    frond_frame_values = list(average_counts.keys())
-    average_count_values = list(average_counts.values())
-    
     # 在对应的子图上绘制柱状图
     axs[i].bar(frond_frame_values, average_count_values, width=0.02, label=f'{fps_group} Frame', color=colors[i])
     axs[i].set_xlabel('Frond Frame Luminance (0-1)')
@@ -1,6 +1,12 @@
-import pandas as pd
+import os
+import sys
+
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from time_grid import group_stats, resample_trials
+from trial_catalog import parse_trial_filename
+
 # File paths for each condition (5 fps, 10 fps, 30 fps)
 luminance_mixture_paths = {
     '5 fps': [
@@ -60,23 +66,16 @@ luminance_mixture_paths = {
     ]
 }
 
-# Function to load CSV files and calculate the average Vection Response for each person
-def calculate_avg_vection_response(file_paths):
-    # Load the CSV files into DataFrames
-    dfs = [pd.read_csv(file_path) for file_path in file_paths]
-    
-    # Extract data for each DataFrame
-    times = [df['Time'] / 1000 for df in dfs]  # Convert time from ms to s
-    vection_responses = [df['Vection Response'] for df in dfs]
-
-    # Time and vection response should be aligned for averaging
-    # Assuming all CSV files have the same time values
-    time = times[0]  # We can use the time from the first dataset
-
-    # Calculate the average Vection Response for each person's three trials
-    avg_vection_response = sum(vection_responses) / len(vection_responses)
-
-    return time, avg_vection_response
+# Resample every trial onto one shared time grid instead of assuming that all
+# CSV files have the same Time values (dropped frames shift the rows otherwise)
+all_paths = [path for paths in luminance_mixture_paths.values() for path in paths]
+resampled = resample_trials(all_paths, ['Vection Response', 'FrondFrameLuminance', 'BackFrameLuminance'])
+time = resampled.seconds  # Convert time from ms to s
+rows = {}
+start = 0
+for fps, paths in luminance_mixture_paths.items():
+    rows[fps] = slice(start, start + len(paths))
+    start += len(paths)
 
 # Create subplots for each frequency condition
 fig, axes = plt.subplots(3, 2, figsize=(12, 15), sharex=True, gridspec_kw={'hspace': 0.3})
@@ -85,12 +84,11 @@ fig, axes = plt.subplots(3, 2, figsize=(12, 15), sharex=True, gridspec_kw={'hspa
 for i, (fps, paths) in enumerate(luminance_mixture_paths.items()):
     # First column: Plot Frond and Back Frame Luminance for this condition
     ax1 = axes[i][0]
-    # Load luminance data for the first trial (to use as an example)
-    df = pd.read_csv(paths[0])
-    time = df['Time'] / 1000
-    frond_frame_luminance = df['FrondFrameLuminance']
-    back_frame_luminance = df['BackFrameLuminance']
-    
+    # Luminance of the first trial (to use as an example)
+    first = rows[fps].start
+    frond_frame_luminance = resampled.values['FrondFrameLuminance'][first]
+    back_frame_luminance = resampled.values['BackFrameLuminance'][first]
+
     ax1.plot(time, frond_frame_luminance, linestyle='-', color='b', label='Frond Frame Luminance', alpha=0.5)
     ax1.plot(time, back_frame_luminance, linestyle='-', color='g', label='Back Frame Luminance', alpha=0.5)
     ax1.set_ylabel('Luminance Value (0-1)')
@@ -98,17 +96,15 @@ for i, (fps, paths) in enumerate(luminance_mixture_paths.items()):
     ax1.legend(loc='upper right')
     ax1.grid()
     ax1.set_xlim([-5, 15])
-    
+
     # Second column: Plot Average Vection Response for this condition
     ax2 = axes[i][1]
-    # Initialize an array to hold the summed vection response
-    summed_vection_response = 0
-    
-    for j in range(0, len(paths), 3):  # Each person has 3 trials
-        person_paths = paths[j:j+3]
-        time, avg_vection_response = calculate_avg_vection_response(person_paths)
-        summed_vection_response += avg_vection_response  # Add the average for this person
-    
+    # Average each person's trials (grouped by participant, so a person with
+    # fewer than 3 trials does not shift the others), then sum over persons
+    participants = [parse_trial_filename(path).participant for path in paths]
+    per_person = group_stats(resampled.values['Vection Response'][rows[fps]], participants)
+    summed_vection_response = per_person.mean.sum(axis=0)
+
     # Plot the summed Vection Response
     ax2.plot(time, summed_vection_response, linestyle='-', color='r', label=f'Summed Vection Response at {fps}')
     ax2.fill_between(time, summed_vection_response, alpha=0.3, color='r')
@@ -1,9 +1,15 @@
-import pandas as pd
+import os
+import sys
+
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from trial_store import read_normalized_trial
+
 # Load the CSV file into a DataFrame
 file_path = 'D:/unity/Vection/Assets/ExperimentData/20241113_155123_luminanceMixture_cameraSpeed4_fps5_G_trialNumber2.csv'  # 请替换为你的实际文件路径
-df = pd.read_csv(file_path)
+# Frond/Back frames with odd BackFrameNum are already swapped when the trial is ingested
+df = read_normalized_trial(file_path)
 
 # Extract data from the DataFrame
 time = df['Time'] / 1000  # 将时间列作为横轴 (秒)，除以1000将ms转换为s
@@ -25,22 +31,12 @@ first_occurrence_time = time[first_occurrence_index]
 # Calculate the time interval from 0 to the first occurrence of 1
 time_to_first_1 = first_occurrence_time
 
-# Extract luminance values based on FrondFrameNum and BackFrameNum
+# Extract luminance values (normalized by FrondFrameNum and BackFrameNum)
 frond_frame_num = df['FrondFrameNum']
 back_frame_num = df['BackFrameNum']
 frond_frame_luminance = df['FrondFrameLuminance']
 back_frame_luminance = df['BackFrameLuminance']
 
-# Replace BackFrameNum odd values with corresponding BackFrameLuminance and FrondFrameNum even values
-for i in range(len(frond_frame_num)):
-    if back_frame_num[i] % 2 != 0:
-        temp_back_frame_num = back_frame_num[i]
-        temp_back_frame_luminance = back_frame_luminance[i]
-        back_frame_num[i] = frond_frame_num[i]
-        back_frame_luminance[i] = frond_frame_luminance[i]
-        frond_frame_num[i] = temp_back_frame_num
-        frond_frame_luminance[i] = temp_back_frame_luminance
-
 # Create the figure and axes for plotting
 fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(8, 5), sharex=True, gridspec_kw={'hspace': 0.3})
 
@@ -3,10 +3,16 @@
 
 # pip install opencv-python
 
+import os
+import sys
+
 import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from frame_spectra import spectra
+
 # 画像の読み込み（グレースケールで）
 image_path1 = "../py/image1.png"  # 1つ目の画像パスを指定
 image_path2 = "../py/image2.png"  # 2つ目の画像パスを指定
@@ -40,19 +46,12 @@ else:
         image1 = cv2.resize(image1, target_shape)
         image2 = cv2.resize(image2, target_shape)
 
-    # フーリエ変換とスペクトル計算
-    def calculate_spectra(image):
-        f_transform = np.fft.fft2(image)
-        f_shift = np.fft.fftshift(f_transform)
-        power_spectrum = 20 * np.log(np.abs(f_shift) + 1)  # パワースペクトル（+1でlog(0)を回避）
-        phase_spectrum = np.angle(f_shift)  # 位相スペクトル
-        rows, cols = image1.shape
-        freq_y = np.fft.fftshift(np.fft.fftfreq(rows))
-        freq_x = np.fft.fftshift(np.fft.fftfreq(cols))
-        return power_spectrum, phase_spectrum, freq_y, freq_x
-
-    power1, phase1, freq_y1, freq_x1 = calculate_spectra(image1)
-    power2, phase2, freq_y2, freq_x2 = calculate_spectra(image2)
+    # フーリエ変換とスペクトル計算（2枚まとめて rfft2 で変換）
+    # パワースペクトル 20·log(|F|+1)（+1でlog(0)を回避）と位相スペクトル
+    (power1, power2), (phase1, phase2) = spectra(np.stack([image1, image2]))
+    rows, cols = image1.shape
+    freq_y1 = freq_y2 = np.fft.fftshift(np.fft.fftfreq(rows))
+    freq_x1 = freq_x2 = np.fft.fftshift(np.fft.fftfreq(cols))
 
     # 差分計算
     power_diff = power1 - power2
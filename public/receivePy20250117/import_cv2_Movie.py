@@ -3,10 +3,16 @@
 
 # pip install opencv-python
 
+import os
+import sys
+
 import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from frame_spectra import consecutive_phase_stats, iter_gray_frames, read_gray_frames, spectra
+
 # # 画像の読み込み（グレースケールで）
 # image_path1 = "fig1.png"  # 1つ目の画像パスを指定
 # image_path2 = "fig2.png"  # 2つ目の画像パスを指定
@@ -21,31 +27,25 @@ import matplotlib.pyplot as plt
 video_path = "LR_Continuous - Trim.mp4"  # 動画ファイルのパス
 n_frame = 3  # 抽出するフレーム間隔
 
-# 動画の読み込み
-cap = cv2.VideoCapture(video_path)
+# 比較する 0 ～ nフレーム目だけを読み込む
+try:
+    frames = read_gray_frames(video_path, count=n_frame + 1)
+except RuntimeError as e:
+    print(f"{e}。パスを確認してください。")
+    exit()
+if len(frames) <= n_frame:
+    print(f"{n_frame} フレーム目が取得できません。")
+    exit()
 
-if not cap.isOpened():
-    print("動画が読み込めません。パスを確認してください。")
-else:
-    # 最初のフレームを取得
-    ret, frame1 = cap.read()
-    if not ret:
-        print("最初のフレームが取得できません。")
-        cap.release()
-        exit()
-    image1 = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
+# 連続するフレームの全組について位相差を評価（動画は何枚かずつ読みながら変換し、全体は持たない）
+fractions = consecutive_phase_stats(iter_gray_frames(video_path))
+for i, fraction in enumerate(fractions):
+    print(f"フレーム {i} → {i + 1}: |Δφ| > π/2 の成分 {fraction * 100:.1f}%")
+print(f"全 {len(fractions)} 組の平均: {fractions.mean() * 100:.1f}%（最大 {fractions.max() * 100:.1f}%）")
 
-    # nフレーム目を取得
-    cap.set(cv2.CAP_PROP_POS_FRAMES, n_frame)
-    ret, frame2 = cap.read()
-    if not ret:
-        print(f"{n_frame} フレーム目が取得できません。")
-        cap.release()
-        exit()
-    image2 = cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY)
-
-    # 動画リソースを解放
-    cap.release()
+# 最初のフレームと nフレーム目を比較する
+image1 = frames[0]
+image2 = frames[n_frame]
 
 
 
@@ -74,16 +74,8 @@ else:
         image1 = cv2.resize(image1, target_shape)
         image2 = cv2.resize(image2, target_shape)
 
-    # フーリエ変換とスペクトル計算
-    def calculate_spectra(image):
-        f_transform = np.fft.fft2(image)
-        f_shift = np.fft.fftshift(f_transform)
-        power_spectrum = 20 * np.log(np.abs(f_shift) + 1)  # パワースペクトル（+1でlog(0)を回避）
-        phase_spectrum = np.angle(f_shift)  # 位相スペクトル
-        return power_spectrum, phase_spectrum
-
-    power1, phase1 = calculate_spectra(image1)
-    power2, phase2 = calculate_spectra(image2)
+    # フーリエ変換とスペクトル計算（比較する2枚をまとめて計算）
+    (power1, power2), (phase1, phase2) = spectra(np.stack([image1, image2]))
 
     # 差分計算
     power_diff = np.abs(power1 - power2)
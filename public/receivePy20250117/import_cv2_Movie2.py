@@ -1,11 +1,16 @@
 # Masahiro Furukawa with ChatGPT
 # Dec 10, 2024
 
-import cv2
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.widgets import Slider
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from frame_provider import FrameProvider
+
 # 動画パス
 video_path = "LR_Continuous - Trim.mp4"  # 動画ファイルのパス
 # video_path = "LR_LuminanceMixing - Trim.mp4"  # 動画ファイルのパス
@@ -13,39 +18,28 @@ video_path = "LR_Continuous - Trim.mp4"  # 動画ファイルのパス
 # サンプリング縮小率
 resize_scale = 1.0  # 画像を50%に縮小
 
-# 動画の読み込み
-cap = cv2.VideoCapture(video_path)
-
-if not cap.isOpened():
+# 動画の読み込み（開いたまま保持し、デコード済みフレームとスペクトルをキャッシュ・先読みする）
+try:
+    provider = FrameProvider(video_path, resize_scale=resize_scale)
+except RuntimeError:
     print("動画が読み込めません。パスを確認してください。")
     exit()
 
 # 最初のフレームを取得
 CAP_PROP_INITIAL_FRAME_NUMBER = 90
-cap.set(cv2.CAP_PROP_POS_FRAMES, CAP_PROP_INITIAL_FRAME_NUMBER)
-ret, first_frame = cap.read()
-if not ret:
+first = provider.get(CAP_PROP_INITIAL_FRAME_NUMBER)
+if first is None:
     print("最初のフレームが取得できません。")
-    cap.release()
+    provider.close()
     exit()
 
-first_frame_gray = cv2.cvtColor(first_frame, cv2.COLOR_BGR2GRAY)
-first_frame_gray = cv2.resize(first_frame_gray, (0, 0), fx=resize_scale, fy=resize_scale)
+first_frame_gray = first.gray
 
 # 総フレーム数の取得
-total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-cap.release()
+total_frames = provider.total_frames
 
-# フーリエ変換とスペクトル計算
-def calculate_spectra(image):
-    f_transform = np.fft.fft2(image)
-    f_shift = np.fft.fftshift(f_transform)
-    power_spectrum = 20 * np.log(np.abs(f_shift) + 1)  # パワースペクトル（+1でlog(0)を回避）
-    phase_spectrum = np.angle(f_shift)  # 位相スペクトル
-    return power_spectrum, phase_spectrum
-
-# 最初のフレームに関する計算を事前に実行
-power1, phase1 = calculate_spectra(first_frame_gray)
+# 最初のフレームに関する計算を事前に実行（スペクトルは provider が計算済み）
+power1, phase1 = first.power, first.phase
 
 # プロットの準備
 fig, axes = plt.subplots(3, 3, figsize=(15, 9))
@@ -53,22 +47,17 @@ plt.subplots_adjust(bottom=0.2)
 
 # 初期プロットを表示
 def update_plot(n_frame):
-    cap = cv2.VideoCapture(video_path)
-    cap.set(cv2.CAP_PROP_POS_FRAMES, n_frame)
-    ret, current_frame = cap.read()
-    cap.release()
+    current = provider.get(n_frame)
 
-    if not ret:
+    if current is None:
         for ax in axes.flatten():
             ax.clear()
         axes[0, 0].text(0.5, 0.5, "フレームが取得できません。", fontsize=16, ha='center', va='center')
         plt.draw()
         return
 
-    current_frame_gray = cv2.cvtColor(current_frame, cv2.COLOR_BGR2GRAY)
-    current_frame_gray = cv2.resize(current_frame_gray, (0, 0), fx=resize_scale, fy=resize_scale)
-
-    power2, phase2 = calculate_spectra(current_frame_gray)
+    current_frame_gray = current.gray
+    power2, phase2 = current.power, current.phase
 
     power_diff = np.abs(power1 - power2)
     phase_diff = phase1 - phase2
@@ -133,3 +122,4 @@ update_plot(CAP_PROP_INITIAL_FRAME_NUMBER+10)
 
 # インタラクティブ表示
 plt.show()
+provider.close()
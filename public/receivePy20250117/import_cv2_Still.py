@@ -3,10 +3,16 @@
 
 # pip install opencv-python
 
+import os
+import sys
+
 import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from frame_spectra import spectra
+
 # 画像の読み込み（グレースケールで）
 image_path1 = "fig1.png"  # 1つ目の画像パスを指定
 image_path2 = "fig2.png"  # 2つ目の画像パスを指定
@@ -39,16 +45,9 @@ else:
         image1 = cv2.resize(image1, target_shape)
         image2 = cv2.resize(image2, target_shape)
 
-    # フーリエ変換とスペクトル計算
-    def calculate_spectra(image):
-        f_transform = np.fft.fft2(image)
-        f_shift = np.fft.fftshift(f_transform)
-        power_spectrum = 20 * np.log(np.abs(f_shift) + 1)  # パワースペクトル（+1でlog(0)を回避）
-        phase_spectrum = np.angle(f_shift)  # 位相スペクトル
-        return power_spectrum, phase_spectrum
-
-    power1, phase1 = calculate_spectra(image1)
-    power2, phase2 = calculate_spectra(image2)
+    # フーリエ変換とスペクトル計算（2枚まとめて rfft2 で変換）
+    # パワースペクトル 20·log(|F|+1)（+1でlog(0)を回避）と位相スペクトル
+    (power1, power2), (phase1, phase2) = spectra(np.stack([image1, image2]))
 
     # 差分計算
     power_diff = np.abs(power1 - power2)
@@ -0,0 +1,227 @@
+"""
+ブートストラップ信頼区間と並べ替え検定
+
+被験者ごとの試行数が少ないため、t 検定や分散分析だけでなく、リサンプリングで
+信頼区間と p 値を求める。すべての関数は (試行数, パラメータ数) の行列をまとめて扱い、
+リサンプルの乱数・インデックスは展開する要素数が _MAX_BATCH_ELEMENTS を超えない
+まとまりごとに作り、統計量は axis 指定の reduction でまとめて計算する。
+
+- strata（被験者など）を渡すと、ブートストラップは層の中で復元抽出し、
+  並べ替え検定は層の中だけでラベルを入れ替える
+- 対応のある比較は符号反転の並べ替え検定（組の数が少なければ全通りを列挙）
+
+    params, meta = extract_trial_parameters(find_trials(data_dir, pattern="Phase"))
+    table = compare_conditions(params, meta, 'blend_mode', 'Dynamic', 'LinearOnly')
+"""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_RESAMPLES = 100_000
+DEFAULT_CONFIDENCE = 0.95
+# 一度に展開する要素数の上限（リサンプル数 × 試行数 × パラメータ数）
+_MAX_BATCH_ELEMENTS = 1 << 24
+
+
+def _as_matrix(values):
+    values = np.asarray(values, dtype=float)
+    return values[:, np.newaxis] if values.ndim == 1 else values
+
+
+def _codes(labels, n):
+    if labels is None:
+        return np.zeros(n, dtype=np.int64)
+    return pd.factorize(pd.Series(list(labels)))[0]
+
+
+def _batches(n_resamples, width):
+    size = max(1, _MAX_BATCH_ELEMENTS // max(width, 1))
+    for start in range(0, n_resamples, size):
+        yield slice(start, min(start + size, n_resamples))
+
+
+def stratified_bootstrap_indices(cells, n_resamples, rng):
+    """各観測をその層の中から復元抽出したインデックス (n_resamples, n) を返す
+
+    列の並びは層ごとにまとめた順（戻り値の2番目）で、列 j は層 cells[order[j]] の
+    メンバーから一様に選ばれる。
+    """
+    cells = np.asarray(cells)
+    order = np.argsort(cells, kind='stable')
+    sorted_cells = cells[order]
+    _, starts, cell_pos, sizes = np.unique(sorted_cells, return_index=True,
+                                           return_inverse=True, return_counts=True)
+
+    u = rng.random((n_resamples, len(cells)))
+    draws = starts[cell_pos] + (u * sizes[cell_pos]).astype(np.int64)
+    return order[draws], order
+
+
+def _percentile_interval(samples, confidence):
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(samples, [alpha, 1 - alpha], axis=0)
+    return low, high
+
+
+def bootstrap_ci(values, strata=None, statistic=np.mean, n_resamples=DEFAULT_RESAMPLES,
+                 confidence=DEFAULT_CONFIDENCE, seed=None):
+    """各列の統計量とそのパーセンタイル信頼区間を (estimate, low, high) で返す"""
+    values = _as_matrix(values)
+    rng = np.random.default_rng(seed)
+
+    cells = _codes(strata, len(values))
+
+    samples = np.empty((n_resamples, values.shape[1]))
+    for batch in _batches(n_resamples, values.size):
+        indices, _ = stratified_bootstrap_indices(cells, batch.stop - batch.start, rng)
+        samples[batch] = statistic(values[indices], axis=1)
+    low, high = _percentile_interval(samples, confidence)
+    return statistic(values, axis=0), low, high
+
+
+def bootstrap_difference(values_a, values_b, strata_a=None, strata_b=None, statistic=np.mean,
+                         n_resamples=DEFAULT_RESAMPLES, confidence=DEFAULT_CONFIDENCE, seed=None):
+    """statistic(a) - statistic(b) とその信頼区間を列ごとに返す
+
+    2群それぞれを（層があれば層の中で）独立に復元抽出する。
+    """
+    values_a = _as_matrix(values_a)
+    values_b = _as_matrix(values_b)
+    rng = np.random.default_rng(seed)
+    cells_a = _codes(strata_a, len(values_a))
+    cells_b = _codes(strata_b, len(values_b))
+
+    samples = np.empty((n_resamples, values_a.shape[1]))
+    width = values_a.size + values_b.size
+    for batch in _batches(n_resamples, width):
+        size = batch.stop - batch.start
+        idx_a, _ = stratified_bootstrap_indices(cells_a, size, rng)
+        idx_b, _ = stratified_bootstrap_indices(cells_b, size, rng)
+        samples[batch] = (statistic(values_a[idx_a], axis=1)
+                          - statistic(values_b[idx_b], axis=1))
+    low, high = _percentile_interval(samples, confidence)
+    observed = statistic(values_a, axis=0) - statistic(values_b, axis=0)
+    return observed, low, high
+
+
+def _p_value(null, observed):
+    """両側 p 値（観測値自身を含める (count + 1) / (n + 1)）"""
+    tolerance = 1e-12 * np.maximum(1.0, np.abs(observed))
+    extreme = np.abs(null) >= np.abs(observed) - tolerance
+    return (extreme.sum(axis=0) + 1) / (len(null) + 1)
+
+
+def permutation_test(values_a, values_b, strata_a=None, strata_b=None, statistic=np.mean,
+                     n_resamples=DEFAULT_RESAMPLES, seed=None):
+    """対応のない2群の並べ替え検定。列ごとの (observed, p_value) を返す
+
+    検定統計量は statistic(a) - statistic(b)（std を渡せばばらつきの差）。
+    層を渡すと、ラベルは同じ層の観測の間でだけ入れ替える。
+    """
+    values_a = _as_matrix(values_a)
+    values_b = _as_matrix(values_b)
+    pooled = np.vstack([values_a, values_b])
+    is_a = np.r_[np.ones(len(values_a), bool), np.zeros(len(values_b), bool)]
+    if strata_a is None and strata_b is None:
+        cells = np.zeros(len(pooled), dtype=np.int64)
+    else:
+        cells = _codes(list(strata_a) + list(strata_b), len(pooled))
+
+    # 層ごとにまとめて並べ、層番号 + 一様乱数 のキーでソートすると層の中だけの置換になる
+    order = np.argsort(cells, kind='stable')
+    pooled = pooled[order]
+    is_a = is_a[order]
+    sorted_cells = cells[order].astype(float)
+    pos_a = np.flatnonzero(is_a)
+    pos_b = np.flatnonzero(~is_a)
+
+    rng = np.random.default_rng(seed)
+    null = np.empty((n_resamples, pooled.shape[1]))
+    for batch in _batches(n_resamples, pooled.size):
+        keys = sorted_cells + rng.random((batch.stop - batch.start, len(pooled)))
+        shuffled = pooled[np.argsort(keys, axis=1)]
+        null[batch] = (statistic(shuffled[:, pos_a], axis=1)
+                       - statistic(shuffled[:, pos_b], axis=1))
+    observed = statistic(pooled[pos_a], axis=0) - statistic(pooled[pos_b], axis=0)
+    return observed, _p_value(null, observed)
+
+
+def paired_permutation_test(differences, statistic=np.mean, n_resamples=DEFAULT_RESAMPLES,
+                            seed=None):
+    """対応のある差（組ごとの a - b）の符号反転検定。列ごとの (observed, p_value) を返す
+
+    組の数が少なく 2^n 通りが n_resamples 以下なら、全通りを列挙して正確な p 値を求める。
+    """
+    differences = _as_matrix(differences)
+    n = len(differences)
+    if 2 ** n <= n_resamples:
+        signs = np.array(list(itertools.product((1.0, -1.0), repeat=n)))
+        observed = statistic(differences, axis=0)
+        null = np.empty((len(signs), differences.shape[1]))
+        for batch in _batches(len(signs), differences.size):
+            null[batch] = statistic(signs[batch, :, np.newaxis] * differences, axis=1)
+        # 全通りには観測値自身（符号反転なし）が含まれる
+        return observed, (np.abs(null) >= np.abs(observed) - 1e-12).mean(axis=0)
+
+    rng = np.random.default_rng(seed)
+    null = np.empty((n_resamples, differences.shape[1]))
+    for batch in _batches(n_resamples, differences.size):
+        signs = rng.choice((-1.0, 1.0), size=(batch.stop - batch.start, n))
+        null[batch] = statistic(signs[:, :, np.newaxis] * differences, axis=1)
+    observed = statistic(differences, axis=0)
+    return observed, _p_value(null, observed)
+
+
+def compare_conditions(params, meta, condition, level_a, level_b, names=None, strata='participant',
+                       statistic=np.mean, n_resamples=DEFAULT_RESAMPLES,
+                       confidence=DEFAULT_CONFIDENCE, seed=None):
+    """パラメータ行列の全列について2条件を比較した表を返す
+
+    params は (試行数, k)、meta は同じ行順の DataFrame（extract_trial_parameters の戻り値）。
+    各列について、条件ごとの統計量、差とその層別ブートストラップ信頼区間、
+    層内での並べ替え検定の p 値、層ごとに集約した値の符号反転検定の p 値をまとめる。
+    """
+    params = _as_matrix(params)
+    meta = meta.reset_index(drop=True)
+    if names is None:
+        names = [f'p{i}' for i in range(params.shape[1])]
+
+    in_a = (meta[condition] == level_a).to_numpy()
+    in_b = (meta[condition] == level_b).to_numpy()
+    strata_a = meta.loc[in_a, strata].tolist() if strata else None
+    strata_b = meta.loc[in_b, strata].tolist() if strata else None
+
+    diff, low, high = bootstrap_difference(params[in_a], params[in_b], strata_a, strata_b,
+                                           statistic, n_resamples, confidence, seed)
+    _, p_perm = permutation_test(params[in_a], params[in_b], strata_a, strata_b,
+                                 statistic, n_resamples, seed)
+
+    table = pd.DataFrame({
+        'parameter': names,
+        level_a: statistic(params[in_a], axis=0),
+        level_b: statistic(params[in_b], axis=0),
+        'difference': diff,
+        'ci_low': low,
+        'ci_high': high,
+        'p_permutation': p_perm,
+    })
+
+    if strata:
+        # 層（被験者）ごとに統計量をとり、両条件がそろった層で対応のある検定をする
+        frame = pd.DataFrame(params, columns=names)
+        frame['_stratum'] = meta[strata]
+        frame['_condition'] = meta[condition]
+        per_stratum = {
+            level: frame[frame['_condition'] == level].groupby('_stratum', sort=False)[list(names)]
+                                                     .agg(lambda s: statistic(s.to_numpy()))
+            for level in (level_a, level_b)
+        }
+        common = per_stratum[level_a].index.intersection(per_stratum[level_b].index)
+        if len(common) > 1:
+            paired = (per_stratum[level_a].loc[common].to_numpy()
+                      - per_stratum[level_b].loc[common].to_numpy())
+            _, p_paired = paired_permutation_test(paired, np.mean, n_resamples, seed)
+            table['p_paired'] = p_paired
+    return table
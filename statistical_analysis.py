@@ -4,24 +4,59 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy import stats
 from scipy.stats import levene, f_oneway, shapiro, kruskal
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+from analysis_cache import AnalysisCache, trial_final_function_ratio
+from figure_renderer import FigureJob, render_figures
+from resampling import bootstrap_ci, bootstrap_difference, permutation_test
+from trial_catalog import find_trials
+from velocity_parameters import trial_velocity_parameters
+
 # Font settings for English text
 plt.rcParams['font.family'] = 'Arial'
 plt.rcParams['axes.unicode_minus'] = False
 
-def perform_statistical_analysis():
-    """Perform statistical analysis"""
+EXP2_DATA_DIR = "public/BrightnessFunctionMixAndPhaseData"
+STATISTICAL_OUTPUTS = ('advanced_statistical_analysis.png', 'statistical_analysis_report.md')
+
+def collect_exp2_data(data_dir=EXP2_DATA_DIR, cache=None):
+    """Build exp2_data from the trial files (final FunctionRatio and Dynamic Phase V0)
+    
+    Per-trial values are reused from the analysis cache for files that have not changed.
+    Returns (exp2_data, input_paths).
+    """
+    cache = cache if cache is not None else AnalysisCache("experiment2")
+    
+    exp2_data = {}
+    input_paths = []
+    for record in find_trials(data_dir, pattern="FunctionMix"):
+        ratio = cache.trial_result(record.path, 'final_function_ratio', trial_final_function_ratio)
+        exp2_data.setdefault(record.participant, {'ratio': [], 'v0': []})['ratio'].append(ratio)
+        input_paths.append(record.path)
+    
+    for record in find_trials(data_dir, pattern="Phase", blend_mode="Dynamic"):
+        params = cache.trial_result(record.path, 'velocity_parameters', trial_velocity_parameters)
+        exp2_data.setdefault(record.participant, {'ratio': [], 'v0': []})['v0'].append(params['V0'])
+        input_paths.append(record.path)
+    
+    print(cache.summary())
+    cache.save()
+    return exp2_data, input_paths
+
+def perform_statistical_analysis(exp2_data=None):
+    """Perform statistical analysis (exp2_data defaults to the summary values below)"""
     
     # Experiment 2 data
-    exp2_data = {
-        'ONO': {'ratio': [0.517, 0.713, 0.581, 0.583, 0.684, 1.000], 'v0': [1.410, 1.288, 1.028]},
-        'LL': {'ratio': [0.231, 0.492, 0.178, 0.000, 0.205, 0.471], 'v0': [1.100, 1.116, 0.914]},
-        'HOU': {'ratio': [0.163, 0.206, 0.555, 0.336, 0.295, 0.712], 'v0': [1.076, 1.000, 1.006]},
-        'OMU': {'ratio': [0.817, 0.651, 0.551, 0.840, 0.582, 0.841], 'v0': [0.992, 1.118, 1.024]},
-        'YAMA': {'ratio': [0.683, 0.616, 0.785, 0.583, 0.613, 0.581], 'v0': [0.944, 1.026, 1.044]}
-    }
+    if exp2_data is None:
+        exp2_data = {
+            'ONO': {'ratio': [0.517, 0.713, 0.581, 0.583, 0.684, 1.000], 'v0': [1.410, 1.288, 1.028]},
+            'LL': {'ratio': [0.231, 0.492, 0.178, 0.000, 0.205, 0.471], 'v0': [1.100, 1.116, 0.914]},
+            'HOU': {'ratio': [0.163, 0.206, 0.555, 0.336, 0.295, 0.712], 'v0': [1.076, 1.000, 1.006]},
+            'OMU': {'ratio': [0.817, 0.651, 0.551, 0.840, 0.582, 0.841], 'v0': [0.992, 1.118, 1.024]},
+            'YAMA': {'ratio': [0.683, 0.616, 0.785, 0.583, 0.613, 0.581], 'v0': [0.944, 1.026, 1.044]}
+        }
     
     # Experiment 1 data
     exp1_data = {
@@ -87,6 +122,10 @@ def perform_statistical_analysis():
         std_v0 = np.std(exp2_data[p]['v0'])
         print(f"{p}: Mean = {mean_v0:.3f} ± {std_v0:.3f}")
     
+    # Bootstrap CI of the overall mean, resampling trials within each participant
+    mean_v0, low, high = bootstrap_ci(v0_values, strata=v0_participants, seed=0)
+    print(f"\nOverall mean V0 = {mean_v0[0]:.3f}, 95% bootstrap CI (stratified by participant): [{low[0]:.3f}, {high[0]:.3f}]")
+    
     print("\n" + "="*50 + "\n")
     
     # 3. Correlation analysis
@@ -167,6 +206,12 @@ def perform_statistical_analysis():
     stat, p_value = stats.mannwhitneyu(exp1_v0s, exp2_v0s, alternative='two-sided')
     print(f"Mann-Whitney U test - U-statistic: {stat:.4f}, p-value: {p_value:.4f}")
     
+    # Resampling: bootstrap CI of the mean difference and a permutation test
+    diff, low, high = bootstrap_difference(exp2_v0s, exp1_v0s, seed=0)
+    _, p_value = permutation_test(exp2_v0s, exp1_v0s, seed=0)
+    print(f"Mean difference (Exp2 - Exp1): {diff[0]:.3f}, 95% bootstrap CI: [{low[0]:.3f}, {high[0]:.3f}]")
+    print(f"Permutation test (100,000 resamples) - p-value: {p_value[0]:.4f}")
+    
     print(f"\nExperiment 1 mean V0 value: {np.mean(exp1_v0s):.3f} ± {np.std(exp1_v0s):.3f}")
     print(f"Experiment 2 mean V0 value: {np.mean(exp2_v0s):.3f} ± {np.std(exp2_v0s):.3f}")
     
@@ -201,8 +246,8 @@ def perform_statistical_analysis():
     
     return exp2_data, exp1_data
 
-def create_advanced_visualizations(exp2_data, exp1_data):
-    """Create advanced visualization charts"""
+def plot_advanced_figure(exp2_data, exp1_data):
+    """Draw the advanced statistical analysis figure and return it"""
     
     fig, axes = plt.subplots(2, 3, figsize=(18, 12))
     fig.suptitle('Experiment 2 Advanced Statistical Analysis', fontsize=16, fontweight='bold')
@@ -327,7 +372,21 @@ def create_advanced_visualizations(exp2_data, exp1_data):
     ax6.grid(True, alpha=0.3)
     
     plt.tight_layout()
-    plt.savefig('advanced_statistical_analysis.png', dpi=300, bbox_inches='tight')
+    return fig
+
+def create_advanced_visualizations(exp2_data, exp1_data, render_jobs=None):
+    """Create advanced visualization charts
+    
+    If render_jobs is a list, a FigureJob is appended instead of drawing here
+    (main renders the queue with figure_renderer.render_figures).
+    """
+    if render_jobs is not None:
+        render_jobs.append(FigureJob(plot_advanced_figure, (exp2_data, exp1_data),
+                                     outputs=('advanced_statistical_analysis.png',)))
+        return render_jobs
+    
+    fig = plot_advanced_figure(exp2_data, exp1_data)
+    fig.savefig('advanced_statistical_analysis.png', dpi=300, bbox_inches='tight')
     plt.show()
     
     return fig
@@ -411,13 +470,27 @@ def generate_statistical_report(exp2_data, exp1_data):
     print("Statistical report saved to 'statistical_analysis_report.md'")
 
 if __name__ == "__main__":
-    # Perform statistical analysis
-    exp2_data, exp1_data = perform_statistical_analysis()
+    # --incremental: skip the analysis, figure and report when no input trial has changed
+    cache = AnalysisCache("experiment2")
+    incremental = '--incremental' in sys.argv
     
-    # Create visualizations
-    create_advanced_visualizations(exp2_data, exp1_data)
+    # Experiment 2 values from the trial files (per-trial results are cached)
+    exp2_data, input_paths = collect_exp2_data(cache=cache)
     
-    # Generate report
-    generate_statistical_report(exp2_data, exp1_data)
+    if incremental and cache.is_current('statistical_outputs', input_paths, STATISTICAL_OUTPUTS):
+        print("Input trials unchanged; skipping the statistical analysis, figure and report.")
+    else:
+        # Perform statistical analysis
+        exp2_data, exp1_data = perform_statistical_analysis(exp2_data)
+        
+        # Create visualizations (rendered through figure_renderer, like experiment2_analysis)
+        render_figures(create_advanced_visualizations(exp2_data, exp1_data, render_jobs=[]))
+        
+        # Generate report
+        generate_statistical_report(exp2_data, exp1_data)
+        
+        if incremental:
+            cache.mark_current('statistical_outputs', input_paths)
+            cache.save()
     
     print("\nAnalysis completed!") 
\ No newline at end of file
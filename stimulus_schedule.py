@@ -0,0 +1,97 @@
+"""
+脈動刺激のフレームごとのスケジュールと縞テクスチャのキャッシュ
+
+PsychoPy の実験ループは、フレームごとに np.sin / np.cos で三角波の速度と合成比率を
+計算し、位相を足し込んでいた。ここでは試行の前に、リフレッシュレートの刻みで全フレーム分の
+速度・合成比率の波形・位相を配列にしておき、ループでは経過時間からフレーム番号を求めて
+配列を引くだけにする。
+
+- フレーム k の時刻は k / refresh_rate。位相は速度をフレーム周期で積算した値（mod 1）なので、
+  フレームが落ちても経過時間に対応する位相が表示される
+- 合成比率はキー操作で変わる振幅 mix_amp との積なので、振幅 1 の波形 blend_shape だけを持つ
+- 縞テクスチャは (空間周波数, 位相オフセット, 大きさ) をキーに .npy としてディスクに保存し、
+  同じプロセス内ではメモリからも返す
+
+    schedule = compile_pulsation_schedule(20, 60.0, speed_top=0.2, speed_amp=0.2, triangle_freq=0.2)
+    k = schedule.frame_index(t)
+    top_image.phase = schedule.top_phase[k]
+    blend_ratio = mix_amp * schedule.blend_shape[k]
+
+    texture = grating_texture(3, -np.pi / 4)
+"""
+
+import os
+from typing import NamedTuple
+
+import numpy as np
+
+DEFAULT_TEXTURE_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".stimulus_cache")
+TEXTURE_SIZE = 256
+TEXTURE_DTYPE = np.float32
+# 予定より長く続いたときのための余裕（秒）
+SCHEDULE_MARGIN = 1.0
+
+_textures = {}
+
+
+class StimulusSchedule(NamedTuple):
+    """フレーム k ごとの刺激の値（時刻 time[k] = k / refresh_rate 秒）"""
+    refresh_rate: float
+    time: np.ndarray
+    tri_speed: np.ndarray     # 下の画像（乙）の速度
+    blend_shape: np.ndarray   # 振幅 1 の合成比率（mix_amp を掛けて使う）
+    top_phase: np.ndarray     # 上の画像（甲）の位相
+    bottom_phase: np.ndarray  # 下の画像（乙）の位相
+
+    def frame_index(self, elapsed):
+        """経過時間（秒）に対応するフレーム番号（スケジュールの終わりで止まる）"""
+        return min(max(int(round(elapsed * self.refresh_rate)), 0), len(self.time) - 1)
+
+
+def compile_pulsation_schedule(duration, refresh_rate, speed_top, speed_amp, triangle_freq,
+                               speed_offset=0.5, margin=SCHEDULE_MARGIN):
+    """定速の上の画像と、三角波で脈動する下の画像のスケジュールを作る
+
+    速度は speed_amp·sin(2π·f·t) + speed_offset、合成比率の波形は (cos(2π·f·t) + 1) / 2。
+    フレーム k で表示する位相は、フレーム 0..k の速度 × フレーム周期の合計。
+    """
+    refresh_rate = float(refresh_rate)
+    n_frames = int(np.ceil((duration + margin) * refresh_rate)) + 1
+    time = np.arange(n_frames) / refresh_rate
+    angle = 2 * np.pi * triangle_freq * time
+    tri_speed = speed_amp * np.sin(angle) + speed_offset
+    blend_shape = (np.cos(angle) + 1) * 0.5
+    period = 1.0 / refresh_rate
+    top_phase = np.mod(speed_top * period * np.arange(1, n_frames + 1), 1.0)
+    bottom_phase = np.mod(np.cumsum(tri_speed * period), 1.0)
+    return StimulusSchedule(refresh_rate, time, tri_speed, blend_shape, top_phase, bottom_phase)
+
+
+def _texture_path(cache_dir, spatial_freq, phase_offset, size):
+    return os.path.join(cache_dir, f"grating_f{spatial_freq!r}_p{phase_offset!r}_{size}.npy")
+
+
+def grating_texture(spatial_freq, phase_offset=0.0, size=TEXTURE_SIZE, cache_dir=DEFAULT_TEXTURE_CACHE):
+    """sin((x + phase_offset)·spatial_freq) の縞を size × size に並べたテクスチャ（x は [-π, π]）"""
+    key = (float(spatial_freq), float(phase_offset), int(size))
+    texture = _textures.get(key)
+    if texture is not None:
+        return texture
+
+    path = _texture_path(cache_dir, *key) if cache_dir else None
+    if path and os.path.exists(path):
+        try:
+            texture = np.load(path)
+        except (OSError, ValueError) as e:
+            print(f"テクスチャのキャッシュを読み込めません（作り直します）: {path} - {e}")
+    if texture is None or texture.shape != (size, size):
+        x = np.linspace(-np.pi, np.pi, size)
+        row = np.sin((x + phase_offset) * spatial_freq).astype(TEXTURE_DTYPE)
+        texture = np.tile(row, (size, 1))
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = path + ".tmp.npy"
+            np.save(tmp_path, texture)
+            os.replace(tmp_path, path)
+    _textures[key] = texture
+    return texture
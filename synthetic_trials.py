@@ -0,0 +1,443 @@
+"""
+合成の試行データ
+
+実データ（public/BrightnessData, public/BrightnessFunctionMixAndPhaseData）と同じ列・
+同じ書式・同じファイル名の形式で、FunctionMix / Phase の1フレーム1行の試行CSVを作る。
+参加者数・試行数・試行の長さを変えて、解析スクリプトの処理時間の伸びや、参加者が
+数百人になったときに動くかどうかを確かめるためのもので、実験結果の代わりにはならない。
+
+実データに合わせてあること:
+
+- 1行 = 1描画フレーム（60Hz）。Time はミリ秒で、float32 で 1000/60 を積算した値
+  （長い試行では 33316.670 のように丸め誤差が出る）
+- FrondFrameNum = floor(Time·Fps) + 1、BackFrameNum = その次のフレームで、
+  輝度はその1秒の中の位置から BrightnessBlendMode の混合関数で作る
+  （Dynamic / FunctionMix は FunctionRatio で線形とコサインを混ぜる）
+- ノブは 0.001 刻み。目標値へ何回かに分けて回し（行き過ぎて戻すこともある）、
+  止めている間も ±数刻みの揺れがある
+- StepNumber 0 は Velocity = 2·Knob、1〜4 は Amplitude に A = 3·Knob - 1 / φ = 2π·Knob を
+  記録し、Velocity には現在のパラメータの v(t) を記録する
+- FunctionMix は FunctionRatio = 2·Knob
+- 参加者ごとに好み（FunctionRatio, v(t) の目標値）と操作の癖（調整の回数・行き過ぎ・
+  揺れ・速さ）が違い、試行ごとにそのまわりでばらつく
+- 練習試行（ファイル名の末尾が _Test）も作れる
+
+参加者ごとに SeedSequence から乱数を分けるので、同じ seed からは、参加者数や
+ワーカー数によらず同じファイルができる（参加者 i のファイルは参加者数を増やしても同じ）。
+
+    paths = generate_dataset("bench/public/BrightnessFunctionMixAndPhaseData", participants=20)
+    generate_public_tree("bench/public", participants=500, max_workers=8)
+
+使い方:
+    python synthetic_trials.py bench/public --participants 500 --seed 0
+    python synthetic_trials.py bench/public/BrightnessData --participants 50 --blend-modes LinearOnly,CosineOnly,AcosOnly
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+from velocity_curves import curve_basis, phase_coefficients
+
+GENERATOR_VERSION = 2
+
+COLUMNS = ["FrondFrameNum", "FrondFrameLuminance", "BackFrameNum", "BackFrameLuminance",
+           "Time", "Knob", "ResponsePattern", "StepNumber", "Amplitude", "Velocity",
+           "FunctionRatio", "CameraSpeed"]
+BLEND_MODES = ("LinearOnly", "CosineOnly", "AcosOnly", "Dynamic")
+# public 以下のディレクトリと、そこに作る Phase の BrightnessBlendMode（実データと同じ構成）
+DATASET_LAYOUT = {
+    "BrightnessFunctionMixAndPhaseData": ("LinearOnly", "Dynamic"),
+    "BrightnessData": ("LinearOnly", "CosineOnly", "AcosOnly"),
+}
+FRAME_RATE = 60
+KNOB_RESOLUTION = 0.001
+FUNCTION_MIX_TRIALS = 6
+PHASE_TRIALS = 3
+# 1試行（Phase は1ステップ）の長さ（秒）の範囲。実データの範囲に合わせてある
+FUNCTION_MIX_DURATION = (20.0, 130.0)
+VELOCITY_STEP_DURATION = (40.0, 66.0)
+PARAMETER_STEP_DURATION = (5.0, 58.0)
+# 練習試行の長さの倍率
+PRACTICE_DURATION_SCALE = 0.3
+START_TIME = datetime.datetime(2025, 8, 1, 9, 0, 0)
+# 1つのワーカーにまとめて渡す参加者数
+PARTICIPANTS_PER_TASK = 4
+
+# 列ごとの書式（実データと同じ。Knob / Amplitude / Velocity は float32 の有効数字7桁）
+_FORMATS = {"FrondFrameNum": "{:d}", "FrondFrameLuminance": "{:.3f}", "BackFrameNum": "{:d}",
+            "BackFrameLuminance": "{:.3f}", "Time": "{:.3f}", "Knob": "{:.7g}",
+            "ResponsePattern": "{}", "StepNumber": "{:d}", "Amplitude": "{:.7g}",
+            "Velocity": "{:.7g}", "FunctionRatio": "{:.3f}", "CameraSpeed": "{:.3f}"}
+
+
+class ParticipantProfile(NamedTuple):
+    """参加者ごとの好みと操作の癖"""
+    name: str
+    function_ratio: float     # 好みの FunctionRatio（0〜2）
+    targets: np.ndarray       # StepNumber 0〜4 のノブの目標値（0〜1）
+    bursts: float             # 1回の調整で回す回数の平均
+    overshoot: float          # 行き過ぎの大きさ（残りの距離に対する比）
+    tremor: float             # 止めているときの揺れの標準偏差（刻み数）
+    pace: float               # 試行の長さの倍率
+
+
+def participant_name(index, prefix="S"):
+    return f"{prefix}{index + 1:04d}"
+
+
+def participant_profile(rng, index, prefix="S"):
+    return ParticipantProfile(
+        name=participant_name(index, prefix),
+        function_ratio=float(rng.uniform(0.2, 1.6)),
+        targets=rng.uniform(0.2, 0.8, size=5),
+        bursts=float(rng.uniform(1.5, 5.0)),
+        overshoot=float(rng.uniform(0.05, 0.5)),
+        tremor=float(rng.uniform(0.5, 2.5)),
+        pace=float(rng.lognormal(0.0, 0.25)),
+    )
+
+
+def trial_filename(timestamp, pattern, participant, trial, blend_mode=None, fps=1,
+                   camera_speed=1, practice=False):
+    """BrightnessData と同じ形式のファイル名を返す"""
+    name = (f"{timestamp:%Y%m%d_%H%M%S}_Fps{fps:g}_CameraSpeed{camera_speed:g}"
+            f"_ExperimentPattern_{pattern}_ParticipantName_{participant}_TrialNumber_{trial}")
+    if blend_mode:
+        name += f"_BrightnessBlendMode_{blend_mode}"
+    if practice:
+        name += "_Test"
+    return name + ".csv"
+
+
+def _significant(values, digits=7):
+    """有効数字 digits 桁に丸める"""
+    magnitude = np.floor(np.log10(np.maximum(np.abs(values), 1e-12)))
+    scale = 10.0 ** (digits - 1 - magnitude)
+    return np.round(values * scale) / scale
+
+
+def frame_times(n_rows):
+    """描画フレームの時刻（ミリ秒）。実データと同じく float32 で積算した値"""
+    steps = np.full(n_rows, 1000 / FRAME_RATE, dtype=np.float32)
+    steps[0] = 0
+    return _significant(np.cumsum(steps, dtype=np.float32).astype(float))
+
+
+def _minimum_jerk(s):
+    return s ** 3 * (10 - 15 * s + 6 * s ** 2)
+
+
+def knob_trajectory(rng, start, target, n_rows, bursts=3.0, overshoot=0.3, tremor=1.0,
+                    settle_fraction=(0.3, 0.8)):
+    """start から target へ何回かに分けて回し、その後は target 付近にとどまるノブの値
+
+    回すたびに残りの距離の overshoot 程度だけ行き過ぎたり手前で止まったりし（回数とともに
+    小さくなる）、回す合間には手を止める。全体に tremor 刻み程度の揺れを足して
+    KNOB_RESOLUTION 刻みに丸め、0〜1 に収める。
+    """
+    settle = min(max(int(n_rows * rng.uniform(*settle_fraction)), 1), n_rows)
+    k = 1 + int(rng.poisson(max(bursts - 1, 0)))
+    errors = rng.normal(0, overshoot, size=k) * 0.5 ** np.arange(k)
+    errors[-1] = 0
+    waypoints = np.concatenate(([start], target + (target - start) * errors))
+
+    # 区間を「休止, 回す」の k 組に分ける
+    edges = np.concatenate(([0], np.cumsum(rng.dirichlet(np.ones(2 * k))) * settle))
+    edges = np.round(edges).astype(np.int64)
+    knob = np.full(n_rows, float(target))
+    for i in range(k):
+        pause, move, end = edges[2 * i], edges[2 * i + 1], edges[2 * i + 2]
+        knob[pause:move] = waypoints[i]
+        s = (np.arange(move, end) - move + 1) / max(end - move, 1)
+        knob[move:end] = waypoints[i] + (waypoints[i + 1] - waypoints[i]) * _minimum_jerk(s)
+
+    # 平均に戻る揺れ（AR(1)、定常の標準偏差が tremor 刻み）
+    decay = 0.97
+    noise = rng.normal(0, tremor * np.sqrt(1 - decay ** 2), size=n_rows)
+    knob += lfilter([1.0], [1.0, -decay], noise) * KNOB_RESOLUTION
+    knob = np.round(np.clip(knob, 0.0, 1.0) / KNOB_RESOLUTION) * KNOB_RESOLUTION
+    return np.round(knob, 3)
+
+
+def blend_weights(fraction, blend_mode, function_ratio=0.5):
+    """フレーム間の位置の小数部から Frond 側の輝度（0〜1）を返す"""
+    linear = 1 - fraction
+    cosine = (1 + np.cos(np.pi * fraction)) / 2
+    if blend_mode == "LinearOnly":
+        return linear
+    if blend_mode == "CosineOnly":
+        return cosine
+    if blend_mode == "AcosOnly":
+        return 1 - np.arccos(1 - 2 * fraction) / np.pi
+    mix = np.clip(function_ratio, 0.0, 1.0)
+    return (1 - mix) * linear + mix * cosine
+
+
+def _frame_columns(time, blend_mode, function_ratio, fps):
+    """時刻から FrondFrameNum / BackFrameNum と輝度の列を作る"""
+    position = time / 1000 * fps
+    frame = np.floor(position).astype(np.int64)
+    front = blend_weights(position - frame, blend_mode, function_ratio)
+    return {
+        "FrondFrameNum": frame + 1,
+        "FrondFrameLuminance": front,
+        "BackFrameNum": frame + 2,
+        "BackFrameLuminance": 1 - front,
+    }
+
+
+def _frame(columns):
+    return pd.DataFrame({name: columns[name] for name in COLUMNS})
+
+
+def _habits(profile):
+    if profile is None:
+        return {}
+    return {"bursts": profile.bursts, "overshoot": profile.overshoot, "tremor": profile.tremor}
+
+
+def function_mix_trial(rng, target_ratio, duration=None, fps=1, camera_speed=1, profile=None):
+    """FunctionMix 試行（ノブで FunctionRatio = 2·Knob を調整する）の DataFrame"""
+    duration = rng.uniform(*FUNCTION_MIX_DURATION) if duration is None else duration
+    n_rows = max(int(duration * FRAME_RATE), 2)
+    time = frame_times(n_rows)
+    knob = knob_trajectory(rng, rng.uniform(0, 1), np.clip(target_ratio / 2, 0, 1), n_rows,
+                           **_habits(profile))
+    ratio = 2 * knob
+
+    columns = _frame_columns(time, "Dynamic", ratio, fps)
+    columns.update({
+        "Time": time,
+        "Knob": knob,
+        "ResponsePattern": np.full(n_rows, "Velocity"),
+        "StepNumber": np.zeros(n_rows, dtype=np.int64),
+        "Amplitude": np.zeros(n_rows),
+        "Velocity": np.zeros(n_rows),
+        "FunctionRatio": ratio,
+        "CameraSpeed": np.full(n_rows, float(camera_speed)),
+    })
+    return _frame(columns)
+
+
+def _amplitude_value(step, knob):
+    """StepNumber 1〜4 のノブの値を記録される Amplitude（振幅または位相）に変換する"""
+    return 3 * knob - 1 if step in (1, 3) else 2 * np.pi * knob
+
+
+def random_step_durations(rng, n_steps=5, scale=1.0):
+    """Phase の各 StepNumber の長さ（秒）"""
+    durations = rng.uniform(*PARAMETER_STEP_DURATION, size=n_steps)
+    durations[0] = rng.uniform(*VELOCITY_STEP_DURATION)
+    return durations * scale
+
+
+def phase_trial(rng, blend_mode, targets, function_ratio=0.5, step_durations=None, fps=1,
+                camera_speed=1, profile=None):
+    """Phase 試行の DataFrame
+
+    targets は StepNumber 0〜4 のノブの目標値（0〜1）の列。
+    """
+    if step_durations is None:
+        step_durations = random_step_durations(rng, len(targets))
+    lengths = [max(int(d * FRAME_RATE), 2) for d in step_durations]
+    n_rows = sum(lengths)
+    time = frame_times(n_rows)
+
+    knob = np.empty(n_rows)
+    step = np.repeat(np.arange(len(targets)), lengths)
+    amplitude = np.zeros(n_rows)
+    velocity = np.empty(n_rows)
+    params = np.zeros(5)  # V0, A1, φ1, A2, φ2（まだ調整していないものは 0）
+
+    start = 0
+    current = rng.uniform(0, 1)
+    for s, (target, length) in enumerate(zip(targets, lengths)):
+        rows = slice(start, start + length)
+        knob[rows] = knob_trajectory(rng, current, target, length, **_habits(profile))
+        if s == 0:
+            velocity[rows] = 2 * knob[rows]
+            params[0] = 2 * knob[start + length - 1]
+        else:
+            amplitude[rows] = _amplitude_value(s, knob[rows])
+            # 調整中のパラメータは行ごとに変わるので、行ごとの係数と基底の内積をとる
+            series = np.tile(params, (length, 1))
+            series[:, s] = amplitude[rows]
+            velocity[rows] = np.einsum("ij,ij->i", phase_coefficients(series),
+                                       curve_basis(time[rows] / 1000))
+            params[s] = amplitude[start + length - 1]
+        current = knob[start + length - 1]
+        start += length
+
+    columns = _frame_columns(time, blend_mode, function_ratio, fps)
+    columns.update({
+        "Time": time,
+        "Knob": knob,
+        "ResponsePattern": np.where(step == 0, "Velocity", "Amplitude"),
+        "StepNumber": step,
+        "Amplitude": amplitude,
+        "Velocity": velocity,
+        "FunctionRatio": np.full(n_rows, function_ratio),
+        "CameraSpeed": np.full(n_rows, float(camera_speed)),
+    })
+    return _frame(columns)
+
+
+def format_trial(df):
+    """実データと同じ ", " 区切り・同じ数値の書式のCSVの文字列を返す"""
+    columns = [list(map(_FORMATS[name].format, df[name].tolist())) for name in COLUMNS]
+    return "\n".join([", ".join(COLUMNS), *map(", ".join, zip(*columns))]) + "\n"
+
+
+def write_trial(df, path):
+    """format_trial の書式で書き出す（一時ファイルから置き換える）"""
+    text = format_trial(df)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_participant(out_dir, index, seed_sequence, blend_modes=("LinearOnly", "Dynamic"),
+                      function_mix_trials=FUNCTION_MIX_TRIALS, phase_trials=PHASE_TRIALS,
+                      duration_scale=1.0, practice=True, name_prefix="S"):
+    """1人分の試行（練習 → FunctionMix → BrightnessBlendMode ごとの Phase）を書き出す"""
+    rng = np.random.default_rng(seed_sequence)
+    profile = participant_profile(rng, index, name_prefix)
+    scale = duration_scale * profile.pace
+    timestamp = START_TIME + datetime.timedelta(days=index)
+    paths = []
+
+    def write(df, pattern, trial, blend_mode=None, is_practice=False):
+        nonlocal timestamp
+        timestamp += datetime.timedelta(minutes=int(rng.integers(3, 8)),
+                                        seconds=int(rng.integers(0, 60)))
+        path = os.path.join(out_dir, trial_filename(timestamp, pattern, profile.name, trial,
+                                                    blend_mode, practice=is_practice))
+        write_trial(df, path)
+        paths.append(path)
+
+    if practice and function_mix_trials:
+        duration = rng.uniform(*FUNCTION_MIX_DURATION) * scale * PRACTICE_DURATION_SCALE
+        write(function_mix_trial(rng, rng.uniform(0, 2), duration, profile=profile),
+              "FunctionMix", 1, is_practice=True)
+
+    ratios = []
+    for trial in range(1, function_mix_trials + 1):
+        target = np.clip(profile.function_ratio + rng.normal(0, 0.15), 0, 2)
+        duration = rng.uniform(*FUNCTION_MIX_DURATION) * scale
+        df = function_mix_trial(rng, target, duration, profile=profile)
+        ratios.append(df["FunctionRatio"].iloc[-1])
+        write(df, "FunctionMix", trial)
+
+    # Phase の FunctionRatio は FunctionMix で選んだ値（中央値）に固定される
+    function_ratio = float(np.round(np.median(ratios), 3)) if ratios else 0.5
+    if practice and phase_trials and blend_modes:
+        targets = rng.uniform(0, 1, size=5)
+        durations = random_step_durations(rng, scale=scale * PRACTICE_DURATION_SCALE)
+        write(phase_trial(rng, blend_modes[0], targets, function_ratio, durations,
+                          profile=profile), "Phase", 1, blend_modes[0], is_practice=True)
+    for blend_mode in blend_modes:
+        for trial in range(1, phase_trials + 1):
+            targets = np.clip(profile.targets + rng.normal(0, 0.05, size=5), 0, 1)
+            durations = random_step_durations(rng, scale=scale)
+            df = phase_trial(rng, blend_mode, targets, function_ratio, durations, profile=profile)
+            write(df, "Phase", trial, blend_mode)
+    return paths
+
+
+def _write_participants(out_dir, indices, seed_sequences, options):
+    return [path for index, seed_sequence in zip(indices, seed_sequences)
+            for path in write_participant(out_dir, index, seed_sequence, **options)]
+
+
+def generate_dataset(out_dir, participants=5, blend_modes=("LinearOnly", "Dynamic"),
+                     function_mix_trials=FUNCTION_MIX_TRIALS, phase_trials=PHASE_TRIALS,
+                     seed=0, duration_scale=1.0, practice=True, name_prefix="S",
+                     max_workers=1, participants_per_task=PARTICIPANTS_PER_TASK):
+    """参加者ごとに FunctionMix と Phase の試行を out_dir に書き出し、パスのリストを返す
+
+    duration_scale で試行の長さ（行数）をまとめて伸縮できる。max_workers が 2 以上なら
+    参加者をいくつかずつまとめてプロセスプールで書き出す（出力は同じ）。
+    """
+    unknown = [mode for mode in blend_modes if mode not in BLEND_MODES]
+    if unknown:
+        raise ValueError(f"未知の BrightnessBlendMode です: {', '.join(unknown)}")
+    os.makedirs(out_dir, exist_ok=True)
+    seed_sequences = np.random.SeedSequence(seed).spawn(participants)
+    options = {"blend_modes": tuple(blend_modes), "function_mix_trials": function_mix_trials,
+               "phase_trials": phase_trials, "duration_scale": duration_scale,
+               "practice": practice, "name_prefix": name_prefix}
+    chunks = [range(i, min(i + participants_per_task, participants))
+              for i in range(0, participants, participants_per_task)]
+    if max_workers is None:
+        max_workers = min(len(chunks), os.cpu_count() or 1)
+
+    if max_workers <= 1 or len(chunks) <= 1:
+        results = [_write_participants(out_dir, chunk, seed_sequences[chunk.start:chunk.stop],
+                                       options) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_write_participants, [out_dir] * len(chunks), chunks,
+                                    [seed_sequences[c.start:c.stop] for c in chunks],
+                                    [options] * len(chunks)))
+    return [path for chunk in results for path in chunk]
+
+
+def generate_public_tree(root, participants=5, seed=0, layout=None, **options):
+    """DATASET_LAYOUT の各ディレクトリを root 以下に作り、{ディレクトリ名: パスのリスト} を返す
+
+    解析スクリプトは public/BrightnessData などを相対パスで読むので、root には
+    public という名前のディレクトリを渡す。ディレクトリごとに seed をずらす。
+    """
+    layout = DATASET_LAYOUT if layout is None else layout
+    return {
+        name: generate_dataset(os.path.join(root, name), participants=participants,
+                               blend_modes=blend_modes, seed=seed + i, **options)
+        for i, (name, blend_modes) in enumerate(layout.items())
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="実データと同じ形式の合成試行CSVを作る")
+    parser.add_argument("out_dir", help="public ディレクトリ（--blend-modes を指定したときは"
+                                        "データディレクトリ）")
+    parser.add_argument("--participants", type=int, default=5)
+    parser.add_argument("--blend-modes", help="カンマ区切り。省略時は DATASET_LAYOUT の構成で作る")
+    parser.add_argument("--function-mix-trials", type=int, default=FUNCTION_MIX_TRIALS)
+    parser.add_argument("--phase-trials", type=int, default=PHASE_TRIALS)
+    parser.add_argument("--duration-scale", type=float, default=1.0)
+    parser.add_argument("--no-practice", action="store_true", help="練習試行（_Test）を作らない")
+    parser.add_argument("--name-prefix", default="S")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    options = {"function_mix_trials": args.function_mix_trials, "phase_trials": args.phase_trials,
+               "duration_scale": args.duration_scale, "practice": not args.no_practice,
+               "name_prefix": args.name_prefix, "max_workers": args.workers}
+    start = time.perf_counter()
+    if args.blend_modes:
+        paths = generate_dataset(args.out_dir, args.participants,
+                                 tuple(args.blend_modes.split(",")), seed=args.seed, **options)
+    else:
+        tree = generate_public_tree(args.out_dir, args.participants, args.seed, **options)
+        paths = [path for chunk in tree.values() for path in chunk]
+    elapsed = time.perf_counter() - start
+
+    size = sum(os.path.getsize(path) for path in paths)
+    print(f"{args.participants} 人分・{len(paths)} 試行を {args.out_dir} に書き出しました"
+          f"（{size / 1e6:.1f} MB, {elapsed:.1f} 秒）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+共通の時間軸への再標本化
+
+試行ごとの 'Vection Response' や輝度を足し合わせるスクリプトは、全試行の Time が
+同じだと仮定して pandas の Series を行番号でそろえて足している。フレーム落ちで行数が
+変わると、同じ行番号が別の時刻を指すことになり、気づかないまま平均がずれる。
+
+ここでは全試行の列を1つの共通の時間軸（グリッド）に補間して
+(試行数, グリッド点数) の float32 行列にし、条件ごとの合計・平均・標準偏差を
+axis 指定の reduction でまとめて求める。
+
+- 補間は全試行を一度に行う。試行 i の Time に i·(全体の幅) を足して1本の単調な配列にし、
+  全試行分の問い合わせ点を1回の searchsorted で探す
+- 'Vection Response' のような 0/1 の列は直前の値を保持（previous）、輝度などは線形補間
+- グリッドの範囲外（その試行に記録がない時刻）は NaN。既定のグリッドは全試行に共通する
+  区間なので NaN は出ない
+- 集計は NaN を除いて数える
+
+時間はCSVの Time 列の単位（ミリ秒）のまま返す。
+
+    resampled = resample_trials(paths, ['Vection Response'])
+    person = group_stats(resampled.values['Vection Response'], participants)
+    summed = person.mean.sum(axis=0)
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from trial_store import NORMALIZED_SUFFIX, load_trial_arrays
+
+TIME_COLUMN = 'Time'
+RESPONSE_COLUMN = 'Vection Response'
+LUMINANCE_COLUMNS = ('FrondFrameLuminance', 'BackFrameLuminance')
+# 列ごとの補間方法（ここにない列は線形補間）
+DEFAULT_METHODS = {RESPONSE_COLUMN: 'previous'}
+VALUE_DTYPE = np.float32
+
+
+class ResampledTrials(NamedTuple):
+    """共通の時間軸に補間した列。values[列名] の行 i が keys[i] の試行"""
+    keys: list
+    grid: np.ndarray          # (n_samples,) ミリ秒
+    values: dict              # 列名 -> (n_trials, n_samples) float32
+
+    @property
+    def seconds(self):
+        return self.grid / 1000
+
+
+class GroupStats(NamedTuple):
+    """group_stats の結果。行 g がラベル labels[g] の集計"""
+    labels: list
+    count: np.ndarray         # (n_groups, n_samples) NaN でない試行数
+    sum: np.ndarray
+    mean: np.ndarray
+    std: np.ndarray           # 標本標準偏差（ddof=1）
+
+
+def common_grid(times, step=None):
+    """全試行に共通する区間 [最も遅い開始, 最も早い終了] を step ミリ秒刻みにしたグリッド
+
+    step を省略すると、試行ごとの平均フレーム間隔の中央値を使う。
+    """
+    starts = [np.nanmin(t) for t in times if len(t)]
+    ends = [np.nanmax(t) for t in times if len(t)]
+    if not starts:
+        return np.zeros(0)
+    if step is None:
+        # Time は float32 で積算されていて1行ごとの差がばらつくので、試行ごとの平均間隔の中央値
+        intervals = [(np.nanmax(t) - np.nanmin(t)) / (len(t) - 1) for t in times if len(t) > 1]
+        intervals = [interval for interval in intervals if interval > 0]
+        step = float(np.median(intervals)) if intervals else 1.0
+    start, end = max(starts), min(ends)
+    if end < start:
+        raise ValueError("全試行に共通する時間の区間がありません")
+    # 端の丸め誤差で最後の点が落ちないように、半ステップ分の余裕をとる
+    return start + step * np.arange(int(np.floor((end - start) / step + 0.5)) + 1)
+
+
+def _sorted_trial(time, columns):
+    """Time が単調でない試行は Time で並べ替え、NaN の時刻の行を除く"""
+    valid = ~np.isnan(time)
+    if valid.all() and (len(time) < 2 or np.all(np.diff(time) >= 0)):
+        return time, columns
+    order = np.argsort(np.where(valid, time, np.inf), kind='stable')[:int(valid.sum())]
+    return time[order], {name: values[order] for name, values in columns.items()}
+
+
+def resample_arrays(times, columns, grid, methods=None):
+    """試行ごとの (time, {列名: 値}) をグリッドに補間し、{列名: (n_trials, n_samples)} を返す
+
+    times は試行ごとの Time 配列のリスト、columns は同じ順の {列名: 配列} のリスト。
+    """
+    methods = {**DEFAULT_METHODS, **(methods or {})}
+    grid = np.asarray(grid, dtype=float)
+    n_trials, n_samples = len(times), len(grid)
+    names = list(columns[0]) if columns else []
+    if n_trials == 0 or n_samples == 0:
+        return {name: np.zeros((n_trials, n_samples), dtype=VALUE_DTYPE) for name in names}
+
+    trials = [_sorted_trial(np.asarray(t, dtype=float), c) for t, c in zip(times, columns)]
+    lengths = np.array([len(t) for t, _ in trials])
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+    # 試行 i の時刻を i·span だけずらすと、全試行が重ならずに1本の単調な配列になる
+    low = min([grid[0]] + [t[0] for t, _ in trials if len(t)])
+    high = max([grid[-1]] + [t[-1] for t, _ in trials if len(t)])
+    span = (high - low) + 1.0
+    shift = np.arange(n_trials) * span
+    flat_time = np.concatenate([t - low for t, _ in trials]) + np.repeat(shift, lengths)
+    queries = (grid - low)[np.newaxis, :] + shift[:, np.newaxis]
+
+    if len(flat_time) == 0:
+        return {name: np.full((n_trials, n_samples), np.nan, dtype=VALUE_DTYPE) for name in names}
+
+    # lower: Time ≤ 問い合わせ時刻 となる最後の行（同時刻の行が並ぶときは最後の行）
+    lower = np.searchsorted(flat_time, queries.ravel(), side='right').reshape(n_trials, n_samples) - 1
+    first = offsets[:-1, np.newaxis]
+    last = np.maximum(offsets[1:, np.newaxis] - 1, 0)
+    inside = (lengths[:, np.newaxis] > 0) & (lower >= first) & (queries <= flat_time[last])
+    lower = np.clip(lower, first, last)
+    upper = np.minimum(lower + 1, last)
+
+    t0, t1 = flat_time[lower], flat_time[upper]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = np.where(t1 > t0, (queries - t0) / (t1 - t0), 0.0)
+
+    result = {}
+    for name in names:
+        flat = np.concatenate([np.asarray(c[name], dtype=float) for _, c in trials])
+        if methods.get(name, 'linear') == 'previous':
+            values = flat[lower]
+        else:
+            values = flat[lower] + (flat[upper] - flat[lower]) * fraction
+        result[name] = np.where(inside, values, np.nan).astype(VALUE_DTYPE)
+    return result
+
+
+def resample_trials(paths, columns=(RESPONSE_COLUMN,), grid=None, step=None,
+                    normalized=False, methods=None):
+    """試行ファイルの列を共通の時間軸に補間した ResampledTrials を返す
+
+    grid（ミリ秒）を省略すると common_grid(step) を使う。normalized=True なら
+    Frond/Back の輝度は取り込み時に入れ替えた値を使う。
+    """
+    keys = [getattr(path, 'path', path) for path in paths]
+    times, arrays = [], []
+    for path in keys:
+        stored = [name + NORMALIZED_SUFFIX if normalized and name in LUMINANCE_COLUMNS else name
+                  for name in columns]
+        loaded = load_trial_arrays(path, [TIME_COLUMN, *stored])
+        times.append(np.asarray(loaded[TIME_COLUMN], dtype=float))
+        arrays.append({name: loaded[s] for name, s in zip(columns, stored)})
+    if grid is None:
+        grid = common_grid(times, step)
+    values = resample_arrays(times, arrays, grid, methods)
+    if not arrays:
+        values = {name: values.get(name, np.zeros((0, len(grid)), dtype=VALUE_DTYPE))
+                  for name in columns}
+    return ResampledTrials(keys, np.asarray(grid, dtype=float), values)
+
+
+def group_stats(values, labels):
+    """(n_trials, n_samples) の行列を labels ごとに集計した GroupStats を返す
+
+    ラベルは最初に現れた順に並ぶ。NaN の要素は数えない。
+    """
+    values = np.asarray(values)
+    codes, uniques = pd.factorize(pd.Series(list(labels), dtype=object))
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+
+    ordered = values[order].astype(np.float64)
+    finite = ~np.isnan(ordered)
+    filled = np.where(finite, ordered, 0.0)
+    count = np.add.reduceat(finite.astype(np.int64), starts, axis=0)
+    total = np.add.reduceat(filled, starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        deviation = np.where(finite, ordered - np.repeat(mean, np.diff(np.r_[starts, len(ordered)]),
+                                                         axis=0), 0.0)
+        var = np.add.reduceat(deviation * deviation, starts, axis=0) / (count - 1)
+    mean[count == 0] = np.nan
+    return GroupStats(list(uniques), count, total, mean, np.sqrt(var))
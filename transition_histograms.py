@@ -0,0 +1,136 @@
+"""
+ベクション応答が切り替わった瞬間の輝度のヒストグラム
+
+「どの混合比（輝度）でベクションが生じた／消えたか」の図は、試行ごとに
+'Vection Response' の diff() から 0→1（onset）・1→0（loss）の行を探し、その行の
+FrondFrameLuminance を Counter に入れて、ファイルごとに辞書をマージして作っていた。
+
+ここでは輝度を resolution 刻みの整数コードに量子化し、全試行の切り替わりを
+(試行, onset/loss, コード) の1次元インデックスにして np.bincount を1回呼ぶだけで
+(試行数, 2, ビン数) の回数配列にする。グループ（fps・刺激・方向など）ごとの回数配列は
+analysis_cache の集計成果物として保存し、入力ファイルが変わっていなければCSVを読まずに返す。
+
+    histograms = transition_histograms(luminance_mixture_paths)
+    levels, average = histograms['10 fps']['onset'].average_occurrences()
+
+    groups = catalog_groups(data_dir, method='luminanceMixture')  # (fps, stimulus, direction) ごと
+"""
+
+import os
+from typing import NamedTuple
+
+import numpy as np
+
+from analysis_cache import AnalysisCache
+from trial_catalog import find_trials
+from trial_store import load_trial_arrays
+
+RESPONSE_COLUMN = 'Vection Response'
+LUMINANCE_COLUMN = 'FrondFrameLuminance'
+LUMINANCE_RESOLUTION = 0.01
+DIRECTIONS = ('onset', 'loss')   # 0→1, 1→0
+
+
+class TransitionHistogram(NamedTuple):
+    """1グループ・1方向の切り替わりの回数。counts[i, k] は paths[i] で輝度 levels[k] の回数"""
+    paths: list
+    levels: np.ndarray        # (n_bins,) 量子化した輝度
+    counts: np.ndarray        # (n_trials, n_bins)
+
+    def total(self):
+        """輝度ごとの全試行の合計回数"""
+        return self.counts.sum(axis=0)
+
+    def occurrences(self):
+        """輝度ごとの、その輝度で1回以上切り替わった試行の数"""
+        return np.count_nonzero(self.counts, axis=0)
+
+    def average_occurrences(self):
+        """切り替わりのあった輝度と、その輝度が現れた試行あたりの平均回数
+
+        Counter をファイルごとにマージしていたスクリプトの
+        total_counts[v] / total_occurrences[v] と同じ値。
+        """
+        occurrences = self.occurrences()
+        seen = occurrences > 0
+        return self.levels[seen], self.total()[seen] / occurrences[seen]
+
+
+def n_bins(resolution=LUMINANCE_RESOLUTION):
+    return int(round(1 / resolution)) + 1
+
+
+def count_transitions(responses, luminances, resolution=LUMINANCE_RESOLUTION):
+    """試行ごとの応答・輝度の配列から (n_trials, 2, n_bins) の回数配列を作る
+
+    [:, 0] が 0→1、[:, 1] が 1→0。輝度は resolution 刻みに丸め、[0, 1] の外は端のビンに入れる。
+    """
+    bins = n_bins(resolution)
+    n_trials = len(responses)
+    if n_trials == 0:
+        return np.zeros((0, 2, bins), dtype=np.int64)
+
+    lengths = np.array([len(r) for r in responses])
+    response = np.concatenate([np.asarray(r, dtype=float) for r in responses])
+    luminance = np.concatenate([np.asarray(v, dtype=float) for v in luminances])
+    trial = np.repeat(np.arange(n_trials), lengths)
+
+    # 行 i の diff（= response[i] - response[i-1]）。各試行の先頭行は diff が NaN なので数えない
+    step = np.empty_like(response)
+    step[0] = np.nan
+    step[1:] = response[1:] - response[:-1]
+    step[np.cumsum(lengths)[:-1]] = np.nan
+    is_loss = step == -1
+    changed = ((step == 1) | is_loss) & ~np.isnan(luminance)
+
+    codes = np.clip(np.rint(luminance[changed] / resolution), 0, bins - 1).astype(np.int64)
+    index = (trial[changed] * 2 + is_loss[changed]) * bins + codes
+    return np.bincount(index, minlength=n_trials * 2 * bins).reshape(n_trials, 2, bins)
+
+
+def load_transition_counts(paths, column=LUMINANCE_COLUMN, resolution=LUMINANCE_RESOLUTION):
+    """試行ファイルから count_transitions の回数配列を作る"""
+    arrays = [load_trial_arrays(path, [RESPONSE_COLUMN, column]) for path in paths]
+    return count_transitions([a[RESPONSE_COLUMN] for a in arrays], [a[column] for a in arrays],
+                             resolution)
+
+
+def _histograms(paths, counts, resolution):
+    levels = np.arange(counts.shape[-1]) * resolution
+    return {direction: TransitionHistogram(list(paths), levels, counts[:, d])
+            for d, direction in enumerate(DIRECTIONS)}
+
+
+def transition_histograms(groups, column=LUMINANCE_COLUMN, resolution=LUMINANCE_RESOLUTION,
+                          cache=None):
+    """{グループ: パスのリスト} から {グループ: {'onset'|'loss': TransitionHistogram}} を返す
+
+    グループごとの回数配列は集計成果物としてキャッシュし、そのグループの入力ファイルが
+    変わっていなければCSVを読まない。
+    """
+    own_cache = cache is None
+    if own_cache:
+        cache = AnalysisCache("transition_histograms")
+    histograms = {}
+    for key, paths in groups.items():
+        paths = [getattr(path, 'path', path) for path in paths]
+        kind = f"transition_counts:{column}:{resolution}:{key!r}"
+        ordered = [os.path.abspath(path) for path in paths]
+        # 指紋はパスの順序によらないので、行の並びが同じかも確かめる
+        entry = cache.artifact_value(kind) if cache.is_current(kind, paths) else None
+        if entry is None or entry[0] != ordered:
+            entry = (ordered, load_transition_counts(paths, column, resolution))
+            cache.mark_current(kind, paths, entry)
+        histograms[key] = _histograms(paths, entry[1], resolution)
+    if own_cache:
+        cache.save()
+    return histograms
+
+
+def catalog_groups(data_dir, **criteria):
+    """data_dir の試行を (fps, 刺激, 方向) ごとに分けた {キー: [パス]} を返す"""
+    groups = {}
+    for record in find_trials(data_dir, **criteria):
+        groups.setdefault((record.fps, record.stimulus, record.direction), []).append(record.path)
+    return dict(sorted(groups.items(),
+                       key=lambda item: (item[0][0] or 0, item[0][1] or '', item[0][2] or '')))
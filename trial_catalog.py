@@ -0,0 +1,284 @@
+"""
+試行ファイルのカタログ
+
+public/*Data* ディレクトリを一度だけ走査し、ファイル名に埋め込まれた実験条件を
+TrialRecord に変換して索引ファイル (CATALOG_FILENAME) に保存する。
+対応しているファイル名の形式:
+
+    20250715_144516_Fps1_CameraSpeed1_ExperimentPattern_Phase_ParticipantName_ONO_TrialNumber_1_BrightnessBlendMode_LinearOnly.csv
+    20250601_190847_fps0.5_cameraSpeed1_ParticipantName_K_TrialNumber_1.csv
+    20250516_135917_fps1_ParticipantName_A_TrialNumber_1_VelocityOption0.csv
+    20241113_154414_luminanceMixture_cameraSpeed4_fps5_G_trialNumber1.csv
+    20250117_151251_Natural_right_luminanceMixture_cameraSpeed4_fps10_c_trialNumber1.csv
+
+使い方:
+    catalog = load_catalog()
+    records = catalog.find(pattern="Phase", blend_mode="AcosOnly", participant="H")
+"""
+
+import json
+import os
+import re
+import sys
+from collections import defaultdict
+from typing import NamedTuple, Optional
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "public")
+CATALOG_FILENAME = ".trial_catalog.json"
+CATALOG_VERSION = 1
+
+# ルートディレクトリ -> (ディレクトリのシグネチャ, TrialCatalog)
+_catalog_cache = {}
+
+
+class TrialRecord(NamedTuple):
+    """ファイル名から得られる1試行分のメタデータ"""
+    path: str
+    directory: str
+    filename: str
+    timestamp: str
+    pattern: Optional[str]           # FunctionMix / Phase / Fourier / Nonlinear
+    method: Optional[str]            # luminanceMixture / continuous
+    stimulus: Optional[str]          # Dots / Natural
+    direction: Optional[str]         # forward / right
+    fps: Optional[float]
+    camera_speed: Optional[float]
+    participant: str
+    trial: Optional[int]
+    blend_mode: Optional[str]        # LinearOnly / CosineOnly / AcosOnly / Dynamic
+    curve_type: Optional[str]
+    velocity_option: Optional[int]
+    is_test: bool
+
+
+# ExperimentPattern / ParticipantName などのキーを持つ形式（実験2・輝度実験）
+_KEYED_PATTERN = re.compile(
+    r"^(?P<timestamp>\d{8}_\d{6})_[Ff]ps(?P<fps>[\d.]+)"
+    r"(?:_[Cc]ameraSpeed(?P<camera_speed>[\d.]+))?"
+    r"(?:_ExperimentPattern_(?P<pattern>[A-Za-z]+))?"
+    r"_ParticipantName_?(?P<participant>[A-Za-z0-9]*)_+TrialNumber_(?P<trial>\d+|Test)"
+    r"(?:_BrightnessBlendMode_(?P<blend_mode>[A-Za-z]+))?"
+    r"(?:_CurveType_(?P<curve_type>[A-Za-z]+))?"
+    r"(?:_VelocityOption(?P<velocity_option>\d+))?"
+    r"(?P<test>_Test)?\.csv$"
+)
+
+# 刺激・方向・手法を並べた形式（ExperimentData*）
+_SCENE_PATTERN = re.compile(
+    r"^(?P<timestamp>\d{8}_\d{6})_"
+    r"(?:(?P<stimulus>Dots|Natural)_(?P<direction>[a-z]+)_)?"
+    r"(?:(?P<method>[A-Za-z]+)_cameraSpeed(?P<camera_speed>[\d.]+)_fps(?P<fps>[\d.]+))?"
+    r"_(?P<participant>[A-Za-z0-9]*)_trialNumber(?P<trial>\d+)\.csv$"
+)
+
+_INDEXED_FIELDS = ("directory", "pattern", "method", "stimulus", "direction", "fps",
+                   "camera_speed", "participant", "trial", "blend_mode", "curve_type",
+                   "is_test")
+
+
+def _number(value):
+    if value is None:
+        return None
+    return float(value)
+
+
+def parse_trial_filename(path):
+    """ファイル名を解析して TrialRecord を返す（未知の形式は None）"""
+    filename = os.path.basename(path)
+    directory = os.path.basename(os.path.dirname(os.path.abspath(path)))
+
+    match = _KEYED_PATTERN.match(filename)
+    if match:
+        trial = match.group("trial")
+        velocity_option = match.group("velocity_option")
+        return TrialRecord(
+            path=path,
+            directory=directory,
+            filename=filename,
+            timestamp=match.group("timestamp"),
+            pattern=match.group("pattern"),
+            method=None,
+            stimulus=None,
+            direction=None,
+            fps=_number(match.group("fps")),
+            camera_speed=_number(match.group("camera_speed")),
+            participant=match.group("participant"),
+            trial=int(trial) if trial.isdigit() else None,
+            blend_mode=match.group("blend_mode"),
+            curve_type=match.group("curve_type"),
+            velocity_option=int(velocity_option) if velocity_option is not None else None,
+            is_test=match.group("test") is not None or trial == "Test",
+        )
+
+    match = _SCENE_PATTERN.match(filename)
+    if match:
+        return TrialRecord(
+            path=path,
+            directory=directory,
+            filename=filename,
+            timestamp=match.group("timestamp"),
+            pattern=None,
+            method=match.group("method"),
+            stimulus=match.group("stimulus"),
+            direction=match.group("direction"),
+            fps=_number(match.group("fps")),
+            camera_speed=_number(match.group("camera_speed")),
+            participant=match.group("participant"),
+            trial=int(match.group("trial")),
+            blend_mode=None,
+            curve_type=None,
+            velocity_option=None,
+            is_test=False,
+        )
+
+    return None
+
+
+class TrialCatalog:
+    """TrialRecord の集合と、フィールド値ごとの索引"""
+
+    def __init__(self, records):
+        self.records = list(records)
+        self._index = {field: defaultdict(list) for field in _INDEXED_FIELDS}
+        for i, record in enumerate(self.records):
+            for field in _INDEXED_FIELDS:
+                self._index[field][getattr(record, field)].append(i)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def find(self, include_tests=False, **criteria):
+        """条件に一致する試行を返す（例: find(pattern="Phase", participant="H")）
+
+        各条件は索引の参照で解決し、最も候補の少ない条件から絞り込む。
+        値にリスト・タプル・集合を渡すといずれかに一致するものを返す。
+        """
+        if not include_tests and "is_test" not in criteria:
+            criteria["is_test"] = False
+
+        candidate_sets = []
+        for field, value in criteria.items():
+            if field not in self._index:
+                raise KeyError(f"索引のないフィールドです: {field}")
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            ids = []
+            for v in values:
+                if field in ("fps", "camera_speed") and v is not None:
+                    v = float(v)
+                ids.extend(self._index[field].get(v, ()))
+            candidate_sets.append(ids)
+
+        if not candidate_sets:
+            return list(self.records)
+
+        candidate_sets.sort(key=len)
+        result = set(candidate_sets[0])
+        for ids in candidate_sets[1:]:
+            result.intersection_update(ids)
+            if not result:
+                break
+        return [self.records[i] for i in sorted(result)]
+
+    def values(self, field, **criteria):
+        """条件に一致する試行に現れるフィールド値の一覧を返す"""
+        return sorted({getattr(r, field) for r in self.find(**criteria)},
+                      key=lambda v: (v is None, v))
+
+    def paths(self, **criteria):
+        """条件に一致する試行のファイルパスを返す"""
+        return [r.path for r in self.find(**criteria)]
+
+
+def _data_directories(root):
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        os.path.join(root, name) for name in os.listdir(root)
+        if "Data" in name and os.path.isdir(os.path.join(root, name))
+    )
+
+
+def scan_directories(root=DEFAULT_ROOT):
+    """root 直下の *Data* ディレクトリを走査して TrialRecord のリストを返す"""
+    records = []
+    for directory in _data_directories(root):
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".csv"):
+                continue
+            record = parse_trial_filename(os.path.join(directory, filename))
+            if record is None:
+                print(f"ファイル名を解析できません: {filename}")
+                continue
+            records.append(record)
+    return records
+
+
+def _directory_signature(root):
+    return {os.path.basename(d): os.stat(d).st_mtime_ns for d in _data_directories(root)}
+
+
+def build_catalog(root=DEFAULT_ROOT):
+    """ディレクトリを走査してカタログを作り、索引ファイルに保存する"""
+    records = scan_directories(root)
+    payload = {
+        "version": CATALOG_VERSION,
+        "directories": _directory_signature(root),
+        "records": [
+            dict(record._asdict(), path=os.path.relpath(record.path, root))
+            for record in records
+        ],
+    }
+    path = os.path.join(root, CATALOG_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return TrialCatalog(records)
+
+
+def load_catalog(root=DEFAULT_ROOT, rebuild=False):
+    """保存済みのカタログを読み込む（ディレクトリに変更があれば作り直す）"""
+    root = os.path.abspath(root)
+    signature = _directory_signature(root)
+    cached = _catalog_cache.get(root)
+    if not rebuild and cached is not None and cached[0] == signature:
+        return cached[1]
+
+    catalog = None
+    path = os.path.join(root, CATALOG_FILENAME)
+    if not rebuild and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        if (payload.get("version") == CATALOG_VERSION
+                and payload.get("directories") == signature):
+            catalog = TrialCatalog(
+                TrialRecord(**dict(r, path=os.path.join(root, r["path"])))
+                for r in payload["records"]
+            )
+    if catalog is None:
+        catalog = build_catalog(root)
+    _catalog_cache[root] = (signature, catalog)
+    return catalog
+
+
+def find_trials(data_dir, **criteria):
+    """data_dir 内の試行をカタログから検索する（例: find_trials(d, pattern="Phase")）
+
+    data_dir が存在しなければ空のリストを返す。
+    """
+    data_dir = os.path.abspath(data_dir)
+    if not os.path.isdir(data_dir):
+        return []
+    catalog = load_catalog(os.path.dirname(data_dir))
+    return catalog.find(directory=os.path.basename(data_dir), **criteria)
+
+
+if __name__ == "__main__":
+    root = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_ROOT
+    catalog = load_catalog(root, rebuild=True)
+    print(f"{len(catalog)} 試行をカタログに登録しました")
+    for directory in catalog.values("directory"):
+        print(f"  {directory}: {len(catalog.find(include_tests=True, directory=directory))}")
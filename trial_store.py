@@ -0,0 +1,374 @@
+"""
+試行CSVの列指向ストア
+
+public/BrightnessData などの試行CSVを一度だけ読み込み、列ごとの .npy ファイルに変換して
+保存する。各データディレクトリの直下に STORE_DIRNAME ディレクトリを作り、
+その中にメタデータ索引 (index.json) と試行ごとの列ファイルを置く。
+
+解析スクリプトは pd.read_csv の代わりに read_trial を呼べばよい。ストアが古い・存在しない
+場合はCSVを読み込んでその場で変換するので、初回以降はテキスト解析が不要になる。
+必要な列だけを指定すれば、その列のファイルだけがメモリマップで読まれる。
+
+複数のプロセスが同時に取り込んでもよい。列ファイルと索引はプロセスごとの一時ファイルに
+書いてから置き換え、索引はロックファイル (index.lock) を取ってから読み直し、
+自分の変換したエントリだけを書き足す。
+
+BackFrameNum が奇数の行は Frond/Back のフレームが逆に記録されているため、取り込み時に
+一度だけ入れ替えた列（正規化済みの列）も保存しておく。輝度をプロットするスクリプトは
+read_normalized_trial を呼べば、行ごとの入れ替えをやり直す必要がない。
+
+使い方:
+    python trial_store.py public/BrightnessData public/BrightnessFunctionMixAndPhaseData
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from profiling import add as profile_add, profiled
+
+STORE_DIRNAME = ".columnar"
+INDEX_FILENAME = "index.json"
+LOCK_FILENAME = "index.lock"
+# ロックを待つ間隔（秒）
+LOCK_POLL_INTERVAL = 0.05
+STORE_VERSION = 2
+
+# 入れ替える Frond/Back の列の組と、正規化済みの列の名前に付ける接尾辞
+FRAME_COLUMN_PAIRS = (
+    ("FrondFrameNum", "BackFrameNum"),
+    ("FrondFrameLuminance", "BackFrameLuminance"),
+)
+NORMALIZED_SUFFIX = ":normalized"
+
+# 索引ファイルのパス -> (mtime_ns, 索引)
+_index_cache = {}
+
+DEFAULT_DATA_DIRS = [
+    "public/BrightnessData",
+    "public/BrightnessFunctionMixAndPhaseData",
+]
+
+
+def store_dir(data_dir):
+    """データディレクトリに対応するストアのパスを返す"""
+    return os.path.join(data_dir, STORE_DIRNAME)
+
+
+def _column_filename(index, column):
+    # 列名には空白や記号が含まれるため、列番号でファイル名を決める
+    return f"{index:02d}.npy"
+
+
+def _file_signature(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def read_csv_clean(path):
+    """CSVを読み込み、列名の空白を削除したDataFrameを返す"""
+    df = pd.read_csv(path, skipinitialspace=True)
+    df.columns = df.columns.str.strip()
+    profile_add(rows=len(df), nbytes=os.path.getsize(path))
+    return df
+
+
+def _read_index(path):
+    with open(path, "r", encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get("version") != STORE_VERSION:
+        return {"version": STORE_VERSION, "trials": {}}
+    return index
+
+
+def load_index(data_dir):
+    """ストアの索引を読み込む（存在しない場合は空の索引）"""
+    path = os.path.join(store_dir(data_dir), INDEX_FILENAME)
+    if not os.path.exists(path):
+        return {"version": STORE_VERSION, "trials": {}}
+    mtime_ns = os.stat(path).st_mtime_ns
+    cached = _index_cache.get(path)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+    index = _read_index(path)
+    _index_cache[path] = (mtime_ns, index)
+    return index
+
+
+def _replace_atomically(path, write, mode="wb", **kwargs):
+    """同じディレクトリの一意な一時ファイルに write(f) で書いてから path に置き換える"""
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=directory)
+    try:
+        with open(fd, mode, **kwargs) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def _index_lock(data_dir):
+    """ストアの索引の排他ロック（他のプロセスが持っていれば空くまで待つ）"""
+    root = store_dir(data_dir)
+    os.makedirs(root, exist_ok=True)
+    fd = os.open(os.path.join(root, LOCK_FILENAME), os.O_RDWR | os.O_CREAT)
+    try:
+        if os.name == "nt":
+            import msvcrt
+            while True:
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(LOCK_POLL_INTERVAL)
+            try:
+                yield
+            finally:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def save_index(data_dir, index):
+    """索引を一意な一時ファイル経由で書き込む（ロックは呼び出し側で取る）"""
+    root = store_dir(data_dir)
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, INDEX_FILENAME)
+    _replace_atomically(path, lambda f: json.dump(index, f, ensure_ascii=False, indent=1),
+                        mode="w", encoding="utf-8")
+
+
+def update_index(data_dir, entries, keep=None):
+    """ロックを取って索引を読み直し、entries を書き足して保存した索引を返す
+
+    keep（ファイル名の集合）を渡すと、それ以外のエントリ（削除されたCSV）を外す。
+    他のプロセスが書き足したエントリは残る。
+    """
+    with _index_lock(data_dir):
+        path = os.path.join(store_dir(data_dir), INDEX_FILENAME)
+        if os.path.exists(path):
+            index = _read_index(path)
+        else:
+            index = {"version": STORE_VERSION, "trials": {}}
+        index["trials"].update(entries)
+        if keep is not None:
+            for filename in list(index["trials"]):
+                if filename not in keep:
+                    del index["trials"][filename]
+        save_index(data_dir, index)
+    return index
+
+
+def _to_array(series):
+    """列を保存用のNumPy配列に変換する
+
+    文字列列（ResponsePattern など）はカテゴリ符号とラベルの組で保存する。
+    戻り値は (配列, ラベルのリスト or None)。
+    """
+    if not pd.api.types.is_numeric_dtype(series):
+        codes, labels = pd.factorize(series.fillna("").astype(str).str.strip())
+        return codes.astype(np.int16), [str(label) for label in labels]
+    array = series.to_numpy()
+    if array.dtype == np.int64 and len(array) and np.abs(array).max() < 2 ** 31:
+        array = array.astype(np.int32)
+    return array, None
+
+
+def swap_front_back(columns, swap=None):
+    """{列名: ndarray} の Frond/Back 列を swap の行だけその場で入れ替える
+
+    swap を省略すると BackFrameNum が奇数の行を入れ替える。入れ替えた行のマスクを返す。
+    """
+    if swap is None:
+        swap = columns["BackFrameNum"] % 2 != 0
+    for front, back in FRAME_COLUMN_PAIRS:
+        front_values, back_values = columns[front], columns[back]
+        swapped_front = np.where(swap, back_values, front_values)
+        np.copyto(back_values, front_values, where=swap)
+        front_values[...] = swapped_front
+    return swap
+
+
+def _normalized_columns(arrays):
+    """Frond/Back を入れ替えた列を {列名 + 接尾辞: ndarray} で返す（対象の列がなければ空）"""
+    names = [name for pair in FRAME_COLUMN_PAIRS for name in pair]
+    if not all(name in arrays and arrays[name].dtype.kind in "iuf" for name in names):
+        return {}
+    normalized = {name: arrays[name].copy() for name in names}
+    swap_front_back(normalized)
+    return {name + NORMALIZED_SUFFIX: values for name, values in normalized.items()}
+
+
+def _is_fresh(entry, signature):
+    return (entry is not None
+            and entry.get("size") == signature["size"]
+            and entry.get("mtime_ns") == signature["mtime_ns"])
+
+
+def _save_column(path, array):
+    # 同じ試行を別のプロセスが同時に変換・読み込みしていても、書きかけのファイルを見せない
+    _replace_atomically(path, lambda f: np.save(f, array, allow_pickle=False))
+
+
+@profiled
+def ingest_file(data_dir, filename, index=None):
+    """1つのCSVを列ファイルに変換し、索引エントリを返す
+
+    index を渡すとそのエントリも書き換える（ディスクの索引には update_index で書く）。
+    """
+    csv_path = os.path.join(data_dir, filename)
+    df = read_csv_clean(csv_path)
+
+    trial_dir = os.path.join(store_dir(data_dir), os.path.splitext(filename)[0])
+    os.makedirs(trial_dir, exist_ok=True)
+
+    arrays = {}
+    columns = []
+    for i, column in enumerate(df.columns):
+        array, labels = _to_array(df[column])
+        column_file = _column_filename(i, column)
+        _save_column(os.path.join(trial_dir, column_file), array)
+        info = {"name": column, "file": column_file, "dtype": array.dtype.str}
+        if labels is not None:
+            info["labels"] = labels
+        columns.append(info)
+        arrays[column] = array
+
+    # 正規化済みの列は元の列の後ろの番号で保存する（既定の読み込みには含めない）
+    for i, (column, array) in enumerate(_normalized_columns(arrays).items(), start=len(columns)):
+        column_file = _column_filename(i, column)
+        _save_column(os.path.join(trial_dir, column_file), array)
+        columns.append({"name": column, "file": column_file, "dtype": array.dtype.str,
+                        "derived": True})
+
+    entry = dict(_file_signature(csv_path))
+    entry["rows"] = len(df)
+    entry["columns"] = columns
+    if index is not None:
+        index["trials"][filename] = entry
+    return entry
+
+
+@profiled
+def ingest_directory(data_dir, force=False):
+    """ディレクトリ内の全CSVをストアに取り込む（変更のないファイルは飛ばす）"""
+    index = load_index(data_dir)
+    filenames = sorted(f for f in os.listdir(data_dir) if f.endswith(".csv"))
+
+    entries = {}
+    for filename in filenames:
+        signature = _file_signature(os.path.join(data_dir, filename))
+        if not force and _is_fresh(index["trials"].get(filename), signature):
+            continue
+        try:
+            entries[filename] = ingest_file(data_dir, filename)
+        except Exception as e:
+            print(f"取り込みエラー: {filename} - {e}")
+    converted = len(entries)
+
+    # 削除されたCSVのエントリは索引から外す
+    stale = set(index["trials"]) - set(filenames)
+    if entries or stale or not os.path.exists(os.path.join(store_dir(data_dir), INDEX_FILENAME)):
+        index = update_index(data_dir, entries, keep=set(filenames))
+    print(f"{data_dir}: {converted}/{len(filenames)} ファイルを変換しました")
+    return index
+
+
+def _load_columns(data_dir, filename, entry, columns, mmap):
+    trial_dir = os.path.join(store_dir(data_dir), os.path.splitext(filename)[0])
+    by_name = {c["name"]: c for c in entry["columns"]}
+    if columns is None:
+        columns = [c["name"] for c in entry["columns"] if not c.get("derived")]
+
+    mmap_mode = "r" if mmap else None
+    data = {}
+    for column in columns:
+        if column not in by_name:
+            raise KeyError(f"{filename} に列 '{column}' がありません")
+        info = by_name[column]
+        array = np.load(os.path.join(trial_dir, info["file"]),
+                        mmap_mode=mmap_mode, allow_pickle=False)
+        if "labels" in info:
+            array = np.asarray(info["labels"], dtype=str)[array]
+        data[column] = array
+    profile_add(rows=entry["rows"], nbytes=sum(array.nbytes for array in data.values()))
+    return data
+
+
+def load_trial_arrays(path, columns=None, mmap=True):
+    """試行の列を {列名: ndarray} で返す（ストアが古ければ先に変換する）"""
+    data_dir, filename = os.path.split(os.path.abspath(path))
+    index = load_index(data_dir)
+    entry = index["trials"].get(filename)
+    if not _is_fresh(entry, _file_signature(path)):
+        entry = ingest_file(data_dir, filename)
+        update_index(data_dir, {filename: entry})
+    return _load_columns(data_dir, filename, entry, columns, mmap)
+
+
+def read_trial(path, columns=None):
+    """pd.read_csv の代替：列名の空白を削除済みのDataFrameを返す"""
+    arrays = load_trial_arrays(path, columns, mmap=False)
+    return pd.DataFrame(arrays)
+
+
+def read_normalized_trial(path, columns=None, until=None):
+    """read_trial と同じだが、Frond/Back の列は取り込み時に入れ替えた値を返す
+
+    until（秒）を渡すと、Time が until 以下の行だけを入れ替えた値にする。
+    """
+    arrays = load_trial_arrays(path, columns, mmap=False)
+    names = [name for pair in FRAME_COLUMN_PAIRS for name in pair if name in arrays]
+    if names:
+        normalized = load_trial_arrays(path, [name + NORMALIZED_SUFFIX for name in names], mmap=False)
+        if until is not None:
+            time = arrays["Time"] if "Time" in arrays else load_trial_arrays(path, ["Time"])["Time"]
+            window = time / 1000 <= until
+        for name in names:
+            values = normalized[name + NORMALIZED_SUFFIX]
+            arrays[name] = values if until is None else np.where(window, values, arrays[name])
+    return pd.DataFrame(arrays)
+
+
+def load_trials(data_dir, filenames=None, columns=None, mmap=True):
+    """複数試行の列を {ファイル名: {列名: ndarray}} で返す"""
+    index = ingest_directory(data_dir)
+    if filenames is None:
+        filenames = sorted(index["trials"])
+    return {
+        filename: _load_columns(data_dir, filename, index["trials"][filename], columns, mmap)
+        for filename in filenames
+        if filename in index["trials"]
+    }
+
+
+def main(argv):
+    data_dirs = argv[1:] or DEFAULT_DATA_DIRS
+    force = "--force" in data_dirs
+    data_dirs = [d for d in data_dirs if d != "--force"]
+    for data_dir in data_dirs:
+        if os.path.isdir(data_dir):
+            ingest_directory(data_dir, force=force)
+        else:
+            print(f"ディレクトリが見つかりません: {data_dir}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,102 @@
+"""
+ベクション応答のイベント索引
+
+'Vection Response' 列（0/1）を試行ごとに一度だけランレングス符号化し、
+応答が 1 の区間 [start, end) の行番号と時刻だけを持つ VectionEvents にする。
+潜時・総持続時間・区間の平均長・停止から再発までの時間は、数千行の列を
+走査し直さずに、この数十〜数百個の区間に対するベクトル演算で求める。
+
+区間は analysis_cache の試行キャッシュ（内容のハッシュがキー）に保存されるので、
+2回目以降はCSVを読まない。
+
+    events = load_events(paths)
+    events[path].latency(), events[path].reoccurrence_times()
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+from analysis_cache import AnalysisCache
+from trial_store import load_trial_arrays
+
+TIME_COLUMN = 'Time'
+RESPONSE_COLUMN = 'Vection Response'
+
+
+class VectionEvents(NamedTuple):
+    """応答が 1 の区間 [starts[i], ends[i]) と、その時刻（秒）"""
+    starts: np.ndarray        # 区間の最初の行
+    ends: np.ndarray          # 区間の次の行（最後まで続く場合は n_rows）
+    start_times: np.ndarray   # time[starts]
+    end_times: np.ndarray     # time[ends]（最後まで続く場合は NaN）
+    durations: np.ndarray     # 区間内の行の time.diff() の合計
+    n_rows: int
+
+    def latency(self):
+        """最初に応答が 1 になった時刻（応答がなければ NaN）"""
+        return float(self.start_times[0]) if len(self.starts) else np.nan
+
+    def total_duration(self):
+        """応答が 1 の行の time.diff() の合計"""
+        return float(self.durations.sum())
+
+    def mean_block_duration(self):
+        """長さが 0 より大きい連続区間の平均持続時間（区間がなければ 0）"""
+        positive = self.durations[self.durations > 0]
+        return float(positive.mean()) if len(positive) else 0.0
+
+    def reoccurrence_times(self):
+        """各停止 (1→0) から次の再発 (0→1) までの時間の配列
+
+        再発は直前の行が 0 の区間の開始（先頭行から始まる区間は含めない）、
+        停止はファイルの終わりより前に終わる区間の終了。
+        """
+        stopped = self.ends < self.n_rows
+        stop_rows = self.ends[stopped]
+        stop_times = self.end_times[stopped]
+        reoccurs = self.starts > 0
+        reoccur_rows = self.starts[reoccurs]
+        reoccur_times = self.start_times[reoccurs]
+
+        following = np.searchsorted(reoccur_rows, stop_rows, side='right')
+        has_next = following < len(reoccur_rows)
+        return reoccur_times[following[has_next]] - stop_times[has_next]
+
+
+def build_events(time, response):
+    """時刻（秒）と応答の列から VectionEvents を作る"""
+    time = np.asarray(time, dtype=float)
+    on = np.asarray(response) == 1
+    n_rows = len(on)
+
+    edges = np.diff(np.concatenate(([0], on.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    # 区間内の time.diff()（先頭行は 0）の合計 = time[end-1] - time[start-1]
+    before_start = time[np.maximum(starts - 1, 0)]
+    durations = time[ends - 1] - before_start
+
+    end_times = np.full(len(ends), np.nan)
+    inside = ends < n_rows
+    end_times[inside] = time[ends[inside]]
+
+    return VectionEvents(starts, ends, time[starts], end_times, durations, n_rows)
+
+
+def trial_events(path):
+    """試行ファイルから VectionEvents を作る（Time はミリ秒）"""
+    arrays = load_trial_arrays(path, [TIME_COLUMN, RESPONSE_COLUMN])
+    return build_events(arrays[TIME_COLUMN] / 1000, arrays[RESPONSE_COLUMN])
+
+
+def load_events(paths, cache=None):
+    """{パス: VectionEvents} を返す（区間は試行キャッシュから読み、変わったファイルだけ作る）"""
+    own_cache = cache is None
+    if own_cache:
+        cache = AnalysisCache("vection_events")
+    events = {path: cache.trial_result(path, 'vection_events', trial_events) for path in paths}
+    if own_cache:
+        cache.save()
+    return events
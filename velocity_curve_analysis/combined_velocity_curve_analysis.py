@@ -3,6 +3,11 @@ import matplotlib.pyplot as plt
 import numpy as np
 import os
 from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from velocity_curves import velocity_curve
+from velocity_parameters import PARAM_NAMES, last_step_values
 
 # 设置中文字体
 plt.rcParams['font.sans-serif'] = ['SimHei', 'DejaVu Sans']
@@ -13,17 +18,17 @@ def extract_parameters(df):
     # 清理列名（去除空格）
     df.columns = df.columns.str.strip()
     
-    # 参数提取 - 使用正确的StepNumber方法
-    v0_series = df[df["StepNumber"] == 0]["Velocity"]
-    V0 = v0_series.iloc[-1] if not v0_series.empty else 0
-    
-    A1 = df[df["StepNumber"] == 1]["Amplitude"].iloc[-1] if not df[df["StepNumber"] == 1].empty else 0
-    φ1 = df[df["StepNumber"] == 2]["Amplitude"].iloc[-1] if not df[df["StepNumber"] == 2].empty else 0
-    A2 = df[df["StepNumber"] == 3]["Amplitude"].iloc[-1] if not df[df["StepNumber"] == 3].empty else 0
-    φ2 = df[df["StepNumber"] == 4]["Amplitude"].iloc[-1] if not df[df["StepNumber"] == 4].empty else 0
+    # 参数提取 - 每个StepNumber的最后一个值（单次扫描）
+    V0, A1, φ1, A2, φ2 = last_step_values(df["StepNumber"].to_numpy(),
+                                          df["Amplitude"].to_numpy(),
+                                          df["Velocity"].to_numpy())[0]
     
     return V0, A1, φ1, A2, φ2
 
+def params_curve(params, t):
+    """参数字典的速度曲线（t 以弧度为单位，即 ω = 1）"""
+    return velocity_curve([params[name] for name in PARAM_NAMES], t, omega=1)
+
 def calculate_mean_parameters(participant_files):
     """计算参与者的平均参数"""
     all_params = []
@@ -61,12 +66,12 @@ def plot_combined_velocity_curves(linear_params, dynamic_params, ax, participant
     
     # 绘制LinearOnly曲线（蓝色）
     if linear_params:
-        velocity_linear = linear_params['V0'] + linear_params['A1'] * np.sin(t + linear_params['φ1'] + np.pi) + linear_params['A2'] * np.sin(2*t + linear_params['φ2'] + np.pi)
+        velocity_linear = params_curve(linear_params, t)
         ax.plot(t, velocity_linear, 'b-', linewidth=2, label='LinearOnly')
     
     # 绘制Dynamic曲线（红色）
     if dynamic_params:
-        velocity_dynamic = dynamic_params['V0'] + dynamic_params['A1'] * np.sin(t + dynamic_params['φ1'] + np.pi) + dynamic_params['A2'] * np.sin(2*t + dynamic_params['φ2'] + np.pi)
+        velocity_dynamic = params_curve(dynamic_params, t)
         ax.plot(t, velocity_dynamic, 'r-', linewidth=2, label='Dynamic')
     
     ax.set_xlabel(f'Participant {participant_letter}', fontsize=12, fontweight='bold')
@@ -159,7 +164,7 @@ def main():
                 
                 # 计算速度范围
                 t = np.linspace(0, 4*np.pi, 1000)
-                velocity = linear_params['V0'] + linear_params['A1'] * np.sin(t + linear_params['φ1'] + np.pi) + linear_params['A2'] * np.sin(2*t + linear_params['φ2'] + np.pi)
+                velocity = params_curve(linear_params, t)
                 all_velocities.extend(velocity)
         
         # 计算Dynamic平均参数
@@ -173,7 +178,7 @@ def main():
                 
                 # 计算速度范围
                 t = np.linspace(0, 4*np.pi, 1000)
-                velocity = dynamic_params['V0'] + dynamic_params['A1'] * np.sin(t + dynamic_params['φ1'] + np.pi) + dynamic_params['A2'] * np.sin(2*t + dynamic_params['φ2'] + np.pi)
+                velocity = params_curve(dynamic_params, t)
                 all_velocities.extend(velocity)
     
     # 计算统一的y轴范围
@@ -0,0 +1,118 @@
+"""
+v(t) 曲線の一括評価
+
+実験で使う2種類の速度関数はどちらも同じ基底 [1, sin ωt, cos ωt, sin 2ωt, cos 2ωt] の
+線形結合で書ける。
+
+    位相形式:   v(t) = V0 + A1·sin(ωt + φ1 + π) + A2·sin(2ωt + φ2 + π)
+    フーリエ形式: v(t) = V0 + A1·sin ωt + A2·cos ωt + A3·sin 2ωt + A4·cos 2ωt
+
+時間軸ごとに基底行列を一度だけ作ってキャッシュし、パラメータ行列 (n, 5) を係数行列に
+変換して行列積1回で (n, len(t)) の曲線をまとめて求める。
+位相形式の +π オフセットは実験プログラムの実装に合わせたもの。
+"""
+
+import numpy as np
+
+OMEGA = 2 * np.pi
+PHASE_FORM = 'phase'
+FOURIER_FORM = 'fourier'
+
+# (len, t0, t1, ω, 内容のハッシュ) -> 基底行列 (len(t), 5)
+_basis_cache = {}
+_BASIS_CACHE_SIZE = 32
+
+
+def curve_basis(t, omega=OMEGA):
+    """時間軸 t に対する基底行列 [1, sin ωt, cos ωt, sin 2ωt, cos 2ωt] を返す"""
+    t = np.asarray(t, dtype=float)
+    key = (len(t), float(t[0]) if len(t) else 0.0, float(t[-1]) if len(t) else 0.0,
+           float(omega), hash(t.tobytes()))
+    basis = _basis_cache.get(key)
+    if basis is None:
+        wt = omega * t
+        basis = np.column_stack([np.ones_like(t), np.sin(wt), np.cos(wt),
+                                 np.sin(2 * wt), np.cos(2 * wt)])
+        basis.setflags(write=False)
+        if len(_basis_cache) >= _BASIS_CACHE_SIZE:
+            _basis_cache.pop(next(iter(_basis_cache)))
+        _basis_cache[key] = basis
+    return basis
+
+
+def phase_coefficients(params):
+    """位相形式 (V0, A1, φ1, A2, φ2) を基底の係数に変換する
+
+    A·sin(x + φ + π) = -A·cos φ·sin x - A·sin φ·cos x を使う。
+    """
+    params = np.atleast_2d(np.asarray(params, dtype=float))
+    V0, A1, φ1, A2, φ2 = params.T
+    return np.column_stack([V0,
+                            -A1 * np.cos(φ1), -A1 * np.sin(φ1),
+                            -A2 * np.cos(φ2), -A2 * np.sin(φ2)])
+
+
+def fourier_coefficients(params):
+    """フーリエ形式 (V0, A1, A2, A3, A4) はそのまま基底の係数になる"""
+    return np.atleast_2d(np.asarray(params, dtype=float))
+
+
+def _coefficients(params, form):
+    if form == PHASE_FORM:
+        return phase_coefficients(params)
+    if form == FOURIER_FORM:
+        return fourier_coefficients(params)
+    raise ValueError(f"未知の曲線形式です: {form}")
+
+
+def evaluate_curves(params, t, form=PHASE_FORM, omega=OMEGA):
+    """パラメータ行列 (n, 5) の全曲線を (n, len(t)) で返す"""
+    return _coefficients(params, form) @ curve_basis(t, omega).T
+
+
+def velocity_curve(par, t, form=PHASE_FORM, omega=OMEGA):
+    """1組のパラメータに対する v(t) を返す（t がスカラーならスカラーを返す）"""
+    times = np.atleast_1d(np.asarray(t, dtype=float))
+    v = evaluate_curves(par, times, form, omega)[0]
+    return v[0] if np.ndim(t) == 0 else v
+
+
+def curve_bands(params, t, form=PHASE_FORM, omega=OMEGA, band='parameter'):
+    """試行群のパラメータから平均曲線と ±1SD の帯を (mean, lower, upper) で返す
+
+    band='parameter' は既存の図と同じく v(平均±SD) を、
+    band='curve' は各試行の曲線を評価して時刻ごとの平均±SD を求める。
+    """
+    params = np.atleast_2d(np.asarray(params, dtype=float))
+    if band == 'parameter':
+        mean = params.mean(axis=0)
+        sd = params.std(axis=0)
+        curves = evaluate_curves(np.vstack([mean, mean - sd, mean + sd]), t, form, omega)
+        return curves[0], curves[1], curves[2]
+    if band == 'curve':
+        curves = evaluate_curves(params, t, form, omega)
+        mean = curves.mean(axis=0)
+        sd = curves.std(axis=0)
+        return mean, mean - sd, mean + sd
+    raise ValueError(f"未知の帯の種類です: {band}")
+
+
+def grouped_curve_bands(params, groups, t, form=PHASE_FORM, omega=OMEGA):
+    """グループ（被験者×条件など）ごとの v(平均±SD) を行列積1回で求める
+
+    params は (n, 5)、groups は長さ n のラベル列。
+    戻り値は {グループ: (mean, lower, upper)}。
+    """
+    params = np.atleast_2d(np.asarray(params, dtype=float))
+    groups = np.asarray(groups)
+    labels = list(dict.fromkeys(groups.tolist()))
+
+    rows = []
+    for label in labels:
+        members = params[groups == label]
+        mean = members.mean(axis=0)
+        sd = members.std(axis=0)
+        rows.extend([mean, mean - sd, mean + sd])
+
+    curves = evaluate_curves(np.array(rows), t, form, omega).reshape(len(labels), 3, -1)
+    return {label: (c[0], c[1], c[2]) for label, c in zip(labels, curves)}
@@ -0,0 +1,342 @@
+"""
+ノブで調整した速度パラメータの、Velocity 列への非線形最小二乗フィット
+
+extract_velocity_parameters は StepNumber ごとの最後のノブの値をパラメータとみなすだけで、
+実際に提示された速度がそのパラメータどおりだったかは確かめていない。ここでは各試行の
+Velocity 列（提示中の速度が記録されている）に、各 StepNumber で実際に提示される信号の
+モデルを当てはめる。
+
+実験プログラムは調整中の成分だけを提示する。位相形式（Phase）では StepNumber ごとに
+1 Hz の正弦波が1つだけで、v(t) = V0 + A1·sin(ωt + φ1 + π) + A2·sin(2ωt + φ2 + π) を
+合成した曲線はどの区間にも現れない（2ω の成分もない）。
+
+    StepNumber 0: V0
+    StepNumber 1: V0 + A1·sin(x)
+    StepNumber 2: V0 + A1·sin(x + φ1 + c)    c は π（BrightnessData 以降）または 0（予備実験）
+    StepNumber 3: V0 + A2·sin(x + φ1)
+    StepNumber 4: V0 + A2·sin(x + φ2)
+
+フーリエ形式（Fourier）では、StepNumber k で A1..Ak までの成分を足した
+V0 + Σ Aj·bj(x)（b = [sin x, cos x, sin 2x, cos 2x]）が提示される。
+
+x = ω·(t·(1 + drift) + lag)。lag は Velocity の記録と Time 列のずれ（おおよそ1フレーム）、
+drift は Time 列の時計の進み方のずれ（Time は float32 で積算されていて、長い試行では
+1e-4 程度ずれる）。どちらも刺激のパラメータではないので、試行ごとに推定する。
+
+- 当てはめる区間は、各 StepNumber の最後の FIT_WINDOW_SECONDS 秒のうち、調整中の
+  パラメータ（Amplitude 列）が最終値に落ち着いてからの行。全区間をまとめてフィットする
+- まずノブから得たパラメータ（trial_velocity_parameters）を固定して lag と drift だけを求め、
+  その残差（knob_residuals）でノブの値が記録を再現しているかを確かめる。続けてそこから
+  パラメータも動かしてフィットする。reproduces() は両方の残差が小さいかを返す
+- 位相形式の c は (φ1, c, A2, φ2) → (φ1 + π, c + π, -A2, φ2 + π) としても同じ信号になり、
+  Velocity だけでは決まらない。c はノブの値を信号にするときの約束なので、ノブの
+  パラメータが記録をよく再現する方を選ぶ
+- ヤコビアンは解析的に求める
+- 試行をいくつかずつまとめてプロセスプールでフィットする。ワーカーが同じ列指向ストアに
+  同時に取り込まないよう、データディレクトリは先に親プロセスで取り込んでおく
+- 残差と、パラメータ（lag・drift を含む）の共分散 s²·(JᵀJ)⁺ を返す
+
+    fits = fit_trials(find_trials("public/BrightnessData", pattern="Phase"))
+    table = fit_table(fits)
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import least_squares
+
+from knob_analytics import ADJUSTMENT_THRESHOLD
+from trial_store import ingest_directory, load_trial_arrays
+from velocity_curves import FOURIER_FORM, OMEGA, PHASE_FORM
+from velocity_parameters import FOURIER_PARAM_NAMES, N_STEPS, PARAM_NAMES, trial_velocity_parameters
+
+FIT_COLUMNS = ['Time', 'StepNumber', 'Amplitude', 'Velocity']
+FIT_WINDOW_SECONDS = 2.0
+MIN_FIT_SAMPLES = 30
+CLOCK_NAMES = ['lag', 'drift']
+# 残差RMSがこれ以下なら記録を再現しているとみなす（Velocity の単位）
+REPRODUCTION_TOLERANCE = 0.03
+# 位相形式の StepNumber ごとの (振幅, 位相) のパラメータ番号（位相がない段階は None）
+PHASE_STEP_TERMS = {1: (1, None), 2: (1, 2), 3: (3, 2), 4: (3, 4)}
+# StepNumber 2 の位相に加わるオフセットの候補
+STEP2_OFFSETS = (np.pi, 0.0)
+# 1つのワーカーにまとめて渡す試行数
+TRIALS_PER_TASK = 8
+
+
+class VelocityFit(NamedTuple):
+    """1試行分のフィット結果（時間は秒）"""
+    path: str
+    form: str
+    step2_offset: Optional[float]  # 位相形式の StepNumber 2 の位相オフセット（フーリエ形式は None）
+    initial: np.ndarray       # ノブから得たパラメータ
+    params: np.ndarray        # フィットしたパラメータ
+    clock: np.ndarray         # フィットした (lag, drift)
+    covariance: np.ndarray    # パラメータと (lag, drift) の s²·(JᵀJ)⁺
+    residuals: np.ndarray     # フィットした信号 - Velocity
+    knob_clock: np.ndarray    # ノブのパラメータを固定して求めた (lag, drift)
+    knob_residuals: np.ndarray  # ノブのパラメータで作った信号 - Velocity
+    steps: np.ndarray         # 各残差の StepNumber
+    t_start: float
+    t_end: float
+    success: bool
+
+    @property
+    def n_samples(self):
+        return len(self.residuals)
+
+    def residual_rms(self):
+        return float(np.sqrt(np.mean(self.residuals ** 2)))
+
+    def knob_rms(self):
+        return float(np.sqrt(np.mean(self.knob_residuals ** 2)))
+
+    def reproduces(self, tolerance=REPRODUCTION_TOLERANCE):
+        """ノブの値から作った信号とフィットした信号が、どちらも記録を再現しているか"""
+        return bool(self.success and self.residual_rms() <= tolerance
+                    and self.knob_rms() <= tolerance)
+
+    def standard_errors(self):
+        return np.sqrt(np.clip(np.diag(self.covariance), 0, None))
+
+
+def param_names(form):
+    return PARAM_NAMES if form == PHASE_FORM else FOURIER_PARAM_NAMES
+
+
+def presented_velocity(params, clock, t, step, form=PHASE_FORM, step2_offset=np.pi, omega=OMEGA):
+    """StepNumber ごとに提示される速度と、(params, lag, drift) についてのヤコビアンを返す"""
+    t = np.asarray(t, dtype=float)
+    step = np.asarray(step)
+    params = np.asarray(params, dtype=float)
+    lag, drift = clock
+    x = omega * (t * (1 + drift) + lag)
+    values = np.full(len(t), params[0])
+    jac = np.zeros((len(t), len(params) + len(CLOCK_NAMES)))
+    jac[:, 0] = 1.0
+    # dv/dx。lag と drift の列は最後に dx/dlag = ω, dx/ddrift = ω·t を掛ける
+    slope = np.zeros(len(t))
+
+    if form == PHASE_FORM:
+        for s, (a, p) in PHASE_STEP_TERMS.items():
+            rows = np.flatnonzero(step == s)
+            if not len(rows):
+                continue
+            phase = x[rows] + (params[p] if p is not None else 0.0) + (step2_offset if s == 2 else 0.0)
+            sin, cos = np.sin(phase), np.cos(phase)
+            values[rows] += params[a] * sin
+            jac[rows, a] = sin
+            if p is not None:
+                jac[rows, p] = params[a] * cos
+            slope[rows] = params[a] * cos
+    elif form == FOURIER_FORM:
+        sin1, cos1, sin2, cos2 = np.sin(x), np.cos(x), np.sin(2 * x), np.cos(2 * x)
+        basis = (sin1, cos1, sin2, cos2)
+        derivative = (cos1, -sin1, 2 * cos2, -2 * sin2)
+        for j in range(1, N_STEPS):
+            # 成分 j は StepNumber j 以降で提示される
+            rows = step >= j
+            values[rows] += params[j] * basis[j - 1][rows]
+            jac[rows, j] = basis[j - 1][rows]
+            slope[rows] += params[j] * derivative[j - 1][rows]
+    else:
+        raise ValueError(f"未知の曲線形式です: {form}")
+    jac[:, -2] = slope * omega
+    jac[:, -1] = slope * omega * t
+    return values, jac
+
+
+def fit_window(arrays, window=FIT_WINDOW_SECONDS, threshold=ADJUSTMENT_THRESHOLD):
+    """フィットに使う行番号の配列を返す
+
+    StepNumber 0..4 の各区間の最後の window 秒のうち、Amplitude（調整中のパラメータ）が
+    その区間の最終値から threshold 以内に落ち着いてからの行。最後の StepNumber まで
+    進んでいない試行（FunctionMix など）は空の配列を返す。
+    """
+    step = np.asarray(arrays['StepNumber'], dtype=float)
+    t = np.asarray(arrays['Time'], dtype=float) / 1000
+    amplitude = np.asarray(arrays['Amplitude'], dtype=float)
+    velocity = np.asarray(arrays['Velocity'], dtype=float)
+    valid = ~np.isnan(step) & ~np.isnan(velocity) & ~np.isnan(t) & ~np.isnan(amplitude)
+    present = np.unique(step[valid])
+    if not all(s in present for s in range(N_STEPS)):
+        return np.zeros(0, dtype=np.int64)
+
+    windows = []
+    for s in range(N_STEPS):
+        rows = np.flatnonzero(valid & (step == s))
+        rows = rows[t[rows] >= t[rows[-1]] - window]
+        moving = np.flatnonzero(np.abs(amplitude[rows] - amplitude[rows[-1]]) > threshold)
+        windows.append(rows[moving[-1] + 1:] if len(moving) else rows)
+    return np.concatenate(windows)
+
+
+def fit_clock(t, velocity, step, params, form=PHASE_FORM, step2_offset=np.pi, omega=OMEGA):
+    """パラメータを固定して (lag, drift) だけを求め、(clock, residuals) を返す"""
+    n = len(params)
+
+    def residual(clock):
+        return presented_velocity(params, clock, t, step, form, step2_offset, omega)[0] - velocity
+
+    def jacobian(clock):
+        return presented_velocity(params, clock, t, step, form, step2_offset, omega)[1][:, n:]
+
+    result = least_squares(residual, np.zeros(len(CLOCK_NAMES)), jac=jacobian, method='lm')
+    return result.x, result.fun
+
+
+def fit_velocity(t, velocity, step, initial, clock=(0.0, 0.0), form=PHASE_FORM,
+                 step2_offset=np.pi, omega=OMEGA):
+    """時刻 t（秒）・StepNumber ごとの Velocity に提示信号のモデルを当てはめる
+
+    initial と clock を初期値に、パラメータと (lag, drift) を同時に求める。
+    (params, clock, covariance, residuals, success) を返す。
+    """
+    t = np.asarray(t, dtype=float)
+    velocity = np.asarray(velocity, dtype=float)
+    step = np.asarray(step)
+    n = len(initial)
+
+    def residual(p):
+        return presented_velocity(p[:n], p[n:], t, step, form, step2_offset, omega)[0] - velocity
+
+    def jacobian(p):
+        return presented_velocity(p[:n], p[n:], t, step, form, step2_offset, omega)[1]
+
+    start = np.concatenate([np.asarray(initial, dtype=float), clock])
+    method = 'lm' if len(t) >= len(start) else 'trf'
+    result = least_squares(residual, start, jac=jacobian, method=method)
+
+    params = result.x[:n].copy()
+    if form == PHASE_FORM:
+        params[[2, 4]] = np.mod(params[[2, 4]], 2 * np.pi)
+    # 振幅が 0 の成分の位相は決まらないので、擬似逆行列で共分散を求める
+    dof = max(len(t) - len(result.x), 1)
+    s2 = float(result.fun @ result.fun) / dof
+    covariance = s2 * np.linalg.pinv(result.jac.T @ result.jac)
+    return params, result.x[n:], covariance, result.fun, bool(result.success)
+
+
+def fit_trial(path, form=PHASE_FORM):
+    """1試行をフィットして VelocityFit を返す（当てはめる区間がなければ None）"""
+    arrays = load_trial_arrays(path, FIT_COLUMNS)
+    rows = fit_window(arrays)
+    if len(rows) < MIN_FIT_SAMPLES:
+        return None
+    t = arrays['Time'][rows] / 1000
+    step = arrays['StepNumber'][rows]
+    velocity = arrays['Velocity'][rows]
+    initial = np.array(list(trial_velocity_parameters(path).values()))
+
+    # ノブのパラメータで記録を再現できるか（位相形式は c の候補ごと）
+    offsets = STEP2_OFFSETS if form == PHASE_FORM else (None,)
+    knob_fits = []
+    for offset in offsets:
+        knob_clock, knob_residuals = fit_clock(t, velocity, step, initial, form,
+                                               np.pi if offset is None else offset)
+        knob_fits.append((float(knob_residuals @ knob_residuals), offset, knob_clock, knob_residuals))
+    _, step2_offset, knob_clock, knob_residuals = min(knob_fits, key=lambda knob_fit: knob_fit[0])
+
+    params, clock, covariance, residuals, success = fit_velocity(
+        t, velocity, step, initial, knob_clock, form,
+        np.pi if step2_offset is None else step2_offset)
+    return VelocityFit(path, form, step2_offset, initial, params, clock, covariance, residuals,
+                       knob_clock, knob_residuals, np.asarray(step), float(t.min()),
+                       float(t.max()), success)
+
+
+def _fit_chunk(paths, form):
+    fits = []
+    for path in paths:
+        try:
+            fits.append(fit_trial(path, form))
+        except Exception as e:
+            print(f"フィットエラー: {os.path.basename(path)} - {e}")
+            fits.append(None)
+    return fits
+
+
+def fit_trials(trials, form=PHASE_FORM, max_workers=None, trials_per_task=TRIALS_PER_TASK):
+    """試行（パスまたは TrialRecord）をまとめてフィットし、{パス: VelocityFit} を返す
+
+    当てはめる区間がない試行（FunctionMix など）は含めない。
+    max_workers=1 またはタスクが1つだけの場合は現在のプロセスで計算する。
+    試行のデータディレクトリは、ワーカーに渡す前にこのプロセスでストアに取り込む。
+    """
+    paths = [getattr(trial, 'path', trial) for trial in trials]
+    for data_dir in dict.fromkeys(os.path.dirname(os.path.abspath(path)) for path in paths):
+        ingest_directory(data_dir)
+    chunks = [paths[i:i + trials_per_task] for i in range(0, len(paths), trials_per_task)]
+    if max_workers is None:
+        max_workers = min(len(chunks), os.cpu_count() or 1)
+
+    if max_workers <= 1 or len(chunks) <= 1:
+        results = [_fit_chunk(chunk, form) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_fit_chunk, chunks, [form] * len(chunks)))
+
+    return {fit.path: fit for chunk in results for fit in chunk if fit is not None}
+
+
+def fit_table(fits, names=None):
+    """フィット結果を1行1試行の DataFrame にまとめる
+
+    列は knob_<名前>（ノブの値）、<名前>（フィット値）、se_<名前>（標準誤差）と、
+    lag, se_lag, drift, se_drift, step2_offset, n_samples, residual_rms, residual_max,
+    knob_rms, reproduces, t_start, t_end, success。
+    """
+    rows = []
+    for path, fit in fits.items():
+        row = {'path': path, 'filename': os.path.basename(path)}
+        fit_names = names or param_names(fit.form)
+        errors = fit.standard_errors()
+        for name, initial, value, se in zip(fit_names, fit.initial, fit.params, errors):
+            row[f'knob_{name}'] = initial
+            row[name] = value
+            row[f'se_{name}'] = se
+        for name, value, se in zip(CLOCK_NAMES, fit.clock, errors[len(fit.params):]):
+            row[name] = value
+            row[f'se_{name}'] = se
+        row.update({
+            'step2_offset': fit.step2_offset,
+            'n_samples': fit.n_samples,
+            'residual_rms': fit.residual_rms(),
+            'residual_max': float(np.abs(fit.residuals).max()),
+            'knob_rms': fit.knob_rms(),
+            'reproduces': fit.reproduces(),
+            't_start': fit.t_start,
+            't_end': fit.t_end,
+            'success': fit.success,
+        })
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    from trial_catalog import find_trials
+
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join("public", "BrightnessData")
+    form = sys.argv[2] if len(sys.argv) > 2 else PHASE_FORM
+    records = find_trials(data_dir, pattern="Fourier" if form == FOURIER_FORM else "Phase")
+
+    start = time.perf_counter()
+    fits = fit_trials(records, form)
+    elapsed = time.perf_counter() - start
+
+    table = fit_table(fits)
+    print(f"{len(fits)}/{len(records)} 試行をフィットしました（{elapsed:.2f} 秒）")
+    if len(table):
+        names = param_names(form)
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(table[['filename', *names, 'lag', 'residual_rms', 'knob_rms', 'n_samples']]
+                  .round(3).to_string(index=False))
+        failed = table[~table['reproduces']]
+        print(f"ノブの値とフィットの両方が記録を再現した試行: {len(table) - len(failed)}/{len(table)}")
+        for filename in failed['filename']:
+            print(f"  再現できません: {filename}")
@@ -0,0 +1,125 @@
+"""
+速度パラメータの一括抽出
+
+Phase / Fourier 実験では、各 StepNumber で調整された最後の値がその試行のパラメータになる
+（StepNumber 0 は Velocity 列、1〜4 は Amplitude 列）。
+従来は StepNumber ごとにブールマスクを作って最後の値を取っていたが、ここでは全試行の
+StepNumber 列を連結し、(試行, StepNumber) の最後の出現位置を一度の走査で求める。
+
+    params, meta = extract_trial_parameters(find_trials(data_dir, pattern="Phase"))
+    params.shape  # (試行数, 5)
+"""
+
+import numpy as np
+import pandas as pd
+
+from profiling import profiled
+from trial_store import load_trial_arrays
+
+PARAM_NAMES = ['V0', 'A1', 'φ1', 'A2', 'φ2']
+FOURIER_PARAM_NAMES = ['V0', 'A1', 'A2', 'A3', 'A4']
+N_STEPS = 5
+PARAM_COLUMNS = ['StepNumber', 'Amplitude', 'Velocity']
+
+
+def last_step_values(step, amplitude, velocity, segment_ids=None, n_segments=1):
+    """(区間, StepNumber) ごとの最後の値を (n_segments, N_STEPS) の行列で返す
+
+    step, amplitude, velocity は連結された列配列。segment_ids は各行の試行番号
+    （None の場合は全体を1試行とみなす）。該当する行がない要素は 0 になる。
+    """
+    step = np.asarray(step)
+    n_rows = len(step)
+    if segment_ids is None:
+        segment_ids = np.zeros(n_rows, dtype=np.int64)
+
+    params = np.zeros((n_segments, N_STEPS))
+    valid = (step >= 0) & (step < N_STEPS)
+    if not valid.any():
+        return params
+
+    rows = np.flatnonzero(valid)
+    keys = segment_ids[rows] * N_STEPS + step[rows].astype(np.int64)
+
+    # 逆順で最初に現れる位置 = 正順で最後に現れる位置
+    unique_keys, first_in_reversed = np.unique(keys[::-1], return_index=True)
+    last_rows = rows[len(rows) - 1 - first_in_reversed]
+
+    steps = unique_keys % N_STEPS
+    values = np.where(steps == 0,
+                      np.asarray(velocity)[last_rows],
+                      np.asarray(amplitude)[last_rows])
+    params.reshape(-1)[unique_keys] = values
+    return params
+
+
+@profiled
+def extract_velocity_parameters(df):
+    """1試行分のDataFrameから5つの速度パラメータを辞書で返す"""
+    values = last_step_values(df['StepNumber'].to_numpy(),
+                              df['Amplitude'].to_numpy(),
+                              df['Velocity'].to_numpy())[0]
+    return dict(zip(PARAM_NAMES, values))
+
+
+@profiled
+def trial_velocity_parameters(path):
+    """試行ファイルから5つの速度パラメータを辞書で返す（必要な列だけ読む）"""
+    arrays = load_trial_arrays(path, PARAM_COLUMNS)
+    values = last_step_values(arrays['StepNumber'], arrays['Amplitude'], arrays['Velocity'])[0]
+    return {name: float(v) for name, v in zip(PARAM_NAMES, values)}
+
+
+@profiled
+def extract_grouped_parameters(df, by=('Participant', 'Trial')):
+    """連結済みDataFrameを by の組ごとに分け、{組: パラメータ辞書} を一括で返す"""
+    codes, groups = pd.MultiIndex.from_frame(df[list(by)]).factorize()
+    params = last_step_values(df['StepNumber'].to_numpy(),
+                              df['Amplitude'].to_numpy(),
+                              df['Velocity'].to_numpy(),
+                              codes, len(groups))
+    return {key: dict(zip(PARAM_NAMES, row)) for key, row in zip(groups, params)}
+
+
+@profiled
+def extract_parameter_matrix(trials):
+    """列配列の辞書のリストから (試行数, 5) のパラメータ行列を作る"""
+    trials = list(trials)
+    if not trials:
+        return np.zeros((0, N_STEPS))
+
+    lengths = np.array([len(t['StepNumber']) for t in trials])
+    segment_ids = np.repeat(np.arange(len(trials)), lengths)
+    step = np.concatenate([t['StepNumber'] for t in trials])
+    amplitude = np.concatenate([t['Amplitude'] for t in trials])
+    velocity = np.concatenate([t['Velocity'] for t in trials])
+    return last_step_values(step, amplitude, velocity, segment_ids, len(trials))
+
+
+@profiled
+def extract_trial_parameters(records):
+    """カタログの TrialRecord 群からパラメータ行列とメタデータを返す
+
+    パラメータ行列は (試行数, 5)、メタデータは同じ行順の DataFrame
+    （participant, trial, pattern, blend_mode, filename, path）。
+    """
+    records = list(records)
+    trials = [load_trial_arrays(r.path, PARAM_COLUMNS) for r in records]
+    params = extract_parameter_matrix(trials)
+    meta = pd.DataFrame({
+        'participant': [r.participant for r in records],
+        'trial': [r.trial for r in records],
+        'pattern': [r.pattern for r in records],
+        'blend_mode': [r.blend_mode for r in records],
+        'filename': [r.filename for r in records],
+        'path': [r.path for r in records],
+    })
+    return params, meta
+
+
+def parameter_frame(params, meta, names=PARAM_NAMES):
+    """パラメータ行列とメタデータを1つの DataFrame にまとめる"""
+    frame = meta.reset_index(drop=True).copy()
+    for i, name in enumerate(names):
+        frame[name] = params[:, i]
+    return frame